@@ -0,0 +1,151 @@
+"""
+ADAPTIVE LIMITS
+Ajusta o rate de cada provider a partir do feedback real (headers e 429s)
+
+- AIMD: +1 chamada/min por sucesso com a janela perto do limite, metade do
+  rate a cada 429 (com pouco tráfego o rate não sobe: não se sabe se aguenta)
+- Teto pelo header de limite do provider, quando o envia
+- Cooldowns exatos a partir de Retry-After / reset em vez de 60s fixos
+"""
+
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Headers de OpenAI (x-ratelimit-*) e Anthropic (anthropic-ratelimit-*)
+LIMIT_REQUESTS = ("x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+REMAINING_REQUESTS = ("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+RESET_REQUESTS = ("x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset")
+LIMIT_TOKENS = ("x-ratelimit-limit-tokens", "anthropic-ratelimit-tokens-limit")
+REMAINING_TOKENS = ("x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining")
+RESET_TOKENS = ("x-ratelimit-reset-tokens", "anthropic-ratelimit-tokens-reset")
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class RateLimitError(Exception):
+    """O provider respondeu 429; guarda os headers para o cooldown exato"""
+
+    def __init__(self, message="429 Too Many Requests", headers=None, status=429):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def get_header(headers, names):
+    """Primeiro header presente de `names` (sem distinguir maiúsculas)"""
+    if not headers:
+        return None
+    lowered = {k.lower(): v for k, v in headers.items()}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    return None
+
+
+def parse_seconds(value, now=None):
+    """
+    Converte um valor de Retry-After/reset em segundos a partir de agora.
+    Aceita segundos ("30"), durações estilo OpenAI ("6m0s", "250ms"),
+    datas HTTP e timestamps RFC 3339 (Anthropic). None se não perceber.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    now = time.time() if now is None else now
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parts = _DURATION.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+
+    for parse in (lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")), parsedate_to_datetime):
+        try:
+            moment = parse(value)
+        except (TypeError, ValueError):
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return max(moment.timestamp() - now, 0.0)
+
+    return None
+
+
+def _int_header(headers, names):
+    value = get_header(headers, names)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveController:
+    """Rate (chamadas/min) por provider, ajustado por AIMD com o feedback das respostas"""
+
+    def __init__(self, initial=50, floor=1, increase=1, decrease=0.5, near_limit=0.8):
+        self.initial = initial
+        self.floor = floor
+        self.increase = increase
+        self.decrease = decrease
+        self.near_limit = near_limit  # fração do rate já usada na janela para poder subir
+        self.rates = {}  # {provider: chamadas/min atuais}
+        self.ceilings = {}  # {provider: limite de chamadas reportado pelo provider}
+        self.token_limits = {}  # {provider: limite de tokens reportado pelo provider}
+
+    def limit(self, provider):
+        """Chamadas/min permitidas agora para o provider"""
+        return max(int(self.rates.get(provider, self.initial)), self.floor)
+
+    def on_success(self, provider, headers=None, used=None):
+        """
+        Aumento aditivo, só se a janela já tem `used` >= near_limit * rate
+        chamadas (sem `used` não sobe); lê os limites reais dos headers.
+        Retorna um cooldown (s) se o provider disse que não resta nada, senão None.
+        """
+        ceiling = _int_header(headers, LIMIT_REQUESTS)
+        if ceiling:
+            self.ceilings[provider] = ceiling
+        token_limit = _int_header(headers, LIMIT_TOKENS)
+        if token_limit:
+            self.token_limits[provider] = token_limit
+
+        rate = self.rates.get(provider, self.initial)
+        if used is not None and used >= self.near_limit * rate:
+            rate += self.increase
+        self.rates[provider] = min(rate, self.ceilings.get(provider, rate))
+
+        cooldown = None
+        if _int_header(headers, REMAINING_REQUESTS) == 0:
+            cooldown = parse_seconds(get_header(headers, RESET_REQUESTS))
+        if _int_header(headers, REMAINING_TOKENS) == 0:
+            token_cooldown = parse_seconds(get_header(headers, RESET_TOKENS))
+            if token_cooldown is not None:
+                cooldown = max(cooldown or 0.0, token_cooldown)
+        return cooldown
+
+    def on_rate_limit(self, provider, headers=None):
+        """
+        Diminuição multiplicativa. Retorna o cooldown exato indicado pelo
+        provider (Retry-After ou reset), ou None se não indicou nenhum.
+        """
+        rate = self.rates.get(provider, self.initial) * self.decrease
+        self.rates[provider] = max(rate, self.floor)
+
+        retry_after = parse_seconds(get_header(headers, ("retry-after",)))
+        if retry_after is not None:
+            return retry_after
+        resets = [parse_seconds(get_header(headers, names)) for names in (RESET_REQUESTS, RESET_TOKENS)]
+        resets = [r for r in resets if r is not None]
+        return max(resets) if resets else None
+
+    def reset(self):
+        """Esquece tudo o que se aprendeu: ritmos e limites reportados pelos providers"""
+        self.rates.clear()
+        self.ceilings.clear()
+        self.token_limits.clear()
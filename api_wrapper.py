@@ -3,95 +3,572 @@ API WRAPPER - Integra Rate Limiter + Fallback automático
 Zero rate limits, máxima eficiência
 """
 
+import json
+import threading
 import time
-from rate_limiter import limiter
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from rate_limiter import limiter as default_limiter, estimate_tokens
+from disk_cache import cache_key, open_disk_cache
+from prompt_index import PromptIndex
+from singleflight import SingleFlight
+from retry_scheduler import RetryScheduler
+from telemetry import telemetry as default_telemetry
+from adaptive_limits import RateLimitError
 from datetime import datetime
 
 class SmartAPIWrapper:
-    def __init__(self):
-        self.providers = [
-            "anthropic/claude-haiku-4-5",
-            "openai/gpt-4o-mini",
-            "openai/gpt-4"
-        ]
-        self.current_provider_idx = 0
-    
-    def get_next_available_provider(self):
-        """Retorna o próximo provider disponível"""
-        for i in range(len(self.providers)):
-            idx = (self.current_provider_idx + i) % len(self.providers)
-            provider = self.providers[idx]
-            
-            can_call, reason = limiter.check_rate_limit(provider)
-            if can_call:
-                return idx, provider
+    def __init__(self, disk_cache=None, similarity_threshold=0.85, hedge=False, limiter=None, telemetry=None):
+        self.limiter = limiter or default_limiter
+        # Latência, tokens, custo, cache e repetições de cada chamada
+        self.telemetry = telemetry or default_telemetry
+        # Providers do registry partilhado com o rate limiter e o failover
+        self.registry = self.limiter.registry
+        self.providers = self.registry.ids()
+        self._index = {provider: idx for idx, provider in enumerate(self.providers)}
+        # Segunda camada de cache, em disco: partilhada entre processos e restarts
+        self.disk_cache = disk_cache
+        # Prompts já respondidos, para encontrar variações (caixa, acentos, uma palavra a mais)
+        self.prompt_index = PromptIndex(threshold=similarity_threshold)
+        # Prompts iguais em simultâneo esperam pela mesma chamada (antes de haver cache)
+        self.singleflight = SingleFlight()
+        
+        # Latência observada por provider (EWMA, p95, erros) - a mesma que o registry usa no ranking
+        self.stats = {p.id: p.stats for p in self.registry.providers}
+        # Hedging (opt-in): se o provider passar do seu p95, duplica o pedido no próximo
+        self.hedge = hedge
+        self.hedge_min_samples = 20  # sem amostras suficientes o p95 não é fiável
+        self.hedge_workers = 8
+        self.max_hedges_in_flight = 2  # duplicados em curso; acima disto não se duplica
+        self._executor = None
+        self._in_flight = 0  # tarefas no pool (em curso ou na fila); perdedores presos contam
+        self._hedges_in_flight = 0
+        self._pool_lock = threading.Lock()
+    
+    def get_cached(self, prompt, params):
+        """Procura em cache o prompt exato e, se falhar, um prompt equivalente já respondido"""
+        cached = self._get_cached_exact(prompt, params)
+        if cached is not None:
+            self.telemetry.record_cache_hit("exact")
+            return cached
+        
+        similar = self.prompt_index.lookup(prompt)
+        if similar is not None and similar != prompt:
+            cached = self._get_cached_exact(similar, params)
+            if cached is not None:
+                self.telemetry.record_cache_hit("similar")
+                print(f"🔎 Prompt equivalente em cache: '{similar[:40]}'")
+        return cached
+    
+    def _get_cached_exact(self, prompt, params):
+        """Procura uma resposta em cache (memória, depois disco), venha de que provider vier"""
+        key = cache_key("*", prompt, params)
+        cached = self.limiter.get_cache(key)
+        if cached is None and self.disk_cache:
+            cached = self.disk_cache.get(key)
+            if cached is not None:
+                self.limiter.set_cache(key, cached)  # promover para a memória
+        if cached is None:
+            return None
+        return json.loads(cached)["text"]
+    
+    def send(self, provider, prompt, max_tokens):
+        """
+        Faz o pedido ao provider. Retorna {"text", "headers", "usage"};
+        um 429 deve levantar RateLimitError com os headers da resposta.
+        """
+        # Aqui entra a chamada real à API
+        # Por enquanto, simular sucesso
+        return {"text": f"[Resposta de {provider}]", "headers": {}, "usage": None}
+    
+    def send_stream(self, provider, prompt, max_tokens):
+        """
+        Versão em streaming de send(): gera os pedaços de texto à medida que
+        chegam e, no fim, retorna {"headers", "usage"} (valor do StopIteration).
+        """
+        # Sem streaming real: parte a resposta completa em palavras
+        result = self.send(provider, prompt, max_tokens)
+        for n, word in enumerate(result["text"].split(" ")):
+            yield word if n == 0 else " " + word
+        return {"headers": result.get("headers"), "usage": result.get("usage")}
+    
+    def _record_latency(self, provider, seconds, ok=True):
+        """Latência de um pedido para o routing (ModelStats) e para a telemetria"""
+        self.stats[provider].record(seconds, ok=ok)
+        if ok:
+            self.telemetry.record_latency(provider, seconds)
+    
+    def _timed_send(self, provider, prompt, max_tokens):
+        """send() medindo a latência para as estatísticas do provider"""
+        start = time.monotonic()
+        try:
+            result = self.send(provider, prompt, max_tokens)
+        except Exception:
+            self._record_latency(provider, time.monotonic() - start, ok=False)
+            raise
+        self._record_latency(provider, time.monotonic() - start)
+        return result
+    
+    def _reserve_other(self, exclude, tokens):
+        """Reserva um slot noutro provider que não `exclude` (para o hedge)"""
+        for candidate in self.registry.ranked():
+            if candidate.id == exclude:
+                continue
+            reserved, _wait = self.limiter.try_acquire(candidate.id, tokens)
+            if reserved:
+                return self._index[candidate.id], candidate.id
+        return None, None
+    
+    def _pool_saturated(self):
+        with self._pool_lock:
+            return self._in_flight >= self.hedge_workers
+    
+    def _submit(self, fn, *args, hedge=False):
+        """Tarefa no pool do hedging, contada até acabar (ou ser cancelada)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="hedge")
+        with self._pool_lock:
+            self._in_flight += 1
+            if hedge:
+                self._hedges_in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _future: self._task_done(hedge))
+        return future
+    
+    def _task_done(self, hedge):
+        with self._pool_lock:
+            self._in_flight -= 1
+            if hedge:
+                self._hedges_in_flight -= 1
+    
+    def _send_hedged(self, idx, provider, prompt, max_tokens, prompt_tokens, tokens):
+        """
+        Envia ao provider; se passar do p95 observado, envia um duplicado ao
+        próximo provider disponível e usa a primeira resposta. Os dois pedidos
+        contam no rate limiter. O perdedor é cancelado se ainda não arrancou;
+        se já estiver em curso, a resposta dele é descartada, mas o erro ou os
+        headers e tokens dele contam como os do vencedor (_settle_loser).
+        Com o pool cheio (perdedores ainda presos) ou com max_hedges_in_flight
+        duplicados em curso não há hedge: o pedido vai sem duplicado, em vez
+        de ficar na fila atrás dos perdedores.
+        Retorna (idx, provider, resultado) de quem respondeu.
+        """
+        stats = self.stats[provider]
+        if len(stats.samples) < self.hedge_min_samples or self._pool_saturated():
+            return idx, provider, self._timed_send(provider, prompt, max_tokens)
+        
+        threshold = stats.p95()
+        primary = self._submit(self._timed_send, provider, prompt, max_tokens)
+        done, _pending = wait([primary], timeout=threshold)
+        if done:
+            return idx, provider, primary.result()
+        
+        with self._pool_lock:
+            can_hedge = (self._hedges_in_flight < self.max_hedges_in_flight
+                         and self._in_flight < self.hedge_workers)
+        if not can_hedge:
+            return idx, provider, primary.result()
+        
+        hedge_idx, hedge_provider = self._reserve_other(provider, tokens)
+        if hedge_idx is None:
+            return idx, provider, primary.result()
+        
+        print(f"🪃 {provider} passou do p95 ({threshold * 1000:.0f}ms): hedge em {hedge_provider}")
+        backup = self._submit(self._timed_send, hedge_provider, prompt, max_tokens, hedge=True)
+        owners = {primary: (idx, provider), backup: (hedge_idx, hedge_provider)}
+        
+        pending = {primary, backup}
+        backup_failed = False
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    loser = backup if future is primary else primary
+                    if not (loser is backup and backup_failed):
+                        loser.cancel()
+                        _loser_idx, loser_provider = owners[loser]
+                        loser.add_done_callback(
+                            lambda f: self._settle_loser(loser_provider, f, prompt_tokens, tokens))
+                    winner_idx, winner = owners[future]
+                    return winner_idx, winner, future.result()
+                if future is backup:
+                    # O erro do primário segue para o tratamento normal; o do duplicado fica aqui
+                    self._on_error(hedge_provider, error, prompt_tokens, tokens)
+                    backup_failed = True
+        
+        # Os dois falharam: o erro do primário segue para o tratamento normal
+        return idx, provider, primary.result()
+    
+    def _settle_loser(self, provider, future, prompt_tokens, reserved_tokens):
+        """Pedido que perdeu o hedge: erro, headers e tokens contam como os de qualquer outro"""
+        if future.cancelled():
+            self.limiter.reconcile_tokens(provider, reserved_tokens, 0)  # nunca chegou a sair
+            return
+        error = future.exception()
+        if error is not None:
+            self._on_error(provider, error, prompt_tokens, reserved_tokens)
+        else:
+            self._record_usage(provider, future.result(), prompt_tokens, reserved_tokens)
+    
+    def set_cached(self, provider, prompt, params, response):
+        # Uma entrada por prompt + parâmetros (como no singleflight); o provider vai no valor
+        key = cache_key("*", prompt, params)
+        value = json.dumps({"provider": provider, "text": response}, ensure_ascii=False)
+        self.limiter.set_cache(key, value)
+        if self.disk_cache:
+            self.disk_cache.set(key, value)
+        self.prompt_index.add(prompt)
+    
+    def _on_success(self, provider, prompt, params, result, prompt_tokens, reserved_tokens):
+        """Feedback ao limiter, acerto dos tokens reservados e cache. Retorna o texto."""
+        response = result["text"]
+        self._record_usage(provider, result, prompt_tokens, reserved_tokens)
+        self.set_cached(provider, prompt, params, response)
+        return response
+    
+    def _record_usage(self, provider, result, prompt_tokens, reserved_tokens):
+        """Headers da resposta para o limiter e acerto da reserva com o uso real"""
+        self.limiter.record_response(provider, result.get("headers"))
+        
+        # Acertar a reserva com o uso real (ou a estimativa local, sem usage)
+        usage = result.get("usage")
+        if usage:
+            input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            input_tokens, output_tokens = prompt_tokens, estimate_tokens(result["text"])
+        self.limiter.reconcile_tokens(provider, reserved_tokens, input_tokens + output_tokens)
+        self.telemetry.record_usage(provider, input_tokens, output_tokens)
+    
+    def _on_error(self, provider, error, prompt_tokens, reserved_tokens):
+        """Devolve os tokens de output reservados e marca o erro no limiter"""
+        error_msg = str(error)
+        # Sem resposta não houve output: devolver a parte reservada para ele
+        self.limiter.reconcile_tokens(provider, reserved_tokens, prompt_tokens)
+        
+        # Se for rate limit, bloqueia este provider (cooldown exato dos headers)
+        if isinstance(error, RateLimitError):
+            self.telemetry.record_error(provider, "rate_limit")
+            self.limiter.mark_rate_limit(provider, error.headers)
+        elif "429" in error_msg or "rate_limit" in error_msg:
+            self.telemetry.record_error(provider, "rate_limit")
+            self.limiter.mark_rate_limit(provider)
+        else:
+            self.telemetry.record_error(provider, "timeout" if isinstance(error, TimeoutError) else "error")
+            self.limiter.mark_error(provider, error_msg)
+    
+    def get_next_available_provider(self, tokens=0):
+        """Retorna o melhor provider disponível (já com o slot e os tokens reservados)"""
+        # Ranking em cache no registry: normalmente o primeiro serve
+        for candidate in self.registry.ranked():
+            reserved, wait = self.limiter.try_acquire(candidate.id, tokens)
+            if reserved:
+                return self._index[candidate.id], candidate.id
         
         # Se nenhum disponível, mostra status
-        return None, f"⏸️ Todos os modelos bloqueados. Status:\n{limiter.get_status()}"
+        return None, f"⏸️ Todos os modelos bloqueados. Status:\n{self.limiter.get_status()}"
+    
+    def call_api(self, prompt, max_retries=3, max_tokens=512, hedge=None, timeout=None):
+        """
+        Chama API com fallback automático (hedge=True duplica pedidos lentos).
+        Com timeout, desiste logo que a próxima tentativa já não caiba nele.
+        """
+        # Mesmo prompt já em curso noutra thread: espera pela resposta dessa chamada
+        # (no máximo até ao próprio deadline)
+        key = cache_key("*", prompt, {"max_tokens": max_tokens})
+        try:
+            return self.singleflight.do(key, self._call_api, prompt, max_retries, max_tokens, hedge, timeout,
+                                        wait_timeout=timeout)
+        except TimeoutError as e:
+            self.telemetry.record_call("failed", timeout, 0)
+            return f"❌ Falha após 0 tentativas. Último erro: {e}"
     
-    def call_api(self, prompt, max_retries=3):
-        """Chama API com fallback automático"""
+    def _call_api(self, prompt, max_retries, max_tokens, hedge, timeout):
+        hedge = self.hedge if hedge is None else hedge
+        start = time.monotonic()
+        scheduler = RetryScheduler(self.limiter, self.providers, timeout)
         attempt = 0
         last_error = None
+        # Reserva input estimado + máximo de output; acerta-se com o uso real depois
+        prompt_tokens = estimate_tokens(prompt)
+        reserved_tokens = prompt_tokens + max_tokens
+        params = {"max_tokens": max_tokens}
         
         while attempt < max_retries:
             # Verificar cache primeiro
-            cache_key = f"prompt_{hash(prompt)}"
-            cached = limiter.get_cache(cache_key)
-            if cached:
+            cached = self.get_cached(prompt, params)
+            if cached is not None:
                 print(f"💾 Resposta do cache (economizou 1 chamada)")
+                self.telemetry.record_call("cache", time.monotonic() - start, attempt)
                 return cached
             
             # Obter provider disponível
-            idx, provider = self.get_next_available_provider()
+            idx, provider = self.get_next_available_provider(reserved_tokens)
             
             if idx is None:
                 print(provider)  # Mostra mensagem de bloqueio
-                time.sleep(5)
+                # Dormir só até o primeiro provider libertar um slot, se couber no deadline
+                if not scheduler.sleep(reserved_tokens):
+                    last_error = TimeoutError("nenhum provider livre antes do deadline")
+                    break
                 attempt += 1
                 continue
             
             print(f"📤 Tentativa {attempt + 1}: Usando {provider}")
             
             try:
-                # Aqui entra a chamada real à API
-                # Por enquanto, simular sucesso
-                limiter.record_call(provider)
-                
-                response = f"[Resposta de {provider}]"
-                limiter.set_cache(cache_key, response)
-                
+                if hedge:
+                    idx, provider, result = self._send_hedged(idx, provider, prompt, max_tokens,
+                                                                    prompt_tokens, reserved_tokens)
+                else:
+                    result = self._timed_send(provider, prompt, max_tokens)
+                response = self._on_success(provider, prompt, params, result, prompt_tokens, reserved_tokens)
                 print(f"✅ Sucesso com {provider}")
-                self.current_provider_idx = idx  # Manter este provider como padrão
+                self.telemetry.record_call("ok", time.monotonic() - start, attempt)
                 return response
             
             except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Erro em {provider}: {error_msg}")
-                
-                # Se for rate limit, bloqueia este provider
-                if "429" in error_msg or "rate_limit" in error_msg:
-                    limiter.mark_rate_limit(provider)
-                
+                print(f"❌ Erro em {provider}: {e}")
+                self._on_error(provider, e, prompt_tokens, reserved_tokens)
                 last_error = e
-                # Move para próximo provider
-                self.current_provider_idx = (idx + 1) % len(self.providers)
                 attempt += 1
-                time.sleep(2)  # Espera antes de retry
+                # Próximo provider livre já, ou espera só o necessário
+                if attempt < max_retries and not scheduler.sleep(reserved_tokens, after_error=True):
+                    break
+        
+        self.telemetry.record_call("failed", time.monotonic() - start, max(attempt - 1, 0))
+        return f"❌ Falha após {attempt} tentativas. Último erro: {last_error}"
+    
+    def call_api_stream(self, prompt, max_retries=3, max_tokens=512, timeout=None):
+        """
+        Como call_api, mas gera a resposta aos pedaços à medida que chega.
+        Só muda de provider se o erro vier antes do primeiro pedaço; a meio
+        da resposta já não dá para repetir sem duplicar texto.
+        """
+        call_start = time.monotonic()
+        scheduler = RetryScheduler(self.limiter, self.providers, timeout)
+        attempt = 0
+        last_error = None
+        prompt_tokens = estimate_tokens(prompt)
+        reserved_tokens = prompt_tokens + max_tokens
+        params = {"max_tokens": max_tokens}
+        
+        while attempt < max_retries:
+            cached = self.get_cached(prompt, params)
+            if cached is not None:
+                print(f"💾 Resposta do cache (economizou 1 chamada)")
+                self.telemetry.record_call("cache", time.monotonic() - call_start, attempt)
+                yield cached
+                return
+            
+            idx, provider = self.get_next_available_provider(reserved_tokens)
+            if idx is None:
+                print(provider)  # Mostra mensagem de bloqueio
+                if not scheduler.sleep(reserved_tokens):
+                    last_error = TimeoutError("nenhum provider livre antes do deadline")
+                    break
+                attempt += 1
+                continue
+            
+            print(f"📤 Tentativa {attempt + 1}: Usando {provider} (streaming)")
+            chunks = []
+            upstream = 0.0  # só a espera pelo provider: o tempo de quem consome não é latência dele
+            finished = False
+            stream = None
+            try:
+                stream = self.send_stream(provider, prompt, max_tokens)
+                while True:
+                    waited = time.monotonic()
+                    try:
+                        chunk = next(stream)
+                    except StopIteration as done:
+                        meta = done.value or {}
+                        break
+                    finally:
+                        upstream += time.monotonic() - waited
+                    if not chunks:
+                        print(f"⚡ Primeiro pedaço de {provider} em {upstream * 1000:.0f}ms")
+                    chunks.append(chunk)
+                    yield chunk
+                finished = True
+            except Exception as e:
+                finished = True
+                self._record_latency(provider, upstream, ok=False)
+                print(f"❌ Erro em {provider}: {e}")
+                self._on_error(provider, e, prompt_tokens, reserved_tokens)
+                if chunks:
+                    self.telemetry.record_call("failed", time.monotonic() - call_start, attempt)
+                    yield f"\n❌ Resposta interrompida: {e}"
+                    return
+                last_error = e
+                attempt += 1
+                if attempt < max_retries and not scheduler.sleep(reserved_tokens, after_error=True):
+                    break
+                continue
+            finally:
+                if not finished:
+                    # Quem consome desistiu a meio (close()): fechar o pedido e acertar a reserva
+                    if stream is not None:
+                        stream.close()
+                    self.limiter.reconcile_tokens(provider, reserved_tokens,
+                                                  prompt_tokens + estimate_tokens("".join(chunks)))
+            
+            self._record_latency(provider, upstream)
+            result = {"text": "".join(chunks), "headers": meta.get("headers"), "usage": meta.get("usage")}
+            self._on_success(provider, prompt, params, result, prompt_tokens, reserved_tokens)
+            print(f"✅ Sucesso com {provider}")
+            self.telemetry.record_call("ok", time.monotonic() - call_start, attempt)
+            return
+        
+        self.telemetry.record_call("failed", time.monotonic() - call_start, max(attempt - 1, 0))
+        yield f"❌ Falha após {attempt} tentativas. Último erro: {last_error}"
+    
+    def call_api_batch(self, prompts, max_tokens=512, max_retries=3, timeout=None, max_in_flight=4):
+        """
+        Vários prompts de uma vez, espalhados por todos os providers com
+        orçamento (cada um dentro do seu rate limiter e com até `max_in_flight`
+        pedidos em simultâneo). Retorna as respostas pela ordem dos prompts;
+        os que falharem, ou não couberem no timeout, ficam com a mensagem de
+        erro, como em call_api - as restantes respostas não se perdem.
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        params = {"max_tokens": max_tokens}
+        results = [None] * len(prompts)
+        attempts = [0] * len(prompts)
+        errors = [None] * len(prompts)
+        
+        # Cache primeiro; prompts repetidos no lote só são pedidos uma vez
+        first = {}
+        pending = deque()
+        cached_count = 0
+        for i, prompt in enumerate(prompts):
+            if prompt in first:
+                continue
+            first[prompt] = i
+            cached = self.get_cached(prompt, params)
+            if cached is not None:
+                results[i] = cached
+                cached_count += 1
+                self.telemetry.record_call("cache", time.monotonic() - start)
+            else:
+                pending.append(i)
+        
+        running = {}  # {future: (índice, provider, tokens do prompt, tokens reservados)}
+        in_flight = Counter()
+        executor = ThreadPoolExecutor(max_workers=max_in_flight * len(self.providers),
+                                      thread_name_prefix="batch")
+        try:
+            while pending or running:
+                # Cada provider com slot (e pedidos livres) recebe o próximo prompt
+                dispatched = True
+                while pending and dispatched:
+                    dispatched = False
+                    for candidate in self.registry.ranked():
+                        if not pending:
+                            break
+                        if in_flight[candidate.id] >= max_in_flight:
+                            continue
+                        i = pending[0]
+                        prompt_tokens = estimate_tokens(prompts[i])
+                        reserved_tokens = prompt_tokens + max_tokens
+                        reserved, _wait = self.limiter.try_acquire(candidate.id, reserved_tokens)
+                        if not reserved:
+                            continue
+                        pending.popleft()
+                        future = executor.submit(self._timed_send, candidate.id, prompts[i], max_tokens)
+                        running[future] = (i, candidate.id, prompt_tokens, reserved_tokens)
+                        in_flight[candidate.id] += 1
+                        dispatched = True
+                
+                # Esperar pela próxima resposta ou pelo próximo slot livre, o que vier antes
+                pause = None
+                if pending:
+                    head_tokens = estimate_tokens(prompts[pending[0]]) + max_tokens
+                    free = [p for p in self.providers if in_flight[p] < max_in_flight]
+                    if free:
+                        pause = max(min(self.limiter.next_available_in(p, head_tokens) for p in free), 0.001)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    pause = remaining if pause is None else min(pause, remaining)
+                
+                if running:
+                    done, _not_done = wait(running, timeout=pause, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(pause)
+                    done = ()
+                
+                for future in done:
+                    i, provider, prompt_tokens, reserved_tokens = running.pop(future)
+                    in_flight[provider] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._on_error(provider, e, prompt_tokens, reserved_tokens)
+                        attempts[i] += 1
+                        errors[i] = e
+                        if attempts[i] < max_retries:
+                            pending.append(i)
+                    else:
+                        results[i] = self._on_success(
+                            provider, prompts[i], params, result, prompt_tokens, reserved_tokens
+                        )
+                        self.telemetry.record_call("ok", time.monotonic() - start, attempts[i])
+        finally:
+            # No timeout, os pedidos ainda em curso acabam em background
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        failed = 0
+        for j in first.values():
+            if results[j] is None:
+                failed += 1
+                self.telemetry.record_call("failed", time.monotonic() - start, max(attempts[j] - 1, 0))
+                if errors[j] is not None:
+                    results[j] = f"❌ Falha após {attempts[j]} tentativas. Último erro: {errors[j]}"
+                else:
+                    results[j] = "❌ Sem resposta dentro do timeout do lote"
+        for i, prompt in enumerate(prompts):
+            results[i] = results[first[prompt]]
         
-        return f"❌ Falha após {max_retries} tentativas. Último erro: {last_error}"
+        print(f"📦 Lote de {len(prompts)} prompts em {time.monotonic() - start:.1f}s: "
+              f"{len(first) - failed} respostas ({cached_count} do cache), {failed} falhas")
+        return results
     
     def get_status(self):
         """Mostra status completo"""
-        return limiter.get_status()
+        status = [self.limiter.get_status()]
+        flights = self.singleflight.stats()
+        status.append(
+            f"🔗 Single-flight: {flights['coalesced']} pedidos partilhados / "
+            f"{flights['executed']} chamadas ({flights['coalesce_rate']:.0%}), "
+            f"{flights['in_flight']} em curso"
+        )
+        snap = self.telemetry.snapshot()
+        calls = sum(snap["calls"].values())
+        if calls:
+            cost = sum(p["cost"] for p in snap["providers"].values())
+            status.append(
+                f"📊 Telemetria: {calls} chamadas, cache {snap['cache_hit_rate']:.0%}, "
+                f"{snap['retries']} repetições, p50 {snap['call_latency']['p50'] * 1000:.0f}ms / "
+                f"p99 {snap['call_latency']['p99'] * 1000:.0f}ms, custo ~${cost:.4f}"
+            )
+        for provider, stats in self.stats.items():
+            if stats.ewma_latency is not None:
+                status.append(
+                    f"⏱️ {provider}: EWMA {stats.ewma_latency * 1000:.0f}ms, "
+                    f"p95 {stats.p95() * 1000:.0f}ms, erros {stats.error_rate:.0%}"
+                )
+        return "\n".join(status)
     
     def reset(self):
         """Reset de tudo"""
-        limiter.reset()
+        self.limiter.reset()
 
 
-# Instância global
-api = SmartAPIWrapper()
+# Instância global (cache em disco em CHIMOCO_CACHE_DB, se disponível)
+api = SmartAPIWrapper(disk_cache=open_disk_cache())
 
 
 if __name__ == "__main__":
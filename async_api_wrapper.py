@@ -0,0 +1,491 @@
+"""
+ASYNC API WRAPPER - Versão asyncio do SmartAPIWrapper
+Uma chamada lenta já não bloqueia o bot: ligações HTTP/1.1 keep-alive
+reutilizadas por provider, limite de pedidos em simultâneo por provider e
+um deadline por chamada (inclui as esperas e as repetições)
+"""
+
+import asyncio
+import json
+import os
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from api_wrapper import SmartAPIWrapper
+from disk_cache import cache_key
+from adaptive_limits import RateLimitError
+from rate_limiter import estimate_tokens
+from retry_scheduler import RetryScheduler
+
+# Endpoints compatíveis com a API de chat da OpenAI, por vendor do registry
+DEFAULT_ENDPOINTS = {
+    "anthropic": "https://api.anthropic.com/v1/chat/completions",
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "google": "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions",
+}
+API_KEY_ENV = {
+    "anthropic": "ANTHROPIC_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "google": "GEMINI_API_KEY",
+}
+
+
+class SlotTimeout(TimeoutError):
+    """O deadline acabou à espera de um pedido livre do provider (o provider não falhou)"""
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body=b""):
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    Ligações keep-alive para um endpoint. Cada pedido usa uma ligação livre
+    (ou abre uma nova); no fim volta para o pool, a não ser que o servidor
+    a tenha fechado. Uma ligação reutilizada que já morreu é repetida numa nova.
+    """
+
+    def __init__(self, url, max_idle=8):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.https = parts.scheme == "https"
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path or "/"
+        self.max_idle = max_idle
+        self._idle = deque()  # (reader, writer) prontos a reutilizar
+        self._ssl = ssl.create_default_context() if self.https else None
+        self.opened = 0  # ligações abertas (para ver a reutilização)
+        self.requests = 0
+
+    async def _connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl)
+
+    async def request(self, body, headers=None):
+        """POST de `body` (bytes). Retorna (status, headers, corpo)."""
+        status, response_headers, chunks = await self.open(body, headers)
+        data = b"".join([chunk async for chunk in chunks])
+        return status, response_headers, data
+
+    async def open(self, body, headers=None):
+        """
+        POST de `body` (bytes) sem esperar pelo corpo da resposta. Retorna
+        (status, headers, pedaços), em que pedaços é um gerador assíncrono
+        dos bytes do corpo à medida que chegam (para streaming).
+        """
+        self.requests += 1
+        conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            try:
+                return await self._start(conn, body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass  # keep-alive fechado do outro lado entretanto
+        return await self._start(await self._connect(), body, headers)
+
+    async def _start(self, conn, body, headers):
+        """Envia o pedido e lê a linha de status e os headers da resposta"""
+        reader, writer = conn
+        try:
+            lines = [
+                f"POST {self.path} HTTP/1.1",
+                f"Host: {self.host}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                "Connection: keep-alive",
+            ]
+            lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("ligação fechada pelo servidor")
+            status = int(status_line.split()[1])
+
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+        except BaseException:
+            # Erro ou timeout a meio: a ligação fica num estado desconhecido
+            writer.close()
+            raise
+        return status, response_headers, self._body(conn, response_headers)
+
+    async def _body(self, conn, response_headers):
+        """Corpo da resposta aos pedaços; no fim a ligação volta para o pool"""
+        reader, writer = conn
+        keep_alive = response_headers.get("connection", "").lower() != "close"
+        complete = False
+        try:
+            if response_headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass  # trailers
+                        break
+                    yield await reader.readexactly(size)
+                    await reader.readexactly(2)  # \r\n do fim do chunk
+            elif "content-length" in response_headers:
+                yield await reader.readexactly(int(response_headers["content-length"]))
+            else:
+                keep_alive = False
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    yield data
+            complete = True
+        finally:
+            # Corpo lido até ao fim: a ligação pode ser reutilizada
+            if complete and keep_alive and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+            else:
+                writer.close()
+
+    def close(self):
+        while self._idle:
+            _reader, writer = self._idle.pop()
+            writer.close()
+
+
+class AsyncAPIWrapper(SmartAPIWrapper):
+    """
+    Mesma cache, registry e feedback ao rate limiter do SmartAPIWrapper,
+    mas call_api() é uma coroutine e nunca bloqueia o event loop: o rate
+    limiter (SharedState em SQLite) e a cache em disco são síncronos, por
+    isso correm em asyncio.to_thread.
+    """
+
+    def __init__(self, disk_cache=None, similarity_threshold=0.85, limiter=None, telemetry=None,
+                 endpoints=None, max_in_flight=8, timeout=60, request_timeout=30):
+        super().__init__(disk_cache=disk_cache, similarity_threshold=similarity_threshold,
+                         limiter=limiter, telemetry=telemetry)
+        # {provider_id: url}; por defeito o endpoint do vendor do provider
+        self.endpoints = endpoints or {
+            p.id: DEFAULT_ENDPOINTS[p.vendor] for p in self.registry.providers if p.vendor in DEFAULT_ENDPOINTS
+        }
+        self.max_in_flight = max_in_flight  # pedidos em simultâneo por provider
+        self.timeout = timeout  # deadline de call_api (s), esperas e repetições incluídas
+        self.request_timeout = request_timeout  # máximo por pedido (s)
+        self._pools = {}
+        self._slots = {}
+
+    def _pool(self, provider):
+        if provider not in self._pools:
+            self._pools[provider] = ConnectionPool(self.endpoints[provider], max_idle=self.max_in_flight)
+        return self._pools[provider]
+
+    def _slot(self, provider):
+        # Criado dentro do event loop, no primeiro uso
+        if provider not in self._slots:
+            self._slots[provider] = asyncio.Semaphore(self.max_in_flight)
+        return self._slots[provider]
+
+    def build_request(self, provider, prompt, max_tokens, stream=False):
+        """Corpo e headers do pedido (formato chat completions da OpenAI)"""
+        body = {
+            "model": provider.split("/", 1)[-1],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+        }
+        if stream:
+            body["stream"] = True
+        headers = {}
+        known = self.registry.get(provider)
+        api_key = os.getenv(API_KEY_ENV.get(known.vendor if known else "", ""), "")
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return json.dumps(body).encode("utf-8"), headers
+
+    def parse_response(self, provider, status, headers, data):
+        """Retorna {"text", "headers", "usage"}; 429 levanta RateLimitError"""
+        if status == 429:
+            raise RateLimitError(headers=headers)
+        if status >= 400:
+            raise HTTPError(status, data)
+        payload = json.loads(data)
+        usage = payload.get("usage") or {}
+        return {
+            "text": payload["choices"][0]["message"]["content"],
+            "headers": headers,
+            "usage": {"input_tokens": usage.get("prompt_tokens", 0),
+                      "output_tokens": usage.get("completion_tokens", 0)} if usage else None,
+        }
+
+    async def send_async(self, provider, prompt, max_tokens):
+        """Faz o pedido ao provider pelo pool de ligações dele"""
+        body, headers = self.build_request(provider, prompt, max_tokens)
+        status, response_headers, data = await self._pool(provider).request(body, headers)
+        return self.parse_response(provider, status, response_headers, data)
+
+    async def send_stream_async(self, provider, prompt, max_tokens, meta):
+        """
+        Pedido em streaming (server-sent events): gera os pedaços de texto à
+        medida que chegam; os headers e o usage ficam em `meta`.
+        """
+        body, headers = self.build_request(provider, prompt, max_tokens, stream=True)
+        status, response_headers, chunks = await self._pool(provider).open(body, headers)
+        meta["headers"] = response_headers
+        if status != 200:
+            data = b"".join([chunk async for chunk in chunks])
+            self.parse_response(provider, status, response_headers, data)  # levanta o erro
+
+        buffer = b""
+        async for data in chunks:
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                line = line.strip()
+                if not line.startswith(b"data:") or line == b"data: [DONE]":
+                    continue
+                event = json.loads(line[5:])
+                usage = event.get("usage")
+                if usage:
+                    meta["usage"] = {"input_tokens": usage.get("prompt_tokens", 0),
+                                     "output_tokens": usage.get("completion_tokens", 0)}
+                for choice in event.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+
+    async def _acquire_slot(self, provider, remaining):
+        """Espera por um pedido livre do provider até `remaining` s (None = sem limite)"""
+        try:
+            await asyncio.wait_for(self._slot(provider).acquire(), remaining)
+        except asyncio.TimeoutError:
+            raise SlotTimeout(f"{provider} sem pedidos livres antes do deadline") from None
+
+    async def _timed_send_async(self, provider, prompt, max_tokens, remaining):
+        """
+        send_async() dentro do limite de pedidos do provider, medindo a latência.
+        A espera pelo slot e o pedido cabem em `remaining` (o deadline da chamada);
+        o pedido, além disso, em request_timeout.
+        """
+        deadline = None if remaining is None else time.monotonic() + remaining
+        await self._acquire_slot(provider, remaining)
+        try:
+            timeout = self.request_timeout
+            if deadline is not None:
+                timeout = min(timeout, max(deadline - time.monotonic(), 0.001))
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self.send_async(provider, prompt, max_tokens), timeout)
+            except Exception:
+                self._record_latency(provider, time.monotonic() - start, ok=False)
+                raise
+            self._record_latency(provider, time.monotonic() - start)
+            return result
+        finally:
+            self._slot(provider).release()
+
+    async def _pick_provider(self, tokens):
+        """Como get_next_available_provider, mas salta providers sem pedidos livres"""
+        busy = {provider for provider in self.providers if self._slot(provider).locked()}
+        return await asyncio.to_thread(self._reserve_provider, tokens, busy)
+
+    def _reserve_provider(self, tokens, busy):
+        for candidate in self.registry.ranked():
+            if candidate.id in busy:
+                continue
+            reserved, _wait = self.limiter.try_acquire(candidate.id, tokens)
+            if reserved:
+                return self._index[candidate.id], candidate.id
+        # Todos cheios (ou limitados): fica na fila do melhor que tiver slot
+        return self.get_next_available_provider(tokens)
+
+    async def call_api(self, prompt, max_retries=3, max_tokens=512, timeout=None):
+        """Chama a API com fallback automático; desiste quando o deadline acaba"""
+        # Mesmo prompt já em curso noutra conversa: espera pela resposta dessa chamada
+        # (no máximo até ao próprio deadline)
+        key = cache_key("*", prompt, {"max_tokens": max_tokens})
+        deadline = self.timeout if timeout is None else timeout
+        try:
+            return await self.singleflight.do_async(key, self._call_api_async, prompt, max_retries, max_tokens,
+                                                    timeout, wait_timeout=deadline)
+        except TimeoutError as e:
+            self.telemetry.record_call("failed", deadline, 0)
+            return f"❌ Falha após 0 tentativas. Último erro: {e}"
+
+    async def _call_api_async(self, prompt, max_retries, max_tokens, timeout):
+        start = time.monotonic()
+        scheduler = RetryScheduler(self.limiter, self.providers, self.timeout if timeout is None else timeout)
+        attempt = 0
+        last_error = None
+        # Reserva input estimado + máximo de output; acerta-se com o uso real depois
+        prompt_tokens = estimate_tokens(prompt)
+        reserved_tokens = prompt_tokens + max_tokens
+        params = {"max_tokens": max_tokens}
+
+        while attempt < max_retries:
+            cached = await asyncio.to_thread(self.get_cached, prompt, params)
+            if cached is not None:
+                self.telemetry.record_call("cache", time.monotonic() - start, attempt)
+                return cached
+
+            idx, provider = await self._pick_provider(reserved_tokens)
+            if idx is None:
+                # Dormir só até o primeiro provider libertar um slot, se couber no deadline
+                if not await scheduler.sleep_async(reserved_tokens):
+                    last_error = TimeoutError("nenhum provider livre antes do deadline")
+                    break
+                attempt += 1
+                continue
+
+            try:
+                result = await self._timed_send_async(provider, prompt, max_tokens, scheduler.remaining())
+                response = await asyncio.to_thread(self._on_success, provider, prompt, params, result,
+                                                   prompt_tokens, reserved_tokens)
+                self.telemetry.record_call("ok", time.monotonic() - start, attempt)
+                return response
+            except SlotTimeout as e:
+                # Nada foi enviado: devolve a reserva sem contar como erro do provider
+                await asyncio.to_thread(self.limiter.reconcile_tokens, provider, reserved_tokens, 0)
+                last_error = e
+                attempt += 1
+                break
+            except asyncio.TimeoutError:
+                last_error = TimeoutError(f"{provider} sem resposta a tempo")
+                print(f"⌛ {provider}: sem resposta a tempo")
+                await asyncio.to_thread(self._on_error, provider, last_error, prompt_tokens, reserved_tokens)
+            except Exception as e:
+                print(f"❌ Erro em {provider}: {e}")
+                await asyncio.to_thread(self._on_error, provider, e, prompt_tokens, reserved_tokens)
+                last_error = e
+
+            attempt += 1
+            # Próximo provider livre já, ou espera só o necessário
+            if attempt < max_retries and not await scheduler.sleep_async(reserved_tokens, after_error=True):
+                break
+
+        self.telemetry.record_call("failed", time.monotonic() - start, max(attempt - 1, 0))
+        return f"❌ Falha após {attempt} tentativas. Último erro: {last_error}"
+
+    async def call_api_stream(self, prompt, max_retries=3, max_tokens=512, timeout=None):
+        """
+        Como call_api, mas gera a resposta aos pedaços à medida que chega.
+        Só muda de provider se o erro vier antes do primeiro pedaço.
+        """
+        call_start = time.monotonic()
+        scheduler = RetryScheduler(self.limiter, self.providers, self.timeout if timeout is None else timeout)
+        attempt = 0
+        last_error = None
+        prompt_tokens = estimate_tokens(prompt)
+        reserved_tokens = prompt_tokens + max_tokens
+        params = {"max_tokens": max_tokens}
+
+        while attempt < max_retries:
+            cached = await asyncio.to_thread(self.get_cached, prompt, params)
+            if cached is not None:
+                self.telemetry.record_call("cache", time.monotonic() - call_start, attempt)
+                yield cached
+                return
+
+            idx, provider = await self._pick_provider(reserved_tokens)
+            if idx is None:
+                if not await scheduler.sleep_async(reserved_tokens):
+                    last_error = TimeoutError("nenhum provider livre antes do deadline")
+                    break
+                attempt += 1
+                continue
+
+            chunks = []
+            meta = {}
+            try:
+                await self._acquire_slot(provider, scheduler.remaining())
+            except SlotTimeout as e:
+                await asyncio.to_thread(self.limiter.reconcile_tokens, provider, reserved_tokens, 0)
+                last_error = e
+                attempt += 1
+                break
+            upstream = 0.0  # só a espera pelo provider: o tempo de quem consome não é latência dele
+            finished = False
+            try:
+                stream = self.send_stream_async(provider, prompt, max_tokens, meta)
+                try:
+                    while True:
+                        # Cada pedaço tem de chegar dentro do request_timeout e do deadline
+                        timeout = self.request_timeout
+                        remaining = scheduler.remaining()
+                        if remaining is not None:
+                            if remaining <= 0:
+                                raise asyncio.TimeoutError()
+                            timeout = min(timeout, remaining)
+                        waited = time.monotonic()
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            upstream += time.monotonic() - waited
+                        chunks.append(chunk)
+                        yield chunk
+                    finished = True
+                finally:
+                    await stream.aclose()
+                    self._slot(provider).release()
+            except Exception as e:
+                finished = True
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"{provider} sem resposta a tempo")
+                self._record_latency(provider, upstream, ok=False)
+                print(f"❌ Erro em {provider}: {e}")
+                await asyncio.to_thread(self._on_error, provider, e, prompt_tokens, reserved_tokens)
+                if chunks:
+                    self.telemetry.record_call("failed", time.monotonic() - call_start, attempt)
+                    yield f"\n❌ Resposta interrompida: {e}"
+                    return
+                last_error = e
+                attempt += 1
+                if attempt < max_retries and not await scheduler.sleep_async(reserved_tokens, after_error=True):
+                    break
+                continue
+            finally:
+                if not finished:
+                    # Quem consome desistiu a meio (aclose()): acertar a reserva
+                    await asyncio.to_thread(self.limiter.reconcile_tokens, provider, reserved_tokens,
+                                            prompt_tokens + estimate_tokens("".join(chunks)))
+
+            self._record_latency(provider, upstream)
+            result = {"text": "".join(chunks), "headers": meta.get("headers"), "usage": meta.get("usage")}
+            await asyncio.to_thread(self._on_success, provider, prompt, params, result, prompt_tokens, reserved_tokens)
+            self.telemetry.record_call("ok", time.monotonic() - call_start, attempt)
+            return
+
+        self.telemetry.record_call("failed", time.monotonic() - call_start, max(attempt - 1, 0))
+        yield f"❌ Falha após {attempt} tentativas. Último erro: {last_error}"
+
+    def pool_stats(self):
+        """{provider: (ligações abertas, pedidos)}"""
+        return {provider: (pool.opened, pool.requests) for provider, pool in self._pools.items()}
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+
+if __name__ == "__main__":
+    from mock_provider import MockProvider
+
+    async def _demo():
+        server = await MockProvider(latency=0.05).start()
+        wrapper = AsyncAPIWrapper()
+        wrapper.endpoints = {provider: server.url for provider in wrapper.providers}
+        print("🔥 Async API Wrapper (contra o mock provider)\n")
+        results = await asyncio.gather(*(wrapper.call_api(f"Pergunta {i}") for i in range(5)))
+        for result in results:
+            print(f"Resultado: {result}")
+        print(f"\nLigações: {wrapper.pool_stats()}")
+        wrapper.close()
+        await server.close()
+
+    asyncio.run(_demo())
@@ -0,0 +1,146 @@
+"""
+BACKGROUND REPORTER
+Envio de eventos ao Mission Control numa thread à parte
+
+Quem reporta só põe o evento numa fila em memória (microssegundos) e segue;
+uma única thread envia-os pela ordem em que chegaram. Com send_batch, os
+eventos que chegam dentro de `batch_window` seguem num só pedido. Se o
+servidor estiver lento ou em baixo e a fila encher, a política de descarte
+decide o que perder.
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+
+# O que fazer com um evento novo quando a fila está cheia
+DROP_POLICIES = (
+    "drop_oldest",  # descarta o mais antigo (o dashboard fica com o estado mais recente)
+    "drop_newest",  # descarta o novo
+    "block",  # espera por espaço (até block_timeout; depois descarta o novo)
+)
+
+
+class BackgroundReporter:
+    """
+    Fila limitada + uma thread que chama send(evento) para cada evento, por
+    ordem - ou send_batch([eventos]) com tudo o que chegou dentro da janela.
+    A thread só arranca no primeiro submit(); os eventos ainda na fila à
+    saída do processo são enviados (até close_timeout segundos).
+    """
+
+    def __init__(self, send, max_queue=1000, drop_policy="drop_oldest",
+                 block_timeout=1.0, close_timeout=2.0, name="reporter",
+                 send_batch=None, batch_window=0.03, max_batch=200):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Política de descarte desconhecida: {drop_policy} "
+                             f"(disponíveis: {', '.join(DROP_POLICIES)})")
+        self.send = send
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.close_timeout = close_timeout
+        self.name = name
+        self.send_batch = send_batch
+        self.batch_window = batch_window  # s à espera de mais eventos antes de enviar o lote
+        self.max_batch = max_batch
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False  # a thread está a enviar um evento (já fora da fila)
+        self._flushing = 0  # flush() à espera: a janela do lote fecha logo
+        self._closed = False
+        self._thread = None
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.requests = 0  # chamadas a send/send_batch
+
+    def submit(self, event):
+        """Põe o evento na fila. False se foi descartado."""
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.drop_policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.drop_policy == "block":
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.block_timeout)
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+            self._queue.append(event)
+            if self._thread is None:
+                self._start()
+            self._cond.notify_all()
+        return True
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()  # acorda flush() e submit() em modo block
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                if self.send_batch is None:
+                    events = [self._queue.popleft()]
+                else:
+                    # Juntar o que chegar dentro da janela (ou até encher o lote)
+                    self._cond.wait_for(
+                        lambda: len(self._queue) >= self.max_batch or self._flushing or self._closed,
+                        self.batch_window,
+                    )
+                    events = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                self._busy = True
+            try:
+                self.requests += 1
+                if len(events) == 1:
+                    self.send(events[0])
+                else:
+                    self.send_batch(events)
+                self.sent += len(events)
+            except Exception as e:
+                self.failed += len(events)
+                print(f"⚠️ {self.name}: {len(events)} evento(s) não enviado(s) ({e})")
+
+    def flush(self, timeout=None):
+        """Espera até a fila esvaziar. False se o timeout acabou antes."""
+        with self._cond:
+            if self._thread is None:
+                return True
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=None):
+        """Envia o que falta (até `timeout`) e pára a thread"""
+        timeout = self.close_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "requests": self.requests,
+        }
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+CHIMOCO BENCHMARKS
+Microbenchmarks dos subsistemas (rate limiter, cache, failover...)
+
+Uso:
+    python3 benchmark.py                 # corre todos
+    python3 benchmark.py rate_limiter    # corre só um
+"""
+
+import sys
+import time
+
+
+def bench_rate_limiter(duration=1.0):
+    """check_rate_limit + record_call por segundo, para vários limites/min"""
+    from rate_limiter import RateLimiter
+
+    print("⏱️ RateLimiter.check_rate_limit (janela deslizante O(1))")
+    for limit in (50, 5_000, 500_000):
+        rl = RateLimiter()
+        rl.max_calls_per_minute = limit
+        rl.min_interval = 0
+        provider = "bench/provider"  # fora do registry: usa max_calls_per_minute
+
+        checks = 0
+        allowed = 0
+        start = time.perf_counter()
+        end = start + duration
+        while time.perf_counter() < end:
+            for _ in range(1000):
+                ok, _reason = rl.check_rate_limit(provider)
+                if ok:
+                    rl.record_call(provider)
+                    allowed += 1
+            checks += 1000
+        elapsed = time.perf_counter() - start
+
+        print(f"  {limit:>7}/min: {checks / elapsed:>12,.0f} checks/s "
+              f"({allowed:,} permitidas)")
+
+
+def _shared_acquire_worker(path, duration, results):
+    from shared_state import SharedState
+
+    state = SharedState(path)
+    acquired = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        ok, _wait = state.try_acquire("anthropic/claude-haiku-4-5", 10**9, 0)
+        acquired += ok
+    results.put(acquired)
+
+
+def bench_shared_state(duration=2.0):
+    """try_acquire no SharedState (SQLite WAL) com 1 e 8 processos em paralelo"""
+    import multiprocessing
+    import os
+    import tempfile
+
+    print("⏱️ SharedState.try_acquire entre processos (SQLite WAL)")
+    for procs in (1, 8):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state.db")
+            results = multiprocessing.Queue()
+            workers = [
+                multiprocessing.Process(target=_shared_acquire_worker, args=(path, duration, results))
+                for _ in range(procs)
+            ]
+            for w in workers:
+                w.start()
+            total = sum(results.get() for _ in workers)
+            for w in workers:
+                w.join()
+
+        print(f"  {procs} processo(s): {total / duration:>10,.0f} acquires/s no total")
+
+
+def bench_response_cache(keys=1_000_000):
+    """get/set na ResponseCache com 1M chaves"""
+    from response_cache import ResponseCache
+
+    print(f"⏱️ ResponseCache com {keys:,} chaves")
+    cache = ResponseCache(max_entries=keys, max_bytes=1 << 40, ttl=3600, sweep_interval=0)
+    key_list = [f"prompt_{i}" for i in range(keys)]
+    value = "[Resposta]"
+
+    start = time.perf_counter()
+    for key in key_list:
+        cache.set(key, value)
+    elapsed = time.perf_counter() - start
+    print(f"  set:            {keys / elapsed:>12,.0f} ops/s")
+
+    start = time.perf_counter()
+    for key in key_list:
+        cache.get(key)
+    elapsed = time.perf_counter() - start
+    print(f"  get (hit):      {keys / elapsed:>12,.0f} ops/s")
+
+    # Cheia: cada set novo despeja a entrada menos usada
+    start = time.perf_counter()
+    for i in range(keys):
+        cache.set(f"novo_{i}", value)
+    elapsed = time.perf_counter() - start
+    print(f"  set (despejo):  {keys / elapsed:>12,.0f} ops/s")
+
+    stats = cache.stats()
+    print(f"  {stats['entries']:,} entradas, {stats['bytes'] / 1e6:.0f} MB, "
+          f"{stats['evictions']:,} despejos")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+def bench_model_routing(requests=5_000, seed=42):
+    """Simulação: routing por latência/erros vs round-robin (latência ponta-a-ponta)"""
+    import random
+    from model_failover import ModelFailover
+    from provider_registry import ProviderRegistry
+
+    # (mediana s, dispersão lognormal, taxa de erro, latência até ao erro s)
+    profiles = {
+        "haiku": (0.60, 0.35, 0.02, 0.5),
+        "openai": (0.90, 0.50, 0.02, 0.8),
+        "gpt4": (1.40, 0.50, 0.02, 1.0),
+        "gemini": (0.45, 0.30, 0.15, 2.0),
+    }
+
+    def simulate(route):
+        rng = random.Random(seed)
+        # Tempo simulado: o ranking do registry é recalculado a cada pedido
+        fo = ModelFailover(registry=ProviderRegistry(refresh_interval=0))
+        totals = []
+        for n in range(requests):
+            total = 0.0
+            for _attempt in range(len(fo.models)):
+                idx = route(fo, n)
+                median, sigma, error_rate, error_latency = profiles[fo.models[idx]["name"]]
+                if rng.random() < error_rate:
+                    total += error_latency
+                    fo.record_result(idx, error_latency, ok=False)
+                    fo.current_idx = (idx + 1) % len(fo.models)
+                    continue
+                latency = rng.lognormvariate(0, sigma) * median
+                total += latency
+                fo.record_result(idx, latency, ok=True)
+                break
+            totals.append(total)
+        return totals
+
+    def round_robin(fo, n):
+        fo.current_idx = n % len(fo.models)
+        return fo.current_idx
+
+    def latency_aware(fo, n):
+        idx, _model = fo.get_next_available_model()
+        return fo.current_idx if idx is None else idx
+
+    print(f"⏱️ Routing de modelos ({requests:,} pedidos simulados)")
+    for name, route in (("round-robin", round_robin), ("latência/erros", latency_aware)):
+        totals = simulate(route)
+        print(f"  {name:<15} média {sum(totals) / len(totals) * 1000:>6.0f}ms  "
+              f"p95 {_percentile(totals, 0.95) * 1000:>6.0f}ms  "
+              f"p99 {_percentile(totals, 0.99) * 1000:>6.0f}ms")
+
+
+def bench_provider_registry(lookups=1_000_000):
+    """Melhor provider disponível: ranking em cache vs recalculado a cada pedido"""
+    from provider_registry import ProviderRegistry
+
+    print(f"⏱️ ProviderRegistry.best() ({lookups:,} lookups)")
+    for name, refresh in (("em cache", 1.0), ("recalculado", 0)):
+        registry = ProviderRegistry(refresh_interval=refresh)
+        for provider in registry.providers:
+            provider.stats.record(0.5)
+        start = time.perf_counter()
+        for _ in range(lookups):
+            registry.best()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<12} {lookups / elapsed:>12,.0f} lookups/s")
+
+
+def bench_telemetry(records=1_000_000):
+    """Custo de registar uma chamada na telemetria (o que fica no caminho de cada pedido)"""
+    import random
+    from telemetry import Telemetry
+
+    telemetry = Telemetry()
+    latencies = [random.expovariate(1 / 0.3) for _ in range(1000)]
+    print(f"⏱️ Telemetry ({records:,} registos)")
+    for name, record in (
+        ("record_latency", lambda seconds: telemetry.record_latency("openai/gpt-4o-mini", seconds)),
+        ("record_call", lambda seconds: telemetry.record_call("ok", seconds, 0)),
+        ("record_usage", lambda seconds: telemetry.record_usage("openai/gpt-4o-mini", 120, 300)),
+    ):
+        start = time.perf_counter()
+        for n in range(records):
+            record(latencies[n % 1000])
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<15} {elapsed / records * 1e9:>6.0f} ns/registo")
+
+    start = time.perf_counter()
+    text = telemetry.render_prometheus()
+    print(f"  render_prometheus {(time.perf_counter() - start) * 1000:>4.1f} ms ({len(text):,} bytes)")
+
+
+def _start_mission_server():
+    """server.js numa porta livre (None se não houver node); retorna (processo, url)"""
+    import os
+    import shutil
+    import socket
+    import subprocess
+
+    if not shutil.which("node"):
+        return None, None
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    root = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(["node", "server.js"], cwd=root, env=dict(os.environ, PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    return None, None
+
+
+def bench_reporting(lines=1_000):
+    """1000 linhas de pensamento para o server.js: POST síncrono vs fila em background vs lotes"""
+    import contextlib
+    import io
+    from chimoco_api import ChimocoAPI
+
+    process, url = _start_mission_server()
+    if process is None:
+        print("⏭️ reporting: precisa de node e das dependências do server.js")
+        return
+    print(f"⏱️ ChimocoAPI.add_thinking ({lines:,} linhas para o server.js local)")
+    try:
+        for name, options in (
+            ("síncrono", {"background": False}),
+            ("background", {"batch_window": 0}),
+            ("lotes 30ms", {"batch_window": 0.03}),
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                api = ChimocoAPI(url, max_queue=lines * 2, **options)
+                start = time.perf_counter()
+                api.start_task("bench")
+                for n in range(lines):
+                    api.add_thinking(f"→ linha {n}")
+                caller = time.perf_counter() - start
+                api.flush()
+                delivered = time.perf_counter() - start
+            requests_made = api.reporter.requests if api.reporter else lines + 1
+            print(f"  {name:<11} {caller / lines * 1e6:>8.1f} µs/linha para quem reporta, "
+                  f"{delivered / lines * 1e6:>7.1f} µs/linha até entregar ({requests_made:,} pedidos)")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def _start_https_stand_in(directory):
+    """Servidor HTTPS local (certificado auto-assinado) que responde {"success": true}"""
+    import os
+    import ssl
+    import subprocess
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers e corpo vão em writes separados
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = b'{"success": true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://127.0.0.1:{server.server_port}"
+
+
+def bench_mission_transport(events=500):
+    """Eventos/s para um servidor HTTPS local: requests.post por evento vs transporte partilhado"""
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import requests
+    import urllib3
+    from mission_transport import MissionTransport
+
+    if not shutil.which("openssl"):
+        print("⏭️ mission_transport: precisa do openssl para o certificado de teste")
+        return
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    with tempfile.TemporaryDirectory() as directory:
+        server, url = _start_https_stand_in(directory)
+        print(f"⏱️ POST /api/task/thinking para HTTPS local ({events:,} eventos)")
+        transport = MissionTransport(url, websocket=False)
+        payload = {"text": "→ evento de teste"}
+
+        def one_shot(_n):
+            requests.post(f"{url}/api/task/thinking", json=payload, verify=False, timeout=5)
+
+        def pooled(_n):
+            transport.post("/api/task/thinking", json=payload)
+
+        try:
+            for name, send, threads in (
+                ("requests.post", one_shot, 1),
+                ("transporte", pooled, 1),
+                ("requests.post", one_shot, 4),
+                ("transporte", pooled, 4),
+            ):
+                start = time.perf_counter()
+                if threads == 1:
+                    for n in range(events):
+                        send(n)
+                else:
+                    with ThreadPoolExecutor(threads) as executor:
+                        list(executor.map(send, range(events)))
+                elapsed = time.perf_counter() - start
+                print(f"  {name:<14} {threads} thread(s): {events / elapsed:>8,.0f} eventos/s")
+        finally:
+            transport.close()
+            server.shutdown()
+
+
+def bench_mission_socket(events=2_000):
+    """Eventos de tarefa para o server.js: um POST por evento vs frames no WebSocket do reporter"""
+    from mission_transport import MissionTransport
+
+    process, url = _start_mission_server()
+    if process is None:
+        print("⏭️ mission_socket: precisa de node e das dependências do server.js")
+        return
+    print(f"⏱️ POST /api/task/thinking para o server.js local ({events:,} eventos)")
+    try:
+        for name, websocket in (("HTTP", False), ("WebSocket", True)):
+            transport = MissionTransport(url, websocket=websocket)
+            transport.post("/api/task/start", json={"taskName": "bench"})  # liga antes de medir
+            start = time.perf_counter()
+            for n in range(events):
+                transport.post("/api/task/thinking", json={"text": f"→ linha {n}"})
+            caller = time.perf_counter() - start
+            transport.flush(10)
+            delivered = time.perf_counter() - start
+            transport.close()
+            print(f"  {name:<10} {caller / events * 1e6:>8.1f} µs/evento para quem reporta, "
+                  f"{delivered / events * 1e6:>7.1f} µs/evento até o servidor confirmar")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def bench_async_wrapper(turns=20, latency=0.02):
+    """AsyncAPIWrapper contra o mock provider com 1, 10 e 100 conversas em simultâneo"""
+    import asyncio
+    from async_api_wrapper import AsyncAPIWrapper
+    from mock_provider import MockProvider
+    from provider_registry import DEFAULT_PROVIDERS, ProviderRegistry
+    from rate_limiter import LocalState, RateLimiter
+
+    async def conversation(api, n, latencies):
+        for turn in range(turns):
+            start = time.perf_counter()
+            await api.call_api(f"conversa {n}, mensagem {turn}", timeout=30)
+            latencies.append(time.perf_counter() - start)
+
+    async def run():
+        server = await MockProvider(latency=latency).start()
+        print(f"⏱️ AsyncAPIWrapper vs mock provider ({latency * 1000:.0f}ms/resposta, "
+              f"{turns} mensagens por conversa)")
+        for conversations in (1, 10, 100):
+            # Limites fora do caminho: mede-se o wrapper, não o rate limiting
+            registry = ProviderRegistry([
+                dict(spec, calls_per_minute=10**9, tokens_per_minute=10**12) for spec in DEFAULT_PROVIDERS
+            ])
+            limiter = RateLimiter(state=LocalState(), registry=registry)
+            limiter.min_interval = 0
+            api = AsyncAPIWrapper(limiter=limiter, endpoints={p: server.url for p in registry.ids()},
+                                  max_in_flight=32)
+
+            latencies = []
+            start = time.perf_counter()
+            await asyncio.gather(*(conversation(api, n, latencies) for n in range(conversations)))
+            elapsed = time.perf_counter() - start
+
+            opened = sum(opened for opened, _requests in api.pool_stats().values())
+            print(f"  {conversations:>3} conversas: {len(latencies) / elapsed:>8,.0f} chamadas/s  "
+                  f"p50 {_percentile(latencies, 0.50) * 1000:>5.0f}ms  "
+                  f"p95 {_percentile(latencies, 0.95) * 1000:>5.0f}ms  "
+                  f"({opened} ligações para {len(latencies):,} pedidos)")
+            api.close()
+            limiter.close()
+        await server.close()
+
+    asyncio.run(run())
+
+
+def bench_batch(prompts=500, latency=0.02):
+    """500 prompts: call_api um a um vs call_api_batch espalhado pelos providers"""
+    import contextlib
+    import io
+    from api_wrapper import SmartAPIWrapper
+    from provider_registry import DEFAULT_PROVIDERS, ProviderRegistry
+    from rate_limiter import LocalState, RateLimiter
+
+    class SimulatedAPI(SmartAPIWrapper):
+        def send(self, provider, prompt, max_tokens):
+            time.sleep(latency)
+            return {"text": f"[Resposta de {provider}]", "headers": {}, "usage": None}
+
+    def make_api():
+        registry = ProviderRegistry([dict(spec, calls_per_minute=10**6) for spec in DEFAULT_PROVIDERS])
+        limiter = RateLimiter(state=LocalState(), registry=registry)
+        limiter.min_interval = latency / 2
+        return SimulatedAPI(limiter=limiter)
+
+    print(f"⏱️ {prompts} prompts ({latency * 1000:.0f}ms por resposta, "
+          f"min_interval {latency / 2 * 1000:.0f}ms por provider)")
+    items = [f"resume o registo número {i}" for i in range(prompts)]
+    for name, run in (("call_api", lambda api: [api.call_api(p, max_tokens=64) for p in items]),
+                      ("call_api_batch", lambda api: api.call_api_batch(items, max_tokens=64))):
+        api = make_api()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run(api)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for r in results if r.startswith("❌"))
+        print(f"  {name:<15} {elapsed:>6.2f}s  ({prompts / elapsed:,.0f} prompts/s, {failed} falhas)")
+        api.limiter.close()
+
+
+BENCHMARKS = {
+    "rate_limiter": bench_rate_limiter,
+    "shared_state": bench_shared_state,
+    "response_cache": bench_response_cache,
+    "model_routing": bench_model_routing,
+    "provider_registry": bench_provider_registry,
+    "telemetry": bench_telemetry,
+    "reporting": bench_reporting,
+    "mission_transport": bench_mission_transport,
+    "mission_socket": bench_mission_socket,
+    "async_wrapper": bench_async_wrapper,
+    "batch": bench_batch,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Benchmark desconhecido: {name} (disponíveis: {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        BENCHMARKS[name]()
+        print()
@@ -1,89 +1,167 @@
 """
 CHIMOCO MISSION CONTROL - API CLIENT
 Envia dados em tempo real pro servidor WebSocket
+
+Importar este módulo não faz pedidos nem carrega o requests: a ligação
+(e o health check, numa thread à parte) só acontece no primeiro uso.
 """
 
-import requests
 import json
+import os
+import time
 from datetime import datetime
 import threading
+from background_reporter import BackgroundReporter
+from mission_socket import EVENT_TYPES  # tipo de cada evento no /api/events/batch
+from mission_spool import EventSpool
+from mission_transport import EventSpooled, MissionTransport
+
+# Eventos que o servidor não recebeu ficam aqui até ele voltar ("" = sem spool)
+API_SPOOL_PATH = os.getenv("CHIMOCO_API_SPOOL", "/tmp/chimoco_api_spool.jsonl")
 
 class ChimocoAPI:
-    def __init__(self, server_url="http://localhost:3000"):
+    def __init__(self, server_url="http://localhost:3000", background=True,
+                 max_queue=1000, drop_policy="drop_oldest", batch_window=0.03, health_ttl=30,
+                 spool_path=API_SPOOL_PATH):
         self.server_url = server_url
+        # Sessão keep-alive criada no primeiro pedido; com o servidor em baixo os
+        # eventos vão para o spool e são reenviados por ordem quando ele voltar
+        self.transport = MissionTransport(
+            server_url, verify=True, spool=EventSpool(spool_path) if spool_path else None
+        )
         self.current_task = None
         self.thinking_history = []
+        self.batch_supported = True  # passa a False se o servidor não tiver /api/events/batch
+        
+        # Eventos de tarefa enviados numa thread à parte, pela ordem em que
+        # foram reportados; os que chegam dentro de batch_window seguem num
+        # só pedido. background=False volta aos POSTs síncronos
+        self.reporter = BackgroundReporter(
+            self._send_event, max_queue=max_queue, drop_policy=drop_policy, name="chimoco-reporter",
+            send_batch=self._send_events if batch_window else None, batch_window=batch_window,
+        ) if background else None
         
-        # Testar conexão
+        # Health check em background, com o resultado em cache durante health_ttl segundos
+        self.health_ttl = health_ttl
+        self.connected = None  # None = ainda não se sabe
+        self._health_checked = 0.0
+        self._health_thread = None
+        self._health_lock = threading.Lock()
+    
+    def check_health(self, wait=None):
+        """
+        Resultado do health check (True/False), em cache. Se estiver expirado
+        arranca outro numa thread; com `wait` espera por ele até `wait`
+        segundos, senão retorna logo o último conhecido (None = ainda não há).
+        """
+        with self._health_lock:
+            expired = time.monotonic() - self._health_checked >= self.health_ttl
+            running = self._health_thread is not None and self._health_thread.is_alive()
+            if expired and not running:
+                self._health_thread = threading.Thread(
+                    target=self._run_health_check, name="chimoco-health", daemon=True
+                )
+                self._health_thread.start()
+            thread = self._health_thread
+        if wait and thread is not None:
+            thread.join(wait)
+        return self.connected
+    
+    def _run_health_check(self):
         try:
-            response = requests.get(f"{self.server_url}/health", timeout=2)
-            if response.status_code == 200:
+            response = self.transport.get("/health", timeout=2)
+            connected = response.status_code == 200
+            if connected:
                 print("✅ Conectado ao Chimoco Mission Control Server")
             else:
                 print("⚠️ Servidor não respondendo corretamente")
         except Exception as e:
+            connected = False
             print(f"⚠️ Servidor não está disponível: {e}")
+        self.connected = connected
+        self._health_checked = time.monotonic()
     
-    def start_task(self, task_name, model="Haiku"):
-        """Inicia uma nova tarefa"""
+    def _send_event(self, event):
+        """POST de um evento (path, data); corre na thread do reporter"""
+        path, data = event
         try:
-            data = {
-                "taskName": task_name,
-                "model": model
-            }
-            response = requests.post(
-                f"{self.server_url}/api/task/start",
-                json=data,
-                timeout=5
-            )
-            self.current_task = task_name
-            self.thinking_history = []
-            print(f"▶️ Tarefa iniciada: {task_name}")
-            return response.json()
+            response = self.transport.post(path, json=data, timeout=5)
+        except EventSpooled:
+            return None  # fica no spool; o transporte reenvia-o
+        response.raise_for_status()
+        return response.json()
+    
+    def _send_events(self, events):
+        """Vários eventos num só POST; servidor antigo sem o endpoint = um a um"""
+        if self.batch_supported:
+            try:
+                response = self.transport.post(
+                    "/api/events/batch",
+                    json={"events": [dict(data, type=EVENT_TYPES[path]) for path, data in events]},
+                    timeout=5
+                )
+            except EventSpooled:
+                return None
+            if response.status_code != 404:
+                response.raise_for_status()
+                return response.json()
+            self.batch_supported = False
+        for event in events:
+            self._send_event(event)
+    
+    def _report(self, path, data, error_message):
+        """
+        Em background: põe o evento na fila e retorna logo (True, ou False se
+        foi descartado). Síncrono: retorna a resposta do servidor, ou None.
+        """
+        self.check_health()  # só arranca no primeiro uso (e depois de expirar)
+        if self.reporter:
+            return self.reporter.submit((path, data))
+        try:
+            return self._send_event((path, data))
         except Exception as e:
-            print(f"❌ Erro ao iniciar tarefa: {e}")
+            print(f"❌ {error_message}: {e}")
             return None
     
+    def start_task(self, task_name, model="Haiku"):
+        """Inicia uma nova tarefa"""
+        data = {
+            "taskName": task_name,
+            "model": model
+        }
+        self.current_task = task_name
+        self.thinking_history = []
+        print(f"▶️ Tarefa iniciada: {task_name}")
+        return self._report("/api/task/start", data, "Erro ao iniciar tarefa")
+    
     def add_thinking(self, text):
         """Adiciona um pensamento/step"""
-        try:
-            data = {"text": text}
-            response = requests.post(
-                f"{self.server_url}/api/task/thinking",
-                json=data,
-                timeout=5
-            )
-            self.thinking_history.append(text)
-            print(f"🧠 {text}")
-            return response.json()
-        except Exception as e:
-            print(f"❌ Erro ao enviar pensamento: {e}")
-            return None
+        self.thinking_history.append(text)
+        print(f"🧠 {text}")
+        return self._report("/api/task/thinking", {"text": text}, "Erro ao enviar pensamento")
     
     def complete_task(self, action=None, success=True):
         """Completa uma tarefa"""
-        try:
-            data = {
-                "action": action or self.current_task,
-                "success": success
-            }
-            response = requests.post(
-                f"{self.server_url}/api/task/complete",
-                json=data,
-                timeout=5
-            )
-            print(f"✅ Tarefa concluída!")
-            self.current_task = None
-            return response.json()
-        except Exception as e:
-            print(f"❌ Erro ao completar tarefa: {e}")
-            return None
+        data = {
+            "action": action or self.current_task,
+            "success": success
+        }
+        self.current_task = None
+        print(f"✅ Tarefa concluída!")
+        return self._report("/api/task/complete", data, "Erro ao completar tarefa")
+    
+    def flush(self, timeout=None):
+        """Espera que os eventos em fila sejam enviados e confirmados (True se tudo chegou)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.reporter and not self.reporter.flush(timeout):
+            return False
+        return self.transport.flush(None if deadline is None else max(deadline - time.monotonic(), 0))
     
     def get_status(self):
         """Obtém status atual"""
         try:
-            response = requests.get(
-                f"{self.server_url}/api/status",
+            response = self.transport.get(
+                "/api/status",
                 timeout=5
             )
             return response.json()
@@ -93,9 +171,11 @@ class ChimocoAPI:
     
     def reset(self):
         """Reset completo"""
+        # Eventos ainda em fila chegariam depois do reset
+        self.flush(timeout=5)
         try:
-            response = requests.post(
-                f"{self.server_url}/api/reset",
+            response = self.transport.post(
+                "/api/reset",
                 timeout=5
             )
             self.current_task = None
@@ -107,7 +187,7 @@ class ChimocoAPI:
             return None
 
 
-# Instância global
+# Instância global (não liga ao servidor até ser usada)
 chimoco = ChimocoAPI()
 
 
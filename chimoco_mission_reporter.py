@@ -4,20 +4,18 @@ CHIMOCO MISSION REPORTER
 Auto-reports Chimoco's responses to Mission Control Server
 """
 
-import requests
 import json
 import os
 from datetime import datetime
 
-MISSION_SERVER = "https://16.16.255.70:3000"
+from mission_transport import transport
 
 def report_task_start(task_name):
     """Start a new task"""
     try:
-        res = requests.post(
-            f"{MISSION_SERVER}/api/task/start",
+        res = transport.post(
+            "/api/task/start",
             json={"taskName": task_name},
-            verify=False,
             timeout=5
         )
         print(f"✅ Task started: {task_name}")
@@ -29,10 +27,9 @@ def report_task_start(task_name):
 def report_thinking(text):
     """Report thinking/reasoning"""
     try:
-        res = requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        res = transport.post(
+            "/api/task/thinking",
             json={"text": text},
-            verify=False,
             timeout=5
         )
         print(f"💭 Thinking: {text[:50]}...")
@@ -45,16 +42,15 @@ def report_response(message, is_complete=False):
     """Report response/action"""
     try:
         if is_complete:
-            endpoint = f"{MISSION_SERVER}/api/task/complete"
+            endpoint = "/api/task/complete"
             data = {"message": message}
         else:
-            endpoint = f"{MISSION_SERVER}/api/task/thinking"
+            endpoint = "/api/task/thinking"
             data = {"text": f"Respondendo: {message[:100]}..."}
         
-        res = requests.post(
+        res = transport.post(
             endpoint,
             json=data,
-            verify=False,
             timeout=5
         )
         print(f"📤 Reported: {message[:50]}...")
@@ -87,9 +87,11 @@ function handleServerMessage(data) {
       break;
     
     case 'thinking':
-      // Pensamento recebido
-      appendThinking(data.text);
-      console.log('🧠', data.text);
+      // Pensamento(s) recebido(s) - um lote traz várias linhas
+      (data.lines || [data.text]).forEach(text => {
+        appendThinking(text);
+        console.log('🧠', text);
+      });
       break;
     
     case 'taskComplete':
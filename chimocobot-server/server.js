@@ -3,6 +3,7 @@
 const express = require('express');
 const WebSocket = require('ws');
 const cors = require('cors');
+const crypto = require('crypto');
 const https = require('https');
 const fs = require('fs');
 const { spawn } = require('child_process');
@@ -19,12 +20,20 @@ const server = https.createServer(options, app);
 const wss = new WebSocket.Server({ 
   server,
   perMessageDeflate: false,
-  clientTracking: true
+  clientTracking: true,
+  verifyClient: ({ req }, done) => {
+    if (!isReporter(req) || reporterAuthorized(req)) return done(true);
+    console.log('🚫 Reporter recusado: token inválido');
+    done(false, 401, 'Unauthorized');
+  }
 });
 const path = require('path');
 
 const PORT = process.env.PORT || 3000;
 
+// Token dos reporters Python (WebSocket em /reporter); vazio = sem autenticação
+const REPORTER_TOKEN = process.env.MISSION_TOKEN || '';
+
 // Middleware
 app.use(cors());
 app.use(express.json());
@@ -43,8 +52,25 @@ let currentTask = {
 
 let taskHistory = [];
 
+// Ligações em /reporter são reporters Python, não dashboards
+function isReporter(req) {
+  return req.url.startsWith('/reporter');
+}
+
+function reporterAuthorized(req) {
+  if (!REPORTER_TOKEN) return true;
+  const given = Buffer.from((req.headers['authorization'] || '').replace(/^Bearer /, ''));
+  const expected = Buffer.from(REPORTER_TOKEN);
+  return given.length === expected.length && crypto.timingSafeEqual(given, expected);
+}
+
 // WebSocket - Conexão de clientes
-wss.on('connection', (ws) => {
+wss.on('connection', (ws, req) => {
+  if (isReporter(req)) {
+    acceptReporter(ws, req);
+    return;
+  }
+  
   console.log('✅ Cliente conectado ao Mission Control');
   
   // Enviar estado atual
@@ -77,10 +103,8 @@ function broadcastToClients(data) {
   });
 }
 
-// API - Iniciar tarefa
-app.post('/api/task/start', (req, res) => {
-  const { taskName, model } = req.body;
-  
+// Eventos de tarefa (usados pelos endpoints individuais e pelo lote)
+function startTask({ taskName, model }) {
   currentTask = {
     taskName: taskName || 'Nova tarefa',
     status: 'RUNNING',
@@ -95,31 +119,24 @@ app.post('/api/task/start', (req, res) => {
     type: 'taskStart',
     task: currentTask
   });
-  
-  res.json({ success: true, task: currentTask });
-});
+}
 
-// API - Adicionar pensamento
-app.post('/api/task/thinking', (req, res) => {
-  const { text } = req.body;
+function addThinking(lines) {
+  lines = lines.filter(Boolean);
+  if (lines.length === 0) return;
   
-  if (text) {
-    currentTask.thinking.push(text);
-    
-    broadcastToClients({
-      type: 'thinking',
-      text: text,
-      thinkingHistory: currentTask.thinking
-    });
-  }
+  currentTask.thinking.push(...lines);
   
-  res.json({ success: true });
-});
+  // Só as linhas novas (os clientes já têm as anteriores); text = a última,
+  // para clientes que só conhecem uma linha por mensagem
+  broadcastToClients({
+    type: 'thinking',
+    text: lines[lines.length - 1],
+    lines: lines
+  });
+}
 
-// API - Completar tarefa
-app.post('/api/task/complete', (req, res) => {
-  const { success, action } = req.body;
-  
+function completeTask({ success, action }) {
   currentTask.status = 'COMPLETED';
   
   // Adicionar ao histórico
@@ -156,10 +173,109 @@ app.post('/api/task/complete', (req, res) => {
       task: currentTask
     });
   }, 1000);
+}
+
+// Aplica eventos { type: 'start' | 'thinking' | 'complete', ...campos do endpoint }
+// por ordem; linhas de thinking seguidas vão num só broadcast. Retorna os ignorados.
+function applyEvents(events) {
+  let thinking = [];
+  let skipped = 0;
   
+  const flushThinking = () => {
+    addThinking(thinking);
+    thinking = [];
+  };
+  
+  for (const event of events) {
+    if (event.type === 'thinking') {
+      thinking.push(event.text);
+      continue;
+    }
+    flushThinking();
+    if (event.type === 'start') {
+      startTask(event);
+    } else if (event.type === 'complete') {
+      completeTask(event);
+    } else {
+      skipped++;
+    }
+  }
+  flushThinking();
+  return skipped;
+}
+
+// Reporters por WebSocket: cada frame { seq, events: [...] } recebe { type: 'ack', seq }.
+// O último seq aplicado fica por sessão, para a retoma depois de uma nova ligação
+// não aplicar duas vezes os frames reenviados.
+const reporterSessions = new Map();
+const MAX_REPORTER_SESSIONS = 100;
+
+function acceptReporter(ws, req) {
+  const session = new URL(req.url, 'http://localhost').searchParams.get('session') || 'default';
+  console.log(`🔌 Reporter ligado (${session})`);
+  
+  ws.send(JSON.stringify({
+    type: 'welcome',
+    lastSeq: reporterSessions.get(session) || 0
+  }));
+  
+  ws.on('message', (data) => {
+    let frame;
+    try {
+      frame = JSON.parse(data);
+    } catch (error) {
+      return;
+    }
+    if (typeof frame.seq !== 'number') return;
+    
+    if (frame.seq > (reporterSessions.get(session) || 0)) {
+      applyEvents(Array.isArray(frame.events) ? frame.events : []);
+      // Reinserir mantém o Map por ordem de uso: a mais antiga sai primeiro
+      reporterSessions.delete(session);
+      reporterSessions.set(session, frame.seq);
+      if (reporterSessions.size > MAX_REPORTER_SESSIONS) {
+        reporterSessions.delete(reporterSessions.keys().next().value);
+      }
+    }
+    ws.send(JSON.stringify({ type: 'ack', seq: frame.seq }));
+  });
+  
+  ws.on('close', () => {
+    console.log(`🔌 Reporter desligado (${session})`);
+  });
+  
+  ws.on('error', (error) => {
+    console.error('Erro no reporter WebSocket:', error);
+  });
+}
+
+// API - Iniciar tarefa
+app.post('/api/task/start', (req, res) => {
+  startTask(req.body);
+  res.json({ success: true, task: currentTask });
+});
+
+// API - Adicionar pensamento
+app.post('/api/task/thinking', (req, res) => {
+  addThinking([req.body.text]);
+  res.json({ success: true });
+});
+
+// API - Completar tarefa
+app.post('/api/task/complete', (req, res) => {
+  completeTask(req.body);
   res.json({ success: true });
 });
 
+// API - Vários eventos num só pedido, aplicados por ordem:
+// { events: [{ type: 'start' | 'thinking' | 'complete', ...campos do endpoint }] }
+app.post('/api/events/batch', (req, res) => {
+  const events = Array.isArray(req.body.events) ? req.body.events : [];
+  const skipped = applyEvents(events);
+  
+  res.json({ success: true, applied: events.length - skipped, skipped });
+});
+
 // API - Status
 app.get('/api/status', (req, res) => {
   res.json({
@@ -332,6 +448,51 @@ app.post('/api/response/submit', (req, res) => {
   });
 });
 
+// Respostas em streaming: texto acumulado por streamId até chegar o último pedaço
+const activeStreams = new Map();
+const MAX_ACTIVE_STREAMS = 50;
+
+// API - Pedaço de uma resposta em streaming
+app.post('/api/response/chunk', (req, res) => {
+  const { streamId, index, chunk, done, responseText } = req.body;
+  
+  if (!streamId) {
+    return res.status(400).json({ error: 'streamId required' });
+  }
+  
+  const text = (activeStreams.get(streamId) || '') + (chunk || '');
+  
+  // Relay imediato para o dashboard
+  broadcastToClients({
+    type: 'response_chunk',
+    streamId: streamId,
+    index: index,
+    chunk: chunk || '',
+    done: !!done
+  });
+  
+  if (done) {
+    activeStreams.delete(streamId);
+    const finalText = responseText || text;
+    
+    // Add to history
+    taskHistory.push({
+      timestamp: new Date().toISOString(),
+      taskName: `Response: ${finalText.substring(0, 50)}...`,
+      type: 'response'
+    });
+    if (taskHistory.length > 20) taskHistory.shift();
+  } else {
+    activeStreams.set(streamId, text);
+    // Streams abandonados (cliente morreu a meio): descarta os mais antigos
+    if (activeStreams.size > MAX_ACTIVE_STREAMS) {
+      activeStreams.delete(activeStreams.keys().next().value);
+    }
+  }
+  
+  res.json({ success: true });
+});
+
 // Health check
 app.get('/health', (req, res) => {
   res.json({ status: 'ok', timestamp: new Date() });
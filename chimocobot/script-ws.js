@@ -31,7 +31,9 @@ function connectWebSocket() {
           if (data.currentTask) updateTaskUI(data.currentTask);
           updateStats();
         } else if (data.type === 'thinking') {
-          addThinkingLine(data.text || data.message);
+          (data.lines || [data.text || data.message]).forEach(addThinkingLine);
+        } else if (data.type === 'response_chunk') {
+          appendResponseChunk(data);
         } else if (data.type === 'task_complete') {
           activeTasks--;
           completedTasks++;
@@ -144,6 +146,44 @@ function addThinkingLine(text) {
   }, 10);
 }
 
+// Respostas em streaming: uma linha por streamId, que cresce a cada pedaço
+const streamLines = new Map();
+
+function appendResponseChunk(data) {
+  const thinkingContent = document.getElementById('thinkingContent');
+  if (!thinkingContent) return;
+  
+  // Remove placeholder
+  const placeholder = thinkingContent.querySelector('.placeholder');
+  if (placeholder) placeholder.remove();
+  
+  let stream = streamLines.get(data.streamId);
+  if (!stream) {
+    const line = document.createElement('div');
+    line.className = 'response';
+    line.style.wordWrap = 'break-word';
+    line.style.whiteSpace = 'normal';
+    line.style.maxWidth = '100%';
+    thinkingContent.appendChild(line);
+    
+    stream = { line: line, text: '' };
+    streamLines.set(data.streamId, stream);
+  }
+  
+  stream.text += data.chunk || '';
+  stream.line.textContent = `📤 Chimoco: ${stream.text}`;
+  
+  if (data.done) {
+    streamLines.delete(data.streamId);
+    addToHistory(stream.line.textContent, false);
+  }
+  
+  // Auto-scroll
+  setTimeout(() => {
+    thinkingContent.scrollTop = thinkingContent.scrollHeight;
+  }, 10);
+}
+
 function addToHistory(text, isUserMessage) {
   const historyList = document.getElementById('historyList');
   if (!historyList) return;
@@ -0,0 +1,135 @@
+"""
+CIRCUIT BREAKER
+Máquina de estados closed → open → half-open por provider
+
+- closed: tráfego normal; N erros seguidos (ou um 429) abrem o circuito
+- open: nada passa durante o cooldown (o do Retry-After, se o provider o
+  disser; senão exponencial com jitter)
+- half-open: só passam alguns pedidos de teste; se correrem bem fecha,
+  se falharem volta a abrir com o dobro do cooldown
+"""
+
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, base_cooldown=10, max_cooldown=600, jitter=0.2,
+                 half_open_probes=1, success_threshold=2, probe_timeout=30, rng=None):
+        self.failure_threshold = failure_threshold  # erros seguidos para abrir
+        self.base_cooldown = base_cooldown  # 1ª abertura; dobra a cada reabertura
+        self.max_cooldown = max_cooldown
+        self.jitter = jitter  # ±20% para os processos não voltarem todos ao mesmo tempo
+        self.half_open_probes = half_open_probes  # pedidos de teste em simultâneo
+        self.success_threshold = success_threshold  # sucessos de teste para fechar
+        self.probe_timeout = probe_timeout  # teste sem resultado ao fim disto deixa de contar
+        self._rng = rng or random.Random()
+
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0  # aberturas seguidas (sem fechar pelo meio)
+        self.open_until = 0.0
+        self.probe_successes = 0
+        self._probes = []  # instantes em que os testes em curso começaram
+        self._lock = threading.Lock()
+
+    def _refresh(self, now):
+        """Passa de open a half-open quando o cooldown acaba. Chamar com o lock."""
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_successes = 0
+            self._probes = []
+        if self.state == HALF_OPEN:
+            self._probes = [t for t in self._probes if now - t < self.probe_timeout]
+
+    def _open(self, now, cooldown=None, base_cooldown=None):
+        """Abre o circuito e retorna a duração. Chamar com o lock."""
+        self.trips += 1
+        if cooldown is not None:
+            # O provider disse quanto esperar: é isso, nem mais nem menos
+            backoff = cooldown
+        else:
+            base = self.base_cooldown if base_cooldown is None else base_cooldown
+            backoff = min(base * 2 ** (self.trips - 1), self.max_cooldown)
+            backoff *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        self.state = OPEN
+        self.open_until = now + backoff
+        self.failures = 0
+        self._probes = []
+        return backoff
+
+    def wait_time(self):
+        """Segundos até poder passar um pedido (0 = pode já), sem reservar nada"""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self.state == OPEN:
+                return self.open_until - now
+            if self.state == HALF_OPEN and len(self._probes) >= self.half_open_probes:
+                return max(self.probe_timeout - (now - self._probes[0]), 0.0)
+            return 0.0
+
+    def allow_request(self):
+        """Pode passar um pedido? Em half-open reserva um dos testes."""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self.state == OPEN:
+                return False
+            if self.state == HALF_OPEN:
+                if len(self._probes) >= self.half_open_probes:
+                    return False
+                self._probes.append(now)
+            return True
+
+    def release(self):
+        """Devolve um teste reservado que acabou por não ser feito"""
+        with self._lock:
+            if self._probes:
+                self._probes.pop()
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if self._probes:
+                    self._probes.pop(0)
+                self.probe_successes += 1
+                if self.probe_successes >= self.success_threshold:
+                    self.state = CLOSED
+                    self.trips = 0
+            self.failures = 0
+
+    def record_failure(self):
+        """Erro genérico. Retorna a duração da abertura se abriu, senão None."""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self.state == HALF_OPEN:
+                return self._open(now)
+            if self.state == CLOSED:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    return self._open(now)
+            return None
+
+    def trip(self, cooldown=None, base_cooldown=None):
+        """
+        Rate limit (429): abre já. Sem `cooldown`, exponencial a partir de
+        `base_cooldown` (por defeito o do breaker). Retorna a duração da abertura.
+        """
+        with self._lock:
+            return self._open(time.monotonic(), cooldown, base_cooldown)
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trips = 0
+            self.open_until = 0.0
+            self.probe_successes = 0
+            self._probes = []
@@ -4,25 +4,22 @@ DASHBOARD INTEGRATION
 Bridges Mission Control Dashboard with OpenClaw main session
 """
 
-import requests
 import json
 import threading
 import time
 from queue import Queue
 
+from mission_transport import transport
+
 # Queue for dashboard messages
 dashboard_queue = Queue()
 
-# WebSocket relay address
-MISSION_SERVER = "https://16.16.255.70:3000"
-
 def send_to_websocket(event_type, data):
     """Send event to all connected WebSocket clients via Mission Control"""
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        transport.post(
+            "/api/task/thinking",
             json={"text": f"[{event_type}] {data}"},
-            verify=False,
             timeout=3
         )
     except:
@@ -55,10 +52,9 @@ def broadcast_response(response_text):
     Called when Chimoco sends a response
     """
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        transport.post(
+            "/api/task/thinking",
             json={"text": f"📤 Resposta: {response_text}"},
-            verify=False,
             timeout=3
         )
     except:
@@ -67,10 +63,9 @@ def broadcast_response(response_text):
 def broadcast_thinking(thought_text):
     """Broadcast thinking to dashboard"""
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        transport.post(
+            "/api/task/thinking",
             json={"text": thought_text},
-            verify=False,
             timeout=3
         )
     except:
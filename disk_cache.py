@@ -0,0 +1,155 @@
+"""
+DISK CACHE
+Cache persistente de respostas (SQLite), partilhada entre processos e restarts
+
+As chaves são um digest estável (SHA-256) de provider + prompt + parâmetros,
+ao contrário de hash(), que muda a cada arranque do interpretador. O wrapper
+usa o provider "*": a mesma resposta serve, venha de que provider vier.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Caminho da cache em disco ("" desativa)
+CACHE_DB = os.getenv("CHIMOCO_CACHE_DB", "/tmp/chimoco_cache.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def cache_key(provider, prompt, params=None):
+    """Digest estável de provider + prompt + parâmetros (igual em todos os processos)"""
+    payload = json.dumps(
+        {"provider": provider, "prompt": prompt, "params": params or {}},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Respostas em SQLite (WAL), com compressão zlib opcional dos valores e
+    compactação por TTL e por tamanho total (remove os menos acedidos).
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=24 * 3600, max_bytes=64 * 1024 * 1024,
+                 compress=True, compress_min=256, compact_every=200, touch_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compress_min = compress_min  # valores mais pequenos não compensam
+        self.compact_every = compact_every  # compacta a cada N escritas
+        self.touch_interval = touch_interval  # s entre atualizações de `accessed` (uma escrita por hit é cara)
+
+        self._local = threading.local()  # uma ligação SQLite por thread
+        self._writes = 0
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Retorna a resposta guardada, ou None se não existir/expirou"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, compressed, created, accessed FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, compressed, created, accessed = row
+        now = time.time()
+        if now - created >= self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+
+        if now - accessed >= self.touch_interval:
+            # Para a ordem LRU da compactação chega saber quem foi acedido no último minuto
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        if compressed:
+            value = zlib.decompress(value)
+        return value.decode("utf-8")
+
+    def set(self, key, value):
+        """Guarda uma resposta (texto)"""
+        data = value.encode("utf-8")
+        compressed = 0
+        if self.compress and len(data) >= self.compress_min:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                data, compressed = packed, 1
+
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO responses (key, value, compressed, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, data, compressed, len(data), now, now)
+        )
+
+        self._writes += 1
+        if self.compact_every and self._writes % self.compact_every == 0:
+            self.compact()
+
+    def compact(self):
+        """Remove entradas expiradas e, acima de max_bytes, as menos acedidas"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM responses WHERE created <= ?", (time.time() - self.ttl,))
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    victims.append((key,))
+                    excess -= size
+                conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return {"entries": entries, "bytes": size}
+
+    def clear(self):
+        self._conn().execute("DELETE FROM responses")
+
+
+def open_disk_cache(path=None, **kwargs):
+    """Abre a cache em disco, ou None se estiver desativada ou a base não abrir"""
+    path = CACHE_DB if path is None else path
+    if not path:
+        return None
+    try:
+        return DiskCache(path, **kwargs)
+    except sqlite3.Error as e:
+        print(f"⚠️ Cache em disco indisponível ({path}): {e}")
+        return None
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+LOAD TEST
+Carga sobre o AsyncAPIWrapper (rate limiter + registry/failover + cache)
+contra o mock provider local, sem gastar quota
+
+Lança `--requests` pedidos com `--concurrency` em simultâneo e reporta em
+JSON o throughput, p50/p95/p99, falhas, repetições (failover) e o que cada
+provider respondeu. Com --baseline compara com um relatório anterior.
+
+Uso:
+    python3 load_test.py --concurrency 50 --requests 2000
+    python3 load_test.py --rate-limit-rate 0.05 --retry-after 2 --output base.json
+    python3 load_test.py --config mock.json --baseline base.json
+    python3 load_test.py --stream --latency lognormal:0.08,0.6
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+from async_api_wrapper import AsyncAPIWrapper
+from mock_provider import MockProvider, add_behaviour_arguments, behaviour_from_args
+from provider_registry import DEFAULT_PROVIDERS, ProviderRegistry
+from rate_limiter import LocalState, RateLimiter
+from telemetry import Telemetry
+
+# Métricas comparadas com a baseline: (chave, maior é melhor)
+COMPARED = (
+    ("throughput", True),
+    ("latency.p50", False),
+    ("latency.p95", False),
+    ("latency.p99", False),
+    ("failed", False),
+    ("retries", False),
+)
+
+
+def percentiles(values):
+    """p50/p95/p99/max/média em ms de uma lista de segundos"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(q):
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99),
+            "max": ordered[-1] * 1000, "mean": sum(ordered) / len(ordered) * 1000}
+
+
+async def run_load(concurrency=10, requests=1000, mock=None, calls_per_minute=None,
+                   min_interval=0.0, max_in_flight=8, timeout=30, stream=False, distinct=None):
+    """Corre a carga e retorna o relatório (dict)"""
+    mock = mock or {}
+    server = await MockProvider(**mock).start()
+
+    # Sem calls_per_minute, os limites ficam fora do caminho: mede-se o wrapper e o mock
+    specs = [dict(spec, calls_per_minute=calls_per_minute or 10**9,
+                  tokens_per_minute=spec["tokens_per_minute"] if calls_per_minute else 10**12)
+             for spec in DEFAULT_PROVIDERS]
+    registry = ProviderRegistry(specs)
+    limiter = RateLimiter(state=LocalState(), registry=registry)
+    limiter.min_interval = min_interval
+    telemetry = Telemetry(registry=registry)
+    api = AsyncAPIWrapper(limiter=limiter, telemetry=telemetry, max_in_flight=max_in_flight,
+                          endpoints={provider: server.url for provider in registry.ids()})
+
+    distinct = distinct or requests
+    latencies = []
+    first_chunks = []
+    failed = 0
+    next_request = iter(range(requests))
+
+    async def worker():
+        nonlocal failed
+        for n in next_request:
+            prompt = f"pedido de carga {n % distinct}"
+            start = time.perf_counter()
+            if stream:
+                response = []
+                async for chunk in api.call_api_stream(prompt, timeout=timeout):
+                    if not response:
+                        first_chunks.append(time.perf_counter() - start)
+                    response.append(chunk)
+                response = "".join(response)
+            else:
+                response = await api.call_api(prompt, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            if response.startswith("❌") or "\n❌" in response:
+                failed += 1
+            else:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    api.close()
+    await server.close()
+    limiter.close()
+
+    snap = telemetry.snapshot()
+    report = {
+        "config": {
+            "concurrency": concurrency, "requests": requests, "distinct": distinct,
+            "stream": stream, "calls_per_minute": calls_per_minute, "min_interval": min_interval,
+            "max_in_flight": max_in_flight, "timeout": timeout,
+            "mock": {key: value for key, value in mock.items() if not callable(value)},
+        },
+        "elapsed": elapsed,
+        "ok": len(latencies),
+        "failed": failed,
+        "throughput": len(latencies) / elapsed,
+        "latency": percentiles(latencies),
+        "retries": snap["retries"],
+        "cache_hits": sum(snap["cache_hits"].values()),
+        "coalesced": api.singleflight.coalesced,
+        "providers": {
+            provider: {
+                "ok": metrics["latency"]["count"],
+                "errors": metrics["errors"],
+                "p50": None if metrics["latency"]["p50"] is None else metrics["latency"]["p50"] * 1000,
+                "p99": None if metrics["latency"]["p99"] is None else metrics["latency"]["p99"] * 1000,
+            }
+            for provider, metrics in sorted(snap["providers"].items())
+        },
+        "mock": server.stats(),
+    }
+    if stream:
+        report["first_chunk"] = percentiles(first_chunks)
+    return report
+
+
+def _lookup(report, path):
+    value = report
+    for key in path.split("."):
+        value = (value or {}).get(key)
+    return value
+
+
+def compare(report, baseline):
+    """Linhas com a variação de cada métrica face à baseline"""
+    lines = []
+    for path, higher_is_better in COMPARED:
+        before, after = _lookup(baseline, path), _lookup(report, path)
+        if before is None or after is None:
+            continue
+        if before:
+            change = (after - before) / before
+            better = change > 0 if higher_is_better else change < 0
+            mark = "🟢" if better else ("⚪" if abs(change) < 0.05 else "🔴")
+            lines.append(f"{mark} {path:<12} {before:>10.1f} → {after:>10.1f}  ({change:+.0%})")
+        else:
+            lines.append(f"⚪ {path:<12} {before:>10.1f} → {after:>10.1f}")
+    return lines
+
+
+def summary(report):
+    latency = report["latency"] or {}
+    lines = [
+        f"🔥 {report['ok']:,} respostas em {report['elapsed']:.1f}s "
+        f"({report['throughput']:,.0f}/s, {report['config']['concurrency']} em simultâneo), "
+        f"{report['failed']} falhas, {report['retries']} repetições",
+    ]
+    if latency:
+        lines.append(f"⏱️ p50 {latency['p50']:.0f}ms  p95 {latency['p95']:.0f}ms  p99 {latency['p99']:.0f}ms")
+    for provider, stats in report["providers"].items():
+        errors = ", ".join(f"{kind} {n}" for kind, n in stats["errors"].items()) or "sem erros"
+        lines.append(f"  {provider}: {stats['ok']} respostas, {errors}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test do AsyncAPIWrapper contra o mock provider")
+    parser.add_argument("--concurrency", type=int, default=10, help="pedidos em simultâneo")
+    parser.add_argument("--requests", type=int, default=1000, help="total de pedidos")
+    parser.add_argument("--distinct", type=int, help="prompts diferentes (por defeito todos; menos = cache)")
+    parser.add_argument("--stream", action="store_true", help="usar call_api_stream")
+    parser.add_argument("--calls-per-minute", type=int, help="limite por provider (por defeito sem limite)")
+    parser.add_argument("--min-interval", type=float, default=0.0, help="intervalo mínimo entre chamadas (s)")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="pedidos em simultâneo por provider")
+    parser.add_argument("--timeout", type=float, default=30, help="deadline de cada chamada (s)")
+    add_behaviour_arguments(parser)
+    parser.add_argument("--output", help="guardar o relatório JSON neste ficheiro (por defeito stdout)")
+    parser.add_argument("--baseline", help="relatório JSON anterior para comparar")
+    parser.add_argument("--verbose", action="store_true", help="mostrar os logs do wrapper (stderr)")
+    args = parser.parse_args()
+
+    # stdout fica só para o JSON; os prints do wrapper vão para stderr (ou para lado nenhum)
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(sys.stderr if args.verbose else devnull):
+        report = asyncio.run(run_load(
+            concurrency=args.concurrency, requests=args.requests, mock=behaviour_from_args(args),
+            calls_per_minute=args.calls_per_minute, min_interval=args.min_interval,
+            max_in_flight=args.max_in_flight, timeout=args.timeout, stream=args.stream,
+            distinct=args.distinct,
+        ))
+
+    for line in summary(report):
+        print(line, file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n📊 Comparação com {args.baseline}:", file=sys.stderr)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"💾 Relatório em {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
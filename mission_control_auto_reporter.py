@@ -4,18 +4,13 @@ MISSION CONTROL AUTO-REPORTER
 Monitors OpenClaw session and reports to Mission Control in real-time
 """
 
-import requests
 import time
 import json
 import os
 from datetime import datetime
-import ssl
-import urllib3
 
-# Disable SSL warnings for self-signed cert
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from mission_transport import transport
 
-MISSION_SERVER = "https://16.16.255.70:3000"
 SESSION_KEY = os.getenv("OPENCLAW_SESSION_KEY", "main")
 LAST_MESSAGE_ID = 0
 
@@ -40,10 +35,9 @@ def read_session_log(limit=10):
 def report_message_received(message, sender="user"):
     """Report that a message was received"""
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/start",
+        transport.post(
+            "/api/task/start",
             json={"taskName": f"Mensagem de {sender}: {message[:50]}..."},
-            verify=False,
             timeout=5
         )
         print(f"✅ Reported message from {sender}")
@@ -53,10 +47,9 @@ def report_message_received(message, sender="user"):
 def report_thinking(thought):
     """Report Chimoco thinking"""
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        transport.post(
+            "/api/task/thinking",
             json={"text": thought},
-            verify=False,
             timeout=5
         )
         print(f"💭 Reported thinking: {thought[:50]}...")
@@ -66,10 +59,9 @@ def report_thinking(thought):
 def report_response(response):
     """Report Chimoco response"""
     try:
-        requests.post(
-            f"{MISSION_SERVER}/api/task/thinking",
+        transport.post(
+            "/api/task/thinking",
             json={"text": f"Resposta: {response[:200]}..."},
-            verify=False,
             timeout=5
         )
         print(f"📤 Reported response")
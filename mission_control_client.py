@@ -4,13 +4,9 @@ MISSION CONTROL CLIENT
 Simple client for Chimoco to report to Mission Control
 """
 
-import requests
-import urllib3
 from datetime import datetime
 
-urllib3.disable_warnings()
-
-SERVER = "https://16.16.255.70:3000"
+from mission_transport import transport
 
 def report(action, text):
     """
@@ -20,30 +16,27 @@ def report(action, text):
     try:
         if action == "receive":
             # Incoming message from user
-            requests.post(
-                f"{SERVER}/api/task/start",
+            transport.post(
+                "/api/task/start",
                 json={"taskName": f"Yuri: {text[:50]}..."},
-                verify=False,
                 timeout=3
             )
             print(f"📥 Reported: Yuri disse '{text[:40]}...'")
             
         elif action == "thinking":
             # My thoughts
-            requests.post(
-                f"{SERVER}/api/task/thinking",
+            transport.post(
+                "/api/task/thinking",
                 json={"text": f"💭 {text}"},
-                verify=False,
                 timeout=3
             )
             print(f"💭 Reported thinking")
             
         elif action == "respond":
             # My response
-            requests.post(
-                f"{SERVER}/api/task/thinking",
+            transport.post(
+                "/api/task/thinking",
                 json={"text": f"📤 Respondendo: {text[:100]}..."},
-                verify=False,
                 timeout=3
             )
             print(f"📤 Reported response")
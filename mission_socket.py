@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+MISSION SOCKET
+Persistent WebSocket from the Python reporters to Mission Control
+
+Task events (start / thinking / complete, and batches of them) are written
+as one frame each on a single authenticated WebSocket, instead of one HTTP
+request/response per event. Every frame carries a sequence number; the
+server acks it and remembers the last one applied per session, so after a
+reconnect the unacked frames are resent and duplicates are skipped.
+
+Minimal RFC 6455 client on the standard library (no extra dependency).
+MissionTransport uses it when MISSION_WS is on and falls back to HTTP
+whenever the socket is unavailable.
+"""
+
+import base64
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+MISSION_WS = os.getenv("MISSION_WS", "1").lower() not in ("0", "false", "no")
+MISSION_TOKEN = os.getenv("MISSION_TOKEN", "")
+
+# Server paths that can travel as socket frames, with their event type
+EVENT_TYPES = {
+    "/api/task/start": "start",
+    "/api/task/thinking": "thinking",
+    "/api/task/complete": "complete",
+}
+BATCH_PATH = "/api/events/batch"
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class HandshakeRefused(ConnectionError):
+    """The server answered the upgrade with something other than 101 (e.g. 401)"""
+
+    def __init__(self, message, status=0):
+        super().__init__(message)
+        self.status = status
+
+
+class SocketReceipt:
+    """Stands in for the HTTP response of an event written to the socket"""
+
+    status_code = 202
+    ok = True
+
+    def __init__(self, seq):
+        self.seq = seq
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"success": True, "seq": self.seq}
+
+
+class _Connection:
+    """One WebSocket connection: handshake, masked frame writes, frame reads"""
+
+    def __init__(self, url, headers, timeout, verify):
+        # Imported on first connect: ssl/socket/hashlib cost milliseconds at import time
+        import socket
+        import ssl
+
+        parts = urlsplit(url)
+        secure = parts.scheme == "wss"
+        port = parts.port or (443 if secure else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if secure:
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=parts.hostname)
+        self.sock = sock  # keeps `timeout` for writes and reads: a stalled server cannot block forever
+        self._timeout = socket.timeout
+        self._buffer = b""
+        self._message, self._message_opcode = b"", None
+        try:
+            self._handshake(parts, headers)
+        except Exception:
+            sock.close()
+            raise
+
+    def _handshake(self, parts, headers):
+        import hashlib
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}", "Upgrade: websocket",
+                 "Connection: Upgrade", f"Sec-WebSocket-Key: {key}", "Sec-WebSocket-Version: 13"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+        while b"\r\n\r\n" not in self._buffer:
+            self._fill()
+        head, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        status, *header_lines = head.decode("latin-1").split("\r\n")
+        code = status.split(" ")[1:2]
+        if code != ["101"]:
+            raise HandshakeRefused(status, int(code[0]) if code and code[0].isdigit() else 0)
+        received = dict(line.split(":", 1) for line in header_lines if ":" in line)
+        received = {name.strip().lower(): value.strip() for name, value in received.items()}
+        accept = base64.b64encode(hashlib.sha1((key + _GUID).encode()).digest()).decode()
+        if received.get("sec-websocket-accept") != accept:
+            raise HandshakeRefused("bad Sec-WebSocket-Accept")
+
+    def _fill(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("connection closed by the server")
+        self._buffer += data
+
+    def _parse(self):
+        """Take the next complete frame off the buffer as (fin, opcode, payload); None if incomplete"""
+        buffer = self._buffer
+        if len(buffer) < 2:
+            return None
+        first, second = buffer[0], buffer[1]
+        n, pos = second & 0x7F, 2
+        if n == 126:
+            if len(buffer) < 4:
+                return None
+            n, pos = struct.unpack_from("!H", buffer, 2)[0], 4
+        elif n == 127:
+            if len(buffer) < 10:
+                return None
+            n, pos = struct.unpack_from("!Q", buffer, 2)[0], 10
+        mask = None
+        if second & 0x80:
+            if len(buffer) < pos + 4:
+                return None
+            mask, pos = buffer[pos:pos + 4], pos + 4
+        if len(buffer) < pos + n:
+            return None
+        payload, self._buffer = buffer[pos:pos + n], buffer[pos + n:]
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x80, first & 0x0F, payload
+
+    def send(self, opcode, data=b""):
+        """Write one frame (client frames are always masked)"""
+        n = len(data)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | n)
+        elif n < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, n)
+        mask = os.urandom(4)
+        if n:
+            repeated = (mask * (n // 4 + 1))[:n]
+            data = (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(n, "big")
+        self.sock.sendall(header + mask + data)
+
+    def receive(self):
+        """
+        Next message as (opcode, payload), or None if nothing complete arrived
+        within the socket timeout (the connection is still usable). Fragments
+        are joined.
+        """
+        while True:
+            frame = self._parse()
+            if frame is None:
+                try:
+                    self._fill()
+                except self._timeout:
+                    return None
+                continue
+            fin, opcode, payload = frame
+            if opcode >= 0x8:  # control frames can come between fragments
+                return opcode, payload
+            if opcode:
+                self._message_opcode = opcode
+            self._message += payload
+            if fin:
+                message = self._message_opcode, self._message
+                self._message, self._message_opcode = b"", None
+                return message
+
+    def close(self):
+        try:
+            self.send(OP_CLOSE, struct.pack("!H", 1000))
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class MissionSocket:
+    """
+    Reporter session over one WebSocket, with ack/resume and reconnect backoff.
+
+    Connecting happens outside the locks; writes are serialized by their own
+    lock and bounded by the socket timeout, so acks are processed while a
+    write is in progress. When a connection is lost the session is resumed
+    right away if possible; otherwise the unacked events are handed to
+    `on_lost(events)` (MissionTransport posts or spools them). `on_unreachable()`
+    is called when the server cannot be reached at all.
+    """
+
+    def __init__(self, server, token=MISSION_TOKEN, verify=False, timeout=5,
+                 min_backoff=1.0, max_backoff=60.0, max_unacked=10000,
+                 on_lost=None, on_unreachable=None):
+        scheme, rest = server.rstrip("/").split("://", 1)
+        self.session = os.urandom(16).hex()
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{rest}/reporter?session={self.session}"
+        self.token = token
+        self.verify = verify
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_unacked = max_unacked
+        self.on_lost = on_lost
+        self.on_unreachable = on_unreachable
+
+        self.disabled = None  # reason the server cannot take reporter sockets (no retry)
+        self._conn = None
+        self._connecting = False
+        self._lock = threading.Lock()  # connection state and the unacked frames
+        self._acked = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # one frame on the wire at a time, in seq order
+        self._seq = 0
+        self._unacked = deque()  # (seq, path, payload, frame) written but not acked yet
+        self._backoff = min_backoff
+        self._retry_at = 0.0
+        self.sent = 0
+        self.reconnects = 0
+
+    @staticmethod
+    def accepts(path):
+        return path in EVENT_TYPES or path == BATCH_PATH
+
+    def send(self, path, payload):
+        """
+        Write the event as one frame. Returns a SocketReceipt, or None when
+        the socket is unusable (the caller then posts it over HTTP).
+        """
+        if payload is None:
+            payload = {}
+        if path == BATCH_PATH:
+            events = payload.get("events", [])
+        else:
+            events = [dict(payload, type=EVENT_TYPES[path])]
+        conn = self._conn or self._open()
+        if conn is None:
+            return None
+        with self._write_lock:
+            with self._lock:
+                if self._conn is not conn or len(self._unacked) >= self.max_unacked:
+                    return None  # lost meanwhile, or the server is not acking: HTTP takes over
+                self._seq += 1
+                seq = self._seq
+                frame = json.dumps({"seq": seq, "events": events}, ensure_ascii=False).encode("utf-8")
+                self._unacked.append((seq, path, payload, frame))  # before the write: the ack can be fast
+            try:
+                conn.send(OP_TEXT, frame)
+                failed = False
+            except OSError:
+                with self._lock:
+                    if self._unacked and self._unacked[-1][0] == seq:
+                        self._unacked.pop()  # not written: the caller posts it over HTTP
+                failed = True
+        if failed:
+            self._lost(conn)
+            return None
+        self.sent += 1
+        return SocketReceipt(seq)
+
+    def _open(self):
+        """Connect and resume the session, outside the locks. The connection, or None if not now."""
+        with self._lock:
+            if self._conn is not None:
+                return self._conn
+            if self.disabled or self._connecting or time.monotonic() < self._retry_at:
+                return None
+            self._connecting = True
+        conn = None
+        try:
+            conn, last_seq = self._handshake()
+            # Resume: drop what the server already applied, resend the rest in order
+            with self._write_lock:
+                with self._lock:
+                    while self._unacked and self._unacked[0][0] <= last_seq:
+                        self._unacked.popleft()
+                    frames = [frame for _seq, _path, _payload, frame in self._unacked]
+                for frame in frames:
+                    conn.send(OP_TEXT, frame)
+                with self._lock:
+                    self._conn = conn
+                    self._backoff = self.min_backoff
+                    conn.opened = time.monotonic()
+            if self.sent:
+                self.reconnects += 1
+            threading.Thread(target=self._read_loop, args=(conn,), name="mission-socket", daemon=True).start()
+            return conn
+        except HandshakeRefused as e:
+            if e.status // 100 == 4:  # bad token, or no reporter socket at all
+                self.disabled = f"upgrade refused: {e}"
+        except (OSError, ValueError):
+            if conn is not None:
+                conn.close()
+            elif self.on_unreachable is not None:
+                self.on_unreachable()
+        finally:
+            with self._lock:
+                self._connecting = False
+        with self._lock:
+            self._failed()
+        return None
+
+    def _handshake(self):
+        """Open a connection and read the server's welcome: (connection, last applied seq)"""
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        conn = _Connection(self.url, headers, self.timeout, self.verify)
+        try:
+            message = conn.receive()
+            if message is None:
+                raise TimeoutError("no welcome from the server")
+            opcode, data = message
+            hello = json.loads(data) if opcode == OP_TEXT else {}
+        except Exception:
+            conn.close()
+            raise
+        if hello.get("type") != "welcome":
+            # A server without reporter sockets treats us as a dashboard ("init")
+            conn.close()
+            raise HandshakeRefused("server has no reporter socket", 404)
+        return conn, hello.get("lastSeq", 0)
+
+    def _failed(self):
+        """Next connect only after the backoff (lock held)"""
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def _lost(self, conn):
+        """A connection failed: resume on a new one, or hand the unacked events to on_lost"""
+        with self._lock:
+            if self._conn is not conn:
+                return
+            self._conn = None
+            self._acked.notify_all()
+            if time.monotonic() - conn.opened < self.min_backoff:
+                self._failed()  # flapping server: no immediate reconnect
+        conn.close()
+        if self._open() is None:
+            events = self.take_unacked()
+            if events and self.on_lost is not None:
+                self.on_lost(events)
+
+    def _read_loop(self, conn):
+        """Acks, pings and the server closing; ends with the connection"""
+        try:
+            while True:
+                message = conn.receive()
+                if message is None:
+                    continue  # idle
+                opcode, data = message
+                if opcode == OP_TEXT:
+                    message = json.loads(data)
+                    if message.get("type") == "ack":
+                        with self._lock:
+                            while self._unacked and self._unacked[0][0] <= message["seq"]:
+                                self._unacked.popleft()
+                            self._acked.notify_all()
+                elif opcode == OP_PING:
+                    with self._write_lock:
+                        conn.send(OP_PONG, data)
+                elif opcode == OP_CLOSE:
+                    break
+        except (OSError, ValueError, KeyError):
+            pass
+        self._lost(conn)
+
+    def take_unacked(self, force=False):
+        """
+        Events written but never acked, oldest first, as (path, payload), to
+        deliver over HTTP (at-least-once: the server may already have applied
+        the last ones). Only while disconnected, unless `force`.
+        """
+        with self._lock:
+            if self._conn is not None and not force:
+                return []
+            events = [(path, payload) for _seq, path, payload, _frame in self._unacked]
+            self._unacked.clear()
+            return events
+
+    def flush(self, timeout=None):
+        """Wait until every written frame is acked (True) or the timeout expires"""
+        with self._lock:
+            return self._acked.wait_for(lambda: not self._unacked or self._conn is None, timeout) \
+                and not self._unacked
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+            self._acked.notify_all()
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+MISSION SPOOL
+Local journal for Mission Control events the server could not take
+
+Events are appended as JSON lines; a small offset file remembers how far
+replay got, so nothing is lost across restarts and replay keeps the original
+order. Only the holder of the replay lease sends events, so processes that
+share the spool never deliver an event twice. The journal is size-capped:
+when full, the oldest unsent events are dropped first.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock
+    fcntl = None
+
+SPOOL_PATH = os.getenv("CHIMOCO_SPOOL", "/tmp/chimoco_spool.jsonl")
+
+
+class EventSpool:
+    """Append-only JSONL journal with a replay cursor, shared safely between processes"""
+
+    def __init__(self, path=SPOOL_PATH, max_bytes=5 * 1024 * 1024):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self.max_bytes = max_bytes
+        self.dropped = 0  # events dropped to respect max_bytes
+        self._lock = threading.Lock()
+        self._lease = threading.Lock()
+
+    @contextmanager
+    def replay_lease(self):
+        """
+        Exclusive right to replay (yields True), held for the whole
+        peek → send → advance cycle; yields False if another replayer has it.
+        """
+        if not self._lease.acquire(blocking=False):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            with open(self.path + ".replay", "a") as lease_file:
+                try:
+                    fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    yield False  # another process is replaying
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lease_file, fcntl.LOCK_UN)
+        finally:
+            self._lease.release()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _inode(self):
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return None
+
+    def _offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _set_offset(self, offset):
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def append(self, path, payload):
+        """Journal one event (server path + JSON body)"""
+        line = (json.dumps({"t": time.time(), "path": path, "json": payload}, ensure_ascii=False)
+                + "\n").encode("utf-8")
+        with self._locked():
+            if self._size() + len(line) > self.max_bytes:
+                self._compact(self.max_bytes * 3 // 4 - len(line))
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+    def _compact(self, budget):
+        """Rewrite the journal with only the newest unsent events that fit in `budget` bytes"""
+        with open(self.path, "rb") as f:
+            f.seek(self._offset())
+            lines = f.readlines()
+        kept = []
+        size = 0
+        for line in reversed(lines):
+            if size + len(line) > budget:
+                break
+            kept.append(line)
+            size += len(line)
+        self.dropped += len(lines) - len(kept)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.writelines(reversed(kept))
+        os.replace(tmp, self.path)
+        self._set_offset(0)
+
+    def peek(self):
+        """
+        Oldest unsent event as (path, payload, cursor), or None if the spool
+        is empty. Call with the replay lease held.
+        """
+        with self._locked():
+            inode = self._inode()
+            offset = self._offset()
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return None
+            with f:
+                f.seek(offset)
+                while True:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        return None  # empty, or a line still being written
+                    offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        self._set_offset(offset)  # corrupt line (crash mid-write): skip it
+                        continue
+                    return entry["path"], entry["json"], (inode, offset, line)
+
+    def advance(self, cursor):
+        """Mark the event returned by peek (its `cursor`) as sent"""
+        inode, end, line = cursor
+        with self._locked():
+            offset = self._offset()
+            if self._inode() != inode:
+                # Compacted by an append since peek: the event is now at the
+                # new cursor, or was dropped to make room
+                try:
+                    with open(self.path, "rb") as f:
+                        f.seek(offset)
+                        if f.readline() != line:
+                            return
+                except OSError:
+                    return
+                end = offset + len(line)
+            elif end <= offset:
+                return
+            if end >= self._size():
+                # Everything sent: start an empty journal
+                open(self.path, "wb").close()
+                end = 0
+            self._set_offset(end)
+
+    def pending(self):
+        """True if there are unsent events"""
+        return self._size() > self._offset()
+
+    def count(self):
+        """Number of unsent events"""
+        with self._locked():
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset())
+                    return sum(1 for _ in f)
+            except OSError:
+                return 0
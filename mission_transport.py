@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+MISSION TRANSPORT
+One shared HTTP transport for every Mission Control client
+
+All reporters post through the same requests.Session, so events reuse
+keep-alive connections instead of paying a new TCP+TLS handshake each.
+The server URL, certificate checking and timeouts are configured here once
+(MISSION_SERVER / MISSION_VERIFY_TLS environment variables).
+
+Task events go as frames on one persistent WebSocket (mission_socket) when
+the server supports it (MISSION_WS, on by default), falling back to HTTP.
+When the server is unreachable, events go to a local spool (mission_spool)
+and are replayed in order, with backoff, once it is back (5xx, 408, 429 and
+network errors are retried; an event rejected with any other 4xx is dropped
+so it cannot block the ones behind it). While it is known to be down,
+requests fail fast instead of waiting for their timeout.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from mission_socket import BATCH_PATH, EVENT_TYPES, MISSION_TOKEN, MISSION_WS, MissionSocket
+from mission_spool import EventSpool, SPOOL_PATH
+
+MISSION_SERVER = os.getenv("MISSION_SERVER", "https://16.16.255.70:3000")
+MISSION_VERIFY_TLS = os.getenv("MISSION_VERIFY_TLS", "").lower() in ("1", "true", "yes")
+
+# 4xx replies worth retrying; any other 4xx means the event will never be accepted
+RETRYABLE_4XX = {408, 429}
+
+
+class ServerUnavailable(ConnectionError):
+    """Mission Control is known to be down; no network attempt was made"""
+
+
+class EventSpooled(ServerUnavailable):
+    """The event was not sent now but is kept in the spool for replay"""
+
+
+class MissionTransport:
+    """Keep-alive connection pool to one Mission Control server"""
+
+    def __init__(self, server=MISSION_SERVER, verify=MISSION_VERIFY_TLS, pool_size=4, timeout=5,
+                 spool=None, min_backoff=1.0, max_backoff=60.0, websocket=MISSION_WS, token=MISSION_TOKEN):
+        self.server = server.rstrip("/")
+        self.verify = verify  # off by default: the server uses a self-signed certificate
+        self.pool_size = pool_size  # connections kept open (one per concurrent sender)
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+        # Offline handling: events spooled while down, fast fail until the next probe
+        self.spool = spool
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._backoff = min_backoff
+        self.down_until = 0.0  # monotonic; before this no request touches the network
+        self._replayer = None
+
+        # Persistent reporter socket for task events; None = HTTP only. Frames it
+        # could not get acked go over HTTP (or to the spool), also at exit.
+        self.socket = None
+        if websocket:
+            self.socket = MissionSocket(self.server, token=token, verify=verify, timeout=timeout,
+                                        min_backoff=min_backoff, max_backoff=max_backoff,
+                                        on_lost=self._post_lost, on_unreachable=self._mark_down)
+            atexit.register(self._drain_socket, 2.0)
+
+    @property
+    def session(self):
+        """The shared requests.Session, created on first use"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    if not self.verify:
+                        import urllib3
+                        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def is_down(self):
+        return time.monotonic() < self.down_until
+
+    def _mark_down(self):
+        self.down_until = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def _mark_up(self):
+        self.down_until = 0.0
+        self._backoff = self.min_backoff
+
+    def _request(self, method, path, json=None, timeout=None):
+        import requests
+
+        if self.is_down():
+            raise ServerUnavailable(f"Mission Control down, retrying in {self.down_until - time.monotonic():.0f}s")
+        try:
+            # verify per request: a CA bundle from the environment would override session.verify
+            response = self.session.request(method, f"{self.server}{path}", json=json, verify=self.verify,
+                                            timeout=self.timeout if timeout is None else timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            self._mark_down()
+            raise
+        self._mark_up()
+        return response
+
+    def post(self, path, json=None, timeout=None, spool=True):
+        """
+        POST to a server path (e.g. "/api/task/thinking"); returns the response.
+        If the server is unreachable (or older events are still waiting in the
+        spool) the event is spooled and EventSpooled is raised; spool=False
+        for events that are useless later (e.g. stream chunks). Task events
+        are written to the reporter socket when it is up (SocketReceipt).
+        """
+        if spool and self.spool is not None and self.spool.pending():
+            return self._spool(path, json)  # keep the order behind the spooled ones
+        if self.socket is not None and self.socket.accepts(path) and not self.is_down():
+            receipt = self.socket.send(path, json)
+            if receipt is not None:
+                return receipt
+            # Socket lost: what it never acked goes over HTTP first, in order
+            self._post_lost(self.socket.take_unacked())
+        return self._post_http(path, json, timeout, spool)
+
+    def _post_http(self, path, json=None, timeout=None, spool=True):
+        import requests
+
+        if spool and self.spool is not None and self.spool.pending():
+            return self._spool(path, json)
+        try:
+            return self._request("POST", path, json, timeout)
+        except (ServerUnavailable, requests.ConnectionError, requests.Timeout) as e:
+            if not spool or self.spool is None:
+                raise
+            return self._spool(path, json, e)
+
+    def _post_lost(self, events):
+        """Socket events the server never acked, oldest first: over HTTP, or to the spool"""
+        for path, payload in events:
+            try:
+                self._post_http(path, payload)
+            except OSError:
+                pass  # spooled, or lost like any other failed event
+
+    def _drain_socket(self, timeout=None):
+        """Wait for the socket acks; what is still unacked after `timeout` goes over HTTP"""
+        if self.socket is not None and not self.socket.flush(timeout):
+            self._post_lost(self.socket.take_unacked(force=True))
+
+    def get(self, path, timeout=None):
+        return self._request("GET", path, timeout=timeout)
+
+    def _spool(self, path, json, error=None):
+        self.spool.append(path, json)
+        self._start_replay()
+        reason = f": {error}" if error else ""
+        raise EventSpooled(f"event spooled for replay{reason}")
+
+    def _start_replay(self):
+        with self._lock:
+            if self._replayer is None or not self._replayer.is_alive():
+                self._replayer = threading.Thread(target=self._replay, name="mission-replay", daemon=True)
+                self._replayer.start()
+
+    def _replay(self):
+        """Replay under the spool's lease; while another process holds it, wait for it to finish"""
+        while True:
+            with self.spool.replay_lease() as leased:
+                if leased:
+                    self._replay_spooled()
+                    return
+            if not self.spool.pending():
+                return
+            time.sleep(0.5)
+
+    def _replay_spooled(self):
+        """Send the spooled events oldest first; on failure wait for the backoff and retry"""
+        import requests
+
+        while True:
+            wait = self.down_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            event = self.spool.peek()
+            if event is None:
+                return
+            path, payload, cursor = event
+            try:
+                delivered = self._deliver(path, payload)
+            except (ServerUnavailable, requests.ConnectionError, requests.Timeout):
+                continue  # marked down: wait for the backoff
+            except requests.RequestException as e:
+                print(f"⚠️ Dropping spooled event for {path}: {e}")  # e.g. invalid URL: never deliverable
+                delivered = True
+            if delivered:
+                self.spool.advance(cursor)
+            else:
+                self._mark_down()  # 5xx, 408 or 429: same backoff as an unreachable server
+
+    def _deliver(self, path, payload):
+        """POST one spooled event; True once it is done with (2xx, or rejected for good), False to retry"""
+        response = self._request("POST", path, payload)
+        if response.status_code == 404 and path == BATCH_PATH:
+            # Older server without the batch endpoint: one request per event
+            paths = {kind: event_path for event_path, kind in EVENT_TYPES.items()}
+            for event in (payload or {}).get("events", []):
+                event = dict(event)
+                event_path = paths.get(event.pop("type", None))
+                if event_path is not None and not self._deliver(event_path, event):
+                    return False  # the whole batch is retried (at-least-once)
+            return True
+        status = response.status_code
+        if 400 <= status < 500 and status not in RETRYABLE_4XX:
+            # e.g. 400, 401, 413: retrying would only hold up every event behind this one
+            print(f"⚠️ Dropping spooled event for {path}: HTTP {status}")
+            return True
+        return 200 <= status < 300
+
+    def flush(self, timeout=None):
+        """
+        Wait until socket frames are acked (after `timeout`, the unacked ones go
+        over HTTP or to the spool) and the spool is empty: True, or False if
+        the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._drain_socket(timeout)
+        if self.spool is None:
+            return True
+        while self.spool.pending():
+            self._start_replay()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self):
+        if self.socket is not None:
+            self._drain_socket(min(self.timeout, 2.0))
+            self.socket.close()
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# Global instance shared by all reporters (undelivered events spool to CHIMOCO_SPOOL)
+transport = MissionTransport(spool=EventSpool(SPOOL_PATH) if SPOOL_PATH else None)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+MOCK PROVIDER
+Servidor HTTP/1.1 local que imita um endpoint /v1/chat/completions
+(formato OpenAI), para testar e medir o AsyncAPIWrapper sem gastar quota
+
+Latência com distribuição à escolha, 429 com Retry-After e erros 500 com a
+probabilidade pedida - globalmente ou por modelo, para simular um provider
+lento ou em baixo e ver o failover a funcionar.
+
+Uso:
+    python3 mock_provider.py                        # porta 8765, 50ms por resposta
+    python3 mock_provider.py --port 9000 --latency 0.2
+    python3 mock_provider.py --latency lognormal:0.08,0.6 --rate-limit-rate 0.05 --error-rate 0.01
+    python3 mock_provider.py --config mock.json     # {"latency": ..., "models": {"gpt-4": {...}}}
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+
+# Chaves aceites em cada comportamento (global ou por modelo)
+BEHAVIOUR_KEYS = ("latency", "error_rate", "rate_limit_rate", "retry_after")
+
+
+def latency_distribution(spec, rng=random):
+    """
+    Converte uma especificação de latência numa função sem argumentos que
+    devolve segundos: um número (fixa), "fixed:S", "uniform:MIN,MAX",
+    "exp:MÉDIA", "lognormal:MEDIANA,SIGMA", ou já uma função.
+    """
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda: spec
+    kind, _, args = str(spec).partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    values = [float(v) for v in args.split(",")]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / values[0])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+
+class MockProvider:
+    """
+    Servidor asyncio com keep-alive; responde a cada pedido após uma latência
+    tirada de `latency`. `models` sobrepõe o comportamento por modelo, com as
+    mesmas chaves: {"gpt-4": {"latency": "exp:0.5", "error_rate": 0.2}}
+    (o nome do modelo é o que vai no pedido, sem o vendor).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, chunk_delay=0.01,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, models=None, seed=None):
+        self.host = host
+        self.port = port  # 0 = porta livre escolhida pelo sistema
+        self.chunk_delay = chunk_delay  # entre pedaços, em streaming
+        self.rng = random.Random(seed)
+        defaults = {"latency": latency, "error_rate": error_rate,
+                    "rate_limit_rate": rate_limit_rate, "retry_after": retry_after}
+        # latency = até à resposta (ou ao 1º pedaço, em streaming)
+        self.behaviour = self._compile(defaults)
+        self.models = {model: self._compile(dict(defaults, **overrides))
+                       for model, overrides in (models or {}).items()}
+        self.requests = 0
+        self.connections = 0
+        self.served = Counter()  # {(modelo, status): n}
+        self._server = None
+
+    def _compile(self, behaviour):
+        unknown = set(behaviour) - set(BEHAVIOUR_KEYS)
+        if unknown:
+            raise ValueError(f"Chaves desconhecidas no comportamento: {', '.join(sorted(unknown))}")
+        return dict(behaviour, latency=latency_distribution(behaviour["latency"], self.rng))
+
+    def stats(self):
+        """{modelo: {status: pedidos}}"""
+        result = {}
+        for (model, status), n in sorted(self.served.items()):
+            result.setdefault(model, {})[status] = n
+        return result
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                status, extra_headers, payload = await self.respond(request_line.decode("latin-1"), body)
+                if isinstance(payload, list):
+                    await self._write_stream(writer, status, payload)
+                    continue
+                data = json.dumps(payload).encode("utf-8")
+                extra = "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: application/json\r\n{extra}"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # cliente foi embora, ou o servidor está a fechar
+        finally:
+            writer.close()
+
+    async def _write_stream(self, writer, status, events):
+        """Resposta em server-sent events, um chunk HTTP por evento"""
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/event-stream\r\n"
+            f"Transfer-Encoding: chunked\r\n\r\n".encode("latin-1")
+        )
+        for n, event in enumerate(events + ["[DONE]"]):
+            if n:
+                await asyncio.sleep(self.chunk_delay)
+            data = f"data: {event if event == '[DONE]' else json.dumps(event)}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def respond(self, request_line, body):
+        """
+        Retorna (status, headers extra, payload JSON) para um pedido; em
+        streaming, o payload é uma lista de eventos
+        """
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return "400 Bad Request", {}, {"error": {"message": "JSON inválido"}}
+
+        model = request.get("model", "?")
+        behaviour = self.models.get(model, self.behaviour)
+        # 429 e erros respondem logo, como um provider real sobrecarregado
+        roll = self.rng.random()
+        if roll < behaviour["rate_limit_rate"]:
+            self.served[model, 429] += 1
+            return "429 Too Many Requests", {"Retry-After": f"{behaviour['retry_after']:g}"}, {
+                "error": {"type": "rate_limit_error", "message": "Rate limit simulado"}}
+        if roll < behaviour["rate_limit_rate"] + behaviour["error_rate"]:
+            self.served[model, 500] += 1
+            return "500 Internal Server Error", {}, {
+                "error": {"type": "api_error", "message": "Erro simulado"}}
+
+        await asyncio.sleep(max(behaviour["latency"](), 0.0))
+        self.served[model, 200] += 1
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        text = f"[Resposta mock de {model}: {prompt[:40]}]"
+        if request.get("stream"):
+            words = text.split(" ")
+            return "200 OK", {}, [
+                {"choices": [{"index": 0, "delta": {"content": word if n == 0 else " " + word}}]}
+                for n, word in enumerate(words)
+            ]
+        return "200 OK", {}, {
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": max(1, len(prompt) // 4),
+                      "completion_tokens": max(1, len(text) // 4)},
+        }
+
+
+def add_behaviour_arguments(parser):
+    """Opções de comportamento do mock (partilhadas com o load_test)"""
+    parser.add_argument("--latency", default="0.05",
+                        help="segundos, ou fixed:S | uniform:MIN,MAX | exp:MÉDIA | lognormal:MEDIANA,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After dos 429 (s)")
+    parser.add_argument("--config", help="JSON com as mesmas chaves e \"models\": {modelo: {...}}")
+
+
+def behaviour_from_args(args):
+    """Kwargs do MockProvider a partir das opções (o --config sobrepõe-se às restantes)"""
+    kwargs = {"latency": args.latency, "error_rate": args.error_rate,
+              "rate_limit_rate": args.rate_limit_rate, "retry_after": args.retry_after}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            kwargs.update(json.load(f))
+    return kwargs
+
+
+async def _serve(args):
+    behaviour = behaviour_from_args(args)
+    server = await MockProvider(args.host, args.port, **behaviour).start()
+    print(f"🧪 Mock provider em {server.url} (latência {behaviour['latency']}, "
+          f"429 {behaviour['rate_limit_rate']:.0%}, erros {behaviour['error_rate']:.0%})")
+    await server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provider falso para testes locais")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_behaviour_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
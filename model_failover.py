@@ -1,87 +1,153 @@
 """
 MODEL FAILOVER SYSTEM
-Alternância automática entre Haiku → OpenAI → Gemini quando rate limit
+Alternância automática entre os modelos do registry quando rate limit,
+escolhendo o modelo saudável com melhor latência esperada (EWMA, p95, erros)
 """
 
-import time
 from datetime import datetime, timedelta
+from rate_limiter import LocalState
+from shared_state import open_shared_state
+from circuit_breaker import HALF_OPEN
+from provider_registry import registry as default_registry
+
 
 class ModelFailover:
-    def __init__(self):
+    def __init__(self, state=None, registry=None):
+        # Modelos, custo, estatísticas e circuit breakers vêm do registry partilhado
+        # com o rate limiter e o api_wrapper
+        self.registry = registry or default_registry
         self.models = [
-            {"name": "haiku", "provider": "anthropic", "status": "active", "last_error": None, "blocked_until": None},
-            {"name": "openai", "provider": "openai", "status": "active", "last_error": None, "blocked_until": None},
-            {"name": "gemini", "provider": "google", "status": "active", "last_error": None, "blocked_until": None},
+            {"name": p.name, "id": p.id, "provider": p.vendor, "cost": p.cost,
+             "status": "active", "last_error": None, "blocked_until": None}
+            for p in self.registry.providers
         ]
+        self._index = {p.id: idx for idx, p in enumerate(self.registry.providers)}
         self.current_idx = 0
-        self.cooldown_duration = 60  # segundos
+        # Bloqueios por modelo (chave = id do provider, a mesma do rate limiter);
+        # com shared_state.SharedState são vistos por todos os processos
+        self.state = state or LocalState()
+    
+    @property
+    def stats(self):
+        return [p.stats for p in self.registry.providers]
+    
+    @property
+    def breakers(self):
+        return [p.breaker for p in self.registry.providers]
+    
+    def _sync_block(self, model, now):
+        """Atualiza blocked_until do modelo a partir do estado (possivelmente partilhado)"""
+        remaining = self.state.blocked_for(model["id"])
+        if remaining > 0:
+            model["blocked_until"] = now + timedelta(seconds=remaining)
+        elif model["blocked_until"]:
+            # Cooldown acabou (aqui ou noutro processo)
+            model["blocked_until"] = None
+            model["last_error"] = None
     
     def get_next_available_model(self):
-        """Retorna o próximo modelo disponível"""
+        """Retorna o modelo disponível com melhor latência esperada"""
         now = datetime.now()
         
-        # Primeiro, verifica qual modelo usar
-        for i in range(len(self.models)):
-            idx = (self.current_idx + i) % len(self.models)
+        # O registry mantém o ranking (saudáveis, dentro do custo, menor latência
+        # esperada); aqui só se confirma o bloqueio partilhado do escolhido
+        for provider in self.registry.ranked():
+            idx = self._index[provider.id]
             model = self.models[idx]
-            
-            # Se modelo está bloqueado e cooldown ainda ativo, pula
-            if model["blocked_until"] and now < model["blocked_until"]:
+            self._sync_block(model, now)
+            if model["blocked_until"]:
+                continue
+            # Em half-open só passam os pedidos de teste (reserva um)
+            if not provider.breaker.allow_request():
                 continue
-            
-            # Se modelo está desbloqueado, usa este
-            if model["blocked_until"] and now >= model["blocked_until"]:
-                model["blocked_until"] = None
-                model["last_error"] = None
-            
             return idx, model
         
         # Se todos bloqueados, retorna o que vai desbloquear primeiro
-        earliest = min(self.models, key=lambda m: m["blocked_until"] or datetime.max)
-        wait_time = (earliest["blocked_until"] - now).total_seconds()
-        return None, {"error": f"Todos modelos bloqueados. Espera {int(wait_time)}s", "blocked_until": earliest["blocked_until"]}
+        waits = [
+            max(self.state.blocked_for(model["id"]), self.breakers[i].wait_time())
+            for i, model in enumerate(self.models)
+        ]
+        wait_time = min(waits)
+        blocked_until = now + timedelta(seconds=wait_time)
+        return None, {"error": f"Todos modelos bloqueados. Espera {int(wait_time)}s", "blocked_until": blocked_until}
+    
+    def _block(self, model_idx, cooldown):
+        model = self.models[model_idx]
+        self.state.block(model["id"], cooldown)
+        model["blocked_until"] = datetime.now() + timedelta(seconds=cooldown)
+        self.registry.touch()
     
-    def mark_rate_limit(self, model_idx):
-        """Marca um modelo como rate limited"""
+    def mark_rate_limit(self, model_idx, retry_after=None):
+        """Marca um modelo como rate limited: abre o circuito (cooldown exponencial ou retry_after)"""
         if model_idx < len(self.models):
             model = self.models[model_idx]
-            model["blocked_until"] = datetime.now() + timedelta(seconds=self.cooldown_duration)
+            cooldown = self.breakers[model_idx].trip(retry_after)
+            self._block(model_idx, cooldown)
             model["last_error"] = "RATE_LIMIT"
-            print(f"⚠️ {model['name'].upper()} bloqueado por {self.cooldown_duration}s")
+            print(f"⚠️ {model['name'].upper()} bloqueado por {cooldown:.0f}s")
             
             # Move pro próximo
             self.current_idx = (model_idx + 1) % len(self.models)
     
+    def _record_failure(self, model_idx, latency=None):
+        self.stats[model_idx].record(latency, ok=False)
+        cooldown = self.breakers[model_idx].record_failure()
+        if cooldown:
+            self._block(model_idx, cooldown)
+            print(f"🔌 {self.models[model_idx]['name'].upper()}: circuito aberto por {cooldown:.0f}s")
+    
     def mark_error(self, model_idx, error_msg):
-        """Marca um erro genérico (não rate limit)"""
+        """Marca um erro genérico (não rate limit); erros seguidos abrem o circuito"""
         if model_idx < len(self.models):
             model = self.models[model_idx]
             model["last_error"] = error_msg
             print(f"❌ {model['name'].upper()}: {error_msg}")
+            self._record_failure(model_idx)
+    
+    def record_result(self, model_idx, latency, ok=True):
+        """Regista latência (s) e sucesso/erro de uma chamada real (não chamar também mark_error)"""
+        if model_idx < len(self.models):
+            if ok:
+                self.stats[model_idx].record(latency, ok=True)
+                self.breakers[model_idx].record_success()
+            else:
+                self._record_failure(model_idx, latency)
     
     def get_status(self):
         """Retorna status de todos os modelos"""
         now = datetime.now()
         status = []
-        for model in self.models:
-            if model["blocked_until"] and now < model["blocked_until"]:
+        for idx, model in enumerate(self.models):
+            self._sync_block(model, now)
+            if model["blocked_until"]:
                 remaining = (model["blocked_until"] - now).total_seconds()
                 status.append(f"🔴 {model['name']}: Bloqueado ({int(remaining)}s)")
+            elif self.breakers[idx].state == HALF_OPEN:
+                status.append(f"🟡 {model['name']}: A testar recuperação (half-open)")
             else:
                 status.append(f"🟢 {model['name']}: Disponível")
+        
+        for line_idx, stats in enumerate(self.stats):
+            if stats.ewma_latency is not None:
+                status[line_idx] += (
+                    f" | EWMA {stats.ewma_latency * 1000:.0f}ms, p95 {stats.p95() * 1000:.0f}ms, "
+                    f"erros {stats.error_rate:.0%}"
+                )
         return "\n".join(status)
     
     def reset_all(self):
         """Reset de todos os modelos (uso manual)"""
         for model in self.models:
+            self.state.block(model["id"], 0)
             model["blocked_until"] = None
             model["last_error"] = None
+        self.registry.reset()
         self.current_idx = 0
         print("✅ Todos os modelos resetados")
 
 
-# Instância global
-failover = ModelFailover()
+# Instância global (bloqueios partilhados entre processos se CHIMOCO_STATE_DB disponível)
+failover = ModelFailover(state=open_shared_state())
 
 
 # Exemplo de uso
@@ -4,10 +4,12 @@ PROCESS DASHBOARD MESSAGE
 Call this function when processing a message from the dashboard
 """
 
-import requests
 import json
+import threading
+import time
+import uuid
 
-MISSION_SERVER = "https://16.16.255.70:3000"
+from mission_transport import transport
 
 def process_and_respond(message_text, model='Haiku', response_text=None):
     """
@@ -22,13 +24,12 @@ def process_and_respond(message_text, model='Haiku', response_text=None):
         # If response provided, send it back
         if response_text:
             # Submit response to mission control
-            response = requests.post(
-                f"{MISSION_SERVER}/api/response/submit",
+            response = transport.post(
+                "/api/response/submit",
                 json={
                     "responseText": response_text,
                     "model": model
                 },
-                verify=False,
                 timeout=5
             )
             
@@ -41,10 +42,9 @@ def process_and_respond(message_text, model='Haiku', response_text=None):
         
         else:
             # Just acknowledge receipt
-            requests.post(
-                f"{MISSION_SERVER}/api/task/thinking",
+            transport.post(
+                "/api/task/thinking",
                 json={"text": f"⏳ Processando: {message_text[:50]}..."},
-                verify=False,
                 timeout=3
             )
             
@@ -54,8 +54,100 @@ def process_and_respond(message_text, model='Haiku', response_text=None):
         print(f"❌ Error: {e}")
         return False
 
+def stream_and_respond(message_text, chunks, model='Haiku', flush_interval=0.05):
+    """
+    Relay a streamed response to the dashboard while it is being generated
+    
+    Args:
+        message_text: The user's message
+        chunks: Iterable of text pieces, e.g. api.call_api_stream(message_text)
+        model: Which model was used (Haiku, Gemini, OpenAI)
+        flush_interval: Pieces arriving within this many seconds are sent together
+    
+    The first piece is sent as soon as it arrives (time-to-first-token is what
+    the user sees); a piece held back to batch with the next one is sent by a
+    timer once flush_interval has passed, even if the stream pauses. If the relay fails midway, generation still runs to the end
+    and the full text is sent through /api/response/submit instead.
+    Returns the full response text.
+    """
+    stream_id = uuid.uuid4().hex
+    parts = []
+    pending = []
+    index = 0
+    last_flush = 0.0
+    relay_ok = True
+    lock = threading.Lock()  # the timer flushes from its own thread
+    timer = None
+    
+    def flush(done):
+        nonlocal index, relay_ok, last_flush, timer
+        if timer is not None:
+            timer.cancel()
+            timer = None
+        payload = {
+            "streamId": stream_id,
+            "index": index,
+            "chunk": "".join(pending),
+            "done": done,
+            "model": model
+        }
+        if done:
+            payload["responseText"] = "".join(parts)
+        try:
+            response = transport.post(
+                "/api/response/chunk",
+                json=payload,
+                timeout=5,
+                spool=False  # a late chunk is useless; the full text is submitted instead
+            )
+            relay_ok = response.ok
+            if not response.ok:
+                print(f"⚠️ Error streaming response: {response.status_code}")
+        except Exception as e:
+            print(f"❌ Error streaming response: {e}")
+            relay_ok = False
+        pending.clear()
+        index += 1
+        last_flush = time.monotonic()
+    
+    def flush_held():
+        with lock:
+            if pending and relay_ok:
+                flush(done=False)
+    
+    for chunk in chunks:
+        with lock:
+            parts.append(chunk)
+            if not relay_ok:
+                continue  # keep generating; the full text is submitted at the end
+            pending.append(chunk)
+            wait = flush_interval - (time.monotonic() - last_flush)
+            if index == 0 or wait <= 0:
+                flush(done=False)
+            elif timer is None:
+                timer = threading.Timer(wait, flush_held)
+                timer.daemon = True
+                timer.start()
+    
+    with lock:
+        response_text = "".join(parts)
+        if relay_ok:
+            flush(done=True)
+        elif timer is not None:
+            timer.cancel()
+    if relay_ok:
+        print(f"✅ Response streamed: {response_text[:50]}...")
+    else:
+        # Relay failed somewhere: send the whole answer the usual way
+        process_and_respond(message_text, model, response_text=response_text)
+    return response_text
+
 # Example usage (called when processing dashboard message):
 # from process_dashboard_message import process_and_respond
 # process_and_respond("Olá!", "Haiku")
 # # ... do processing ...
 # process_and_respond("Olá! Como posso ajudar?", "Haiku", response_text="Aqui está a resposta...")
+#
+# Streaming (the dashboard shows the answer while it is generated):
+# from api_wrapper import api
+# stream_and_respond("Olá!", api.call_api_stream("Olá!"), "Haiku")
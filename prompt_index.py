@@ -0,0 +1,194 @@
+"""
+PROMPT INDEX
+Lookup de prompts normalizados e quase-duplicados (MinHash + LSH)
+
+"que horas são?" e "Que horas sao" normalizam para o mesmo texto; variações
+com uma palavra a mais são encontradas pela semelhança de Jaccard entre
+shingles de caracteres. Operadores e símbolos ficam no texto normalizado
+("2+2" não é "2*2"), e números, símbolos e negações têm de coincidir, para
+nunca responder a "2+2" com a resposta de "2+3" nem a "x > y" com a de "x < y".
+As palavras em comum têm de vir pela mesma ordem: "5 euros em dólares" não
+é "5 dólares em euros".
+"""
+
+import random
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict, defaultdict
+
+# Pontuação que não muda a pergunta; o resto (operadores, %, €, parênteses, emoji) conta
+_SOFT_PUNCTUATION = set(".,;:!?¿¡'\"`´…«»“”‘’_")
+_MERSENNE = (1 << 61) - 1
+
+# Palavras que mudam o sentido da pergunta: têm de ser iguais nos dois prompts
+NEGATIONS = {"nao", "nem", "nunca", "sem", "not", "no", "never", "without"}
+
+
+def normalize_prompt(text):
+    """
+    Minúsculas, sem acentos nem pontuação, espaços colapsados. Letras e
+    dígitos de qualquer alfabeto ficam; operadores e símbolos ficam como
+    palavras soltas ("2+2" -> "2 + 2").
+    """
+    tokens, word = [], []
+    for c in unicodedata.normalize("NFKD", text.lower()):
+        if unicodedata.combining(c):
+            continue
+        if c.isalnum():
+            word.append(c)
+            continue
+        if word:
+            tokens.append("".join(word))
+            word = []
+        if c not in _SOFT_PUNCTUATION and unicodedata.category(c)[0] in "SP":
+            tokens.append(c)
+    if word:
+        tokens.append("".join(word))
+    return " ".join(tokens)
+
+
+def shingles(normalized, k=3):
+    """Conjunto de k-gramas de caracteres do texto normalizado"""
+    padded = f" {normalized} "
+    if len(padded) <= k:
+        return {padded}
+    return {padded[i:i + k] for i in range(len(padded) - k + 1)}
+
+
+def _is_guard(word):
+    return any(c.isdigit() for c in word) or not word.isalnum() or word in NEGATIONS
+
+
+def _guard_words(words):
+    """Números, símbolos e negações, por ordem: se diferirem, os prompts não são a mesma pergunta"""
+    return tuple(w for w in words if _is_guard(w))
+
+
+def _shared_order(words, other):
+    """As palavras de `words` que também estão em `other`, pela ordem de `words`"""
+    shared = set(words) & set(other)
+    return [w for w in words if w in shared]
+
+
+class PromptIndex:
+    """
+    Índice de prompts em memória, limitado a `max_entries` (LRU).
+    1º nível: texto normalizado igual. 2º nível: candidatos por LSH (bandas de
+    assinaturas MinHash), confirmados pela semelhança de Jaccard real >= threshold.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=64, bands=16, max_entries=10_000, seed=1234):
+        if num_perm % bands:
+            raise ValueError("num_perm tem de ser múltiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+
+        rng = random.Random(seed)  # permutações fixas: assinaturas estáveis
+        self._perms = [
+            (rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE))
+            for _ in range(num_perm)
+        ]
+
+        self._entries = OrderedDict()  # {normalizado: (valor, shingles, guard, palavras, bandas)}
+        self._buckets = defaultdict(set)  # {(banda, hash_da_banda): {normalizado}}
+        self._lock = threading.Lock()
+        # Últimos shingles/bandas calculados: um lookup falhado é quase sempre
+        # seguido do add() do mesmo prompt, e o MinHash é a parte cara
+        self._sketches = OrderedDict()
+        self._sketch_cache = 256
+
+    def _signature(self, shingle_set):
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+        return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [(i, hash(tuple(signature[i * r:(i + 1) * r]))) for i in range(self.bands)]
+
+    def _sketch(self, normalized):
+        """(shingles, bandas LSH) do texto normalizado, com memória dos últimos"""
+        sketch = self._sketches.get(normalized)
+        if sketch is None:
+            shingle_set = shingles(normalized)
+            sketch = (shingle_set, self._band_keys(self._signature(shingle_set)))
+            with self._lock:
+                self._sketches[normalized] = sketch
+                if len(self._sketches) > self._sketch_cache:
+                    self._sketches.popitem(last=False)
+        return sketch
+
+    def _remove(self, normalized):
+        """Remove uma entrada e as suas bandas. Chamar com o lock."""
+        _value, _shingles, _guard, _words, band_keys = self._entries.pop(normalized)
+        for band_key in band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(normalized)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def add(self, prompt, value=None):
+        """Indexa um prompt; `value` é o que lookup() devolve (por defeito o prompt)"""
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return  # só pontuação: nada que distinga este prompt de outro
+        shingle_set, band_keys = self._sketch(normalized)
+        words = tuple(normalized.split())
+        value = prompt if value is None else value
+
+        with self._lock:
+            if normalized in self._entries:
+                self._remove(normalized)
+            self._entries[normalized] = (value, shingle_set, _guard_words(words), words, band_keys)
+            for band_key in band_keys:
+                self._buckets[band_key].add(normalized)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def lookup(self, prompt):
+        """Retorna o valor do prompt igual ou mais parecido (>= threshold), ou None"""
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(normalized)
+            if entry is not None:
+                self._entries.move_to_end(normalized)
+                return entry[0]
+
+        shingle_set, band_keys = self._sketch(normalized)
+        words = normalized.split()
+        guard = _guard_words(words)
+
+        with self._lock:
+            candidates = set()
+            for band_key in band_keys:
+                candidates |= self._buckets.get(band_key, set())
+
+            best, best_score = None, self.threshold
+            for candidate in candidates:
+                value, other_shingles, other_guard, other_words, _bands = self._entries[candidate]
+                if other_guard != guard or _shared_order(words, other_words) != _shared_order(other_words, words):
+                    continue
+                score = len(shingle_set & other_shingles) / len(shingle_set | other_shingles)
+                if score >= best_score:
+                    best, best_score = candidate, score
+
+            if best is None:
+                return None
+            self._entries.move_to_end(best)
+            return self._entries[best][0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._sketches.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,170 @@
+"""
+PROVIDER REGISTRY
+Lista única de providers/modelos com capacidade, custo e saúde
+
+Usada pelo rate_limiter, model_failover, api_wrapper e response_handler, para
+que todos vejam os mesmos providers e o mesmo estado (circuit breaker,
+latência, erros) e nunca encaminhem para um provider que outro já deu como em baixo.
+"""
+
+import threading
+import time
+from collections import deque
+
+from circuit_breaker import CircuitBreaker
+
+# Ordem = preferência em caso de empate
+DEFAULT_PROVIDERS = [
+    # cost / output_cost: USD por 1M tokens de input / de output
+    {"name": "haiku", "id": "anthropic/claude-haiku-4-5", "vendor": "anthropic",
+     "cost": 1.00, "output_cost": 5.00, "calls_per_minute": 50, "tokens_per_minute": 40_000},
+    {"name": "openai", "id": "openai/gpt-4o-mini", "vendor": "openai",
+     "cost": 0.15, "output_cost": 0.60, "calls_per_minute": 50, "tokens_per_minute": 150_000},
+    {"name": "gpt4", "id": "openai/gpt-4", "vendor": "openai",
+     "cost": 30.00, "output_cost": 60.00, "calls_per_minute": 50, "tokens_per_minute": 8_000},
+    {"name": "gemini", "id": "google/gemini-2.0-flash", "vendor": "google",
+     "cost": 0.10, "output_cost": 0.40, "calls_per_minute": 50, "tokens_per_minute": 100_000},
+]
+
+
+class ModelStats:
+    """Latência (EWMA + amostras recentes para o p95) e taxa de erro de um modelo"""
+
+    def __init__(self, alpha=0.2, window=100):
+        self.alpha = alpha
+        self.samples = deque(maxlen=window)  # latências recentes (s), só sucessos
+        self.ewma_latency = None
+        self.error_rate = 0.0  # EWMA de 0 (sucesso) / 1 (erro)
+        self.calls = 0
+
+    def record(self, latency=None, ok=True):
+        """Regista o resultado de uma chamada (latência em segundos)"""
+        self.calls += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and latency is not None:
+            self.samples.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+
+    def p95(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def expected_latency(self):
+        """Latência esperada contando com as repetições por erro (None sem dados)"""
+        if self.ewma_latency is None:
+            return None
+        return self.ewma_latency / max(1.0 - self.error_rate, 0.05)
+
+
+class Provider:
+    """Metadados de um provider + o seu estado de saúde"""
+
+    def __init__(self, name, id, vendor, cost, output_cost=None, calls_per_minute=None, tokens_per_minute=None):
+        self.name = name  # nome curto ("haiku")
+        self.id = id  # identificador do modelo ("anthropic/claude-haiku-4-5")
+        self.vendor = vendor
+        self.cost = cost
+        self.output_cost = output_cost  # None = igual ao de input
+        self.calls_per_minute = calls_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.stats = ModelStats()
+        self.breaker = CircuitBreaker()
+
+    def __repr__(self):
+        return f"Provider({self.id})"
+
+
+class ProviderRegistry:
+    """
+    Providers indexados por nome e por id (lookup O(1)), com o ranking dos
+    disponíveis em cache: só é recalculado quando a saúde muda (touch()),
+    quando um circuito volta a half-open ou a cada `refresh_interval` para
+    acompanhar a latência - nunca por chamada.
+    """
+
+    def __init__(self, specs=None, refresh_interval=1.0):
+        self.providers = [Provider(**spec) for spec in (specs or DEFAULT_PROVIDERS)]
+        self._by_key = {}
+        for provider in self.providers:
+            self._by_key[provider.name] = provider
+            self._by_key[provider.id] = provider
+
+        # Routing: entre os saudáveis e dentro do custo, o de menor latência esperada
+        # Acima de max_cost (USD por 1M tokens de input; None = sem limite) um
+        # provider só recebe tráfego, nem que seja para o medir, quando os mais
+        # baratos não estão disponíveis: o gpt-4 nunca é o primeiro por ser novo
+        self.max_cost = 5.00
+        self.max_error_rate = 0.5  # acima disto só é usado se não houver outro
+
+        self.refresh_interval = refresh_interval
+        self._ranked = None
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Provider por nome curto ou id (None se não existir)"""
+        return self._by_key.get(key)
+
+    def ids(self):
+        return [provider.id for provider in self.providers]
+
+    def touch(self):
+        """A saúde de algum provider mudou: o ranking é recalculado no próximo acesso"""
+        self._ranked = None
+
+    def ranked(self):
+        """Providers disponíveis (circuito não aberto), do melhor para o pior"""
+        ranked = self._ranked
+        if ranked is not None and time.monotonic() < self._valid_until:
+            return ranked
+        with self._lock:
+            return self._rerank(time.monotonic())
+
+    def best(self):
+        """Melhor provider disponível agora, ou None"""
+        ranked = self.ranked()
+        return ranked[0] if ranked else None
+
+    def _rerank(self, now):
+        valid_until = now + self.refresh_interval
+        available = []
+        for provider in self.providers:
+            wait = provider.breaker.wait_time()
+            if wait > 0:
+                valid_until = min(valid_until, now + wait)
+            else:
+                available.append(provider)
+
+        healthy = [p for p in available if p.stats.error_rate <= self.max_error_rate] or available
+        preferred = [p for p in healthy if self.max_cost is None or p.cost <= self.max_cost] or healthy
+        order = {provider.id: n for n, provider in enumerate(self.providers)}
+
+        def score(provider):
+            # Nunca usados primeiro (para os medir, entre os que cabem no custo); só com erros, por último;
+            # empate = ordem do registry
+            expected = provider.stats.expected_latency()
+            if expected is None and provider.stats.calls:
+                expected = float("inf")
+            return (expected is not None, expected or 0.0, order[provider.id])
+
+        ranked = sorted(preferred, key=score)
+        ranked += sorted((p for p in available if p not in preferred), key=score)
+
+        self._ranked = ranked
+        self._valid_until = valid_until
+        return ranked
+
+    def reset(self):
+        for provider in self.providers:
+            provider.stats = ModelStats()
+            provider.breaker.reset()
+        self.touch()
+
+
+# Instância global
+registry = ProviderRegistry()
@@ -4,100 +4,470 @@ Controla chamadas à API pra evitar bloqueios
 """
 
 import time
-from datetime import datetime, timedelta
+import asyncio
+import threading
 from collections import defaultdict
+from shared_state import open_shared_state
+from response_cache import ResponseCache
+from adaptive_limits import AdaptiveController
+from circuit_breaker import CircuitBreaker, HALF_OPEN
+from provider_registry import registry as default_registry
 
-class RateLimiter:
+
+def estimate_tokens(text):
+    """
+    Estimativa rápida e local do número de tokens (sem tokenizer):
+    ~4 caracteres por token, ou ~1.3 tokens por palavra, o que for maior.
+    """
+    if not text:
+        return 0
+    return max(1, int(max(len(text) / 4, len(text.split()) * 1.3)))
+
+
+class SlidingWindowCounter:
+    """
+    Contador de janela deslizante em ring buffer de buckets por segundo.
+    check/record são O(1): avançar a janela limpa no máximo `window` buckets,
+    por isso o custo não cresce com o número de chamadas.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.buckets = [0] * window
+        self.head = None  # segundo (monotonic) do bucket mais recente
+        self.total = 0
+        self.last_call = None  # instante (monotonic) da última chamada
+        self._free_at_cache = None
+
+    def _advance(self, now):
+        """Roda a janela até ao segundo atual, descartando buckets expirados"""
+        second = int(now)
+        if self.head is None:
+            self.head = second
+            return
+
+        gap = second - self.head
+        if gap <= 0:
+            return
+
+        if gap >= self.window:
+            for i in range(self.window):
+                self.buckets[i] = 0
+            self.total = 0
+        else:
+            for s in range(self.head + 1, second + 1):
+                i = s % self.window
+                self.total -= self.buckets[i]
+                self.buckets[i] = 0
+        self.head = second
+
+    def count(self, now):
+        """Chamadas registadas nos últimos `window` segundos"""
+        self._advance(now)
+        return self.total
+
+    def add(self, now, n=1):
+        """Regista `n` chamadas no bucket do segundo atual"""
+        self._advance(now)
+        self.buckets[int(now) % self.window] += n
+        self.total += n
+        self.last_call = now
+
+    def remove(self, now, n):
+        """
+        Desconta até `n` dos buckets mais recentes (nunca abaixo de zero), p.ex.
+        para devolver tokens reservados a mais. Percorre no máximo `window` buckets.
+        """
+        self._advance(now)
+        for s in range(self.head, self.head - self.window, -1):
+            if n <= 0 or self.total <= 0:
+                break
+            i = s % self.window
+            taken = min(self.buckets[i], n)
+            self.buckets[i] -= taken
+            self.total -= taken
+            n -= taken
+
+    def next_free_at(self, now, limit):
+        """
+        Instante (monotonic) em que a janela volta a ter menos de `limit`
+        chamadas. Percorre no máximo `window` buckets, do mais antigo ao atual.
+        """
+        self._advance(now)
+        if self.total < limit:
+            return now
+
+        # Enquanto a janela não muda, o resultado também não (evita re-percorrer)
+        key = (self.head, self.total, limit)
+        if self._free_at_cache is not None and self._free_at_cache[0] == key:
+            return self._free_at_cache[1]
+
+        free_at = self._scan_free_at(limit)
+        self._free_at_cache = (key, free_at)
+        return free_at
+
+    def _scan_free_at(self, limit):
+        remaining = self.total
+        oldest = self.head - self.window + 1
+        for s in range(oldest, self.head + 1):
+            remaining -= self.buckets[s % self.window]
+            if remaining < limit:
+                return s + self.window
+        return self.head + self.window
+
+    def clear(self):
+        for i in range(self.window):
+            self.buckets[i] = 0
+        self.head = None
+        self.total = 0
+        self.last_call = None
+        self._free_at_cache = None
+
+
+class LocalState:
+    """
+    Estado de rate limit em memória (só este processo): janelas de chamadas e
+    bloqueios por provider. Lock striping: cada provider usa sempre o mesmo
+    lock, providers diferentes raramente partilham stripe e não competem.
+    Mesma interface que shared_state.SharedState.
+    """
+    LOCK_STRIPES = 16
+    
     def __init__(self):
-        # Rastrear chamadas por provider
-        self.calls = defaultdict(list)  # timestamps das chamadas
-        self.blocked = {}  # {provider: blocked_until}
-        self.cache = {}  # {cache_key: (value, timestamp)}
-        self.cache_ttl = 300  # 5 minutos
-        
-        # Configuração
-        self.max_calls_per_minute = 50  # prudente pra todos os providers
-        self.min_interval = 1  # mínimo 1 segundo entre chamadas
-        self.cooldown_on_429 = 60  # bloqueia por 60s quando 429
+        self.calls = defaultdict(SlidingWindowCounter)  # janela de 60s por provider
+        self.tokens = defaultdict(SlidingWindowCounter)  # tokens (input+output) na janela
+        self.blocked = {}  # {provider: blocked_until (time.monotonic)}
+        self._stripes = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+    
+    def _lock_for(self, provider):
+        return self._stripes[hash(provider) % len(self._stripes)]
     
-    def check_rate_limit(self, provider):
-        """Verifica se pode fazer chamada"""
-        now = datetime.now()
+    def _wait(self, provider, now, max_calls, min_interval, tokens=0, max_tokens=None):
+        """(espera_em_s, motivo) até haver slot livre. Chamar com o lock."""
+        blocked_until = self.blocked.get(provider)
+        if blocked_until is not None:
+            if now < blocked_until:
+                return blocked_until - now, "blocked"
+            self.blocked.pop(provider, None)
         
-        # Se bloqueado, verifica se desbloqueia
-        if provider in self.blocked:
-            if now < self.blocked[provider]:
-                remaining = (self.blocked[provider] - now).total_seconds()
-                return False, f"⏸️ {provider} bloqueado por {int(remaining)}s"
-            else:
-                del self.blocked[provider]
+        window = self.calls[provider]
+        wait = window.next_free_at(now, max_calls) - now
+        if wait > 0:
+            return wait, "limit"
+        if tokens and max_tokens:
+            # Cabe se tokens_na_janela + tokens <= max_tokens
+            needed = max(max_tokens - min(tokens, max_tokens) + 1, 1)
+            wait = self.tokens[provider].next_free_at(now, needed) - now
+            if wait > 0:
+                return wait, "tokens"
+        if window.last_call is not None:
+            wait = window.last_call + min_interval - now
+            if wait > 0:
+                return wait, "interval"
+        return 0.0, None
+    
+    def wait_time(self, provider, max_calls, min_interval, tokens=0, max_tokens=None):
+        with self._lock_for(provider):
+            return self._wait(provider, time.monotonic(), max_calls, min_interval, tokens, max_tokens)
+    
+    def try_acquire(self, provider, max_calls, min_interval, tokens=0, max_tokens=None):
+        with self._lock_for(provider):
+            now = time.monotonic()
+            wait, _cause = self._wait(provider, now, max_calls, min_interval, tokens, max_tokens)
+            if wait > 0:
+                return False, wait
+            self.calls[provider].add(now)
+            if tokens:
+                self.tokens[provider].add(now, tokens)
+            return True, 0.0
+    
+    def record(self, provider, tokens=0):
+        with self._lock_for(provider):
+            now = time.monotonic()
+            self.calls[provider].add(now)
+            if tokens:
+                self.tokens[provider].add(now, tokens)
+    
+    def adjust_tokens(self, provider, delta):
+        """Corrige os tokens da janela (positivo = gastou mais do que o reservado)"""
+        with self._lock_for(provider):
+            now = time.monotonic()
+            if delta > 0:
+                self.tokens[provider].add(now, delta)
+            elif delta < 0:
+                self.tokens[provider].remove(now, -delta)
+    
+    def count(self, provider):
+        with self._lock_for(provider):
+            return self.calls[provider].count(time.monotonic())
+    
+    def token_count(self, provider):
+        with self._lock_for(provider):
+            return self.tokens[provider].count(time.monotonic())
+    
+    def block(self, provider, seconds):
+        with self._lock_for(provider):
+            self.blocked[provider] = time.monotonic() + seconds
+    
+    def blocked_for(self, provider):
+        """Segundos de bloqueio restantes (0 = livre)"""
+        with self._lock_for(provider):
+            blocked_until = self.blocked.get(provider)
+            if blocked_until is None:
+                return 0.0
+            return max(blocked_until - time.monotonic(), 0.0)
+    
+    def reset(self):
+        self.calls.clear()
+        self.tokens.clear()
+        self.blocked.clear()
+
+
+class RateLimiter:
+    def __init__(self, state=None, registry=None):
+        # Janelas de chamadas e bloqueios por provider. Por defeito só deste
+        # processo; com shared_state.SharedState é partilhado entre processos.
+        self.state = state or LocalState()
+        # Cache de respostas: LRU + TTL de 5 minutos, limitada em entradas e memória
+        self.cache = ResponseCache(max_entries=10_000, max_bytes=32 * 1024 * 1024, ttl=300)
+        # Rate por provider ajustado por AIMD a partir dos headers e dos 429
+        self.adaptive = AdaptiveController()
+        # Providers conhecidos (capacidade, orçamento, circuit breaker) - partilhado
+        # com o failover e o wrapper, para todos verem a mesma saúde
+        self.registry = registry or default_registry
+        # Circuit breaker dos providers que não estão no registry
+        self.breakers = defaultdict(lambda: CircuitBreaker(base_cooldown=self.cooldown_on_429))
         
-        # Limpar chamadas antigas (>1 min)
-        minute_ago = now - timedelta(minutes=1)
-        self.calls[provider] = [t for t in self.calls[provider] if t > minute_ago]
+        # Configuração (só deste limiter; os providers e breakers do registry são partilhados)
+        self._max_calls_per_minute = None  # definido à mão: ganha ao calls_per_minute do registry
+        self.min_interval = 1  # mínimo 1 segundo entre chamadas
+        self.cooldown_on_429 = 10  # 1º cooldown por 429 sem Retry-After; dobra a cada reabertura
         
-        # Verificar limite por minuto
-        if len(self.calls[provider]) >= self.max_calls_per_minute:
-            return False, f"🚫 {provider}: limite de {self.max_calls_per_minute}/min atingido"
+        # Orçamento de tokens (input+output) por minuto - é nisto que os providers
+        # realmente limitam. Os conhecidos têm o seu no registry; este é o resto.
+        self.default_tokens_per_minute = 20_000
+    
+    @property
+    def cooldown_on_429(self):
+        return self._cooldown_on_429
+    
+    @cooldown_on_429.setter
+    def cooldown_on_429(self, value):
+        # Os breakers do registry são partilhados com outros limiters: não se mexe
+        # neles; os 429 marcados por este limiter usam este valor (mark_rate_limit)
+        self._cooldown_on_429 = value
+        for breaker in self.breakers.values():
+            breaker.base_cooldown = value
+    
+    @property
+    def max_calls_per_minute(self):
+        """
+        Ponto de partida do AIMD. Por defeito (50) só para providers fora do
+        registry - os do registry partem do seu calls_per_minute. Definido à
+        mão, vale para todos e o AIMD deste limiter recomeça daí.
+        """
+        return self.adaptive.initial
+    
+    @max_calls_per_minute.setter
+    def max_calls_per_minute(self, value):
+        self._max_calls_per_minute = value
+        self.adaptive.initial = value
+        self.adaptive.rates.clear()
+    
+    def breaker(self, provider):
+        """Circuit breaker do provider (o do registry, se o provider lá estiver)"""
+        known = self.registry.get(provider)
+        return known.breaker if known else self.breakers[provider]
+    
+    def _seed(self, provider):
+        """O AIMD de um provider do registry parte da capacidade lá configurada (salvo max_calls_per_minute à mão)"""
+        if self._max_calls_per_minute is not None or provider in self.adaptive.rates:
+            return
+        known = self.registry.get(provider)
+        if known and known.calls_per_minute:
+            self.adaptive.rates[provider] = known.calls_per_minute
+    
+    def calls_limit(self, provider):
+        """Chamadas/min permitidas agora para o provider (adaptativo)"""
+        self._seed(provider)
+        return self.adaptive.limit(provider)
+    
+    def token_budget(self, provider):
+        """Tokens/min permitidos para o provider (o limite real, se o provider o reportou)"""
+        if provider in self.adaptive.token_limits:
+            return self.adaptive.token_limits[provider]
+        known = self.registry.get(provider)
+        if known and known.tokens_per_minute:
+            return known.tokens_per_minute
+        return self.default_tokens_per_minute
+    
+    def _wait_time(self, provider, tokens):
+        wait, cause = self.state.wait_time(
+            provider, self.calls_limit(provider), self.min_interval,
+            tokens, self.token_budget(provider)
+        )
+        if not wait:
+            circuit_wait = self.breaker(provider).wait_time()
+            if circuit_wait > 0:
+                return circuit_wait, "circuit"
+        return wait, cause
+    
+    def check_rate_limit(self, provider, tokens=0):
+        """Verifica se pode fazer chamada (com `tokens` estimados, se indicados)"""
+        wait, cause = self._wait_time(provider, tokens)
         
-        # Verificar intervalo mínimo
-        if self.calls[provider]:
-            last_call = self.calls[provider][-1]
-            time_since = (now - last_call).total_seconds()
-            if time_since < self.min_interval:
-                wait_time = self.min_interval - time_since
-                return False, f"⏱️ Espera {wait_time:.1f}s antes da próxima chamada"
+        if cause == "blocked":
+            return False, f"⏸️ {provider} bloqueado por {int(wait)}s"
+        if cause == "limit":
+            return False, f"🚫 {provider}: limite de {self.calls_limit(provider)}/min atingido"
+        if cause == "tokens":
+            return False, f"🪙 {provider}: sem orçamento para {tokens} tokens (espera {wait:.1f}s)"
+        if cause == "interval":
+            return False, f"⏱️ Espera {wait:.1f}s antes da próxima chamada"
+        if cause == "circuit":
+            if self.breaker(provider).state == HALF_OPEN:
+                return False, f"🟡 {provider}: a testar recuperação, espera {wait:.1f}s"
+            return False, f"🔌 {provider}: circuito aberto, espera {wait:.1f}s"
         
         return True, "✅ Permitido"
     
-    def record_call(self, provider):
+    def record_call(self, provider, tokens=0):
         """Registra uma chamada bem-sucedida"""
-        self.calls[provider].append(datetime.now())
+        self.state.record(provider, tokens)
+    
+    def try_acquire(self, provider, tokens=0):
+        """
+        Verifica e reserva um slot (e `tokens` estimados) atomicamente, sem o
+        race de check_rate_limit + record_call. Retorna (True, 0) ou (False, espera_em_s).
+        Com o circuito half-open só passam os pedidos de teste.
+        """
+        breaker = self.breaker(provider)
+        if not breaker.allow_request():
+            return False, max(breaker.wait_time(), 0.01)
+        
+        ok, wait = self.state.try_acquire(
+            provider, self.calls_limit(provider), self.min_interval,
+            tokens, self.token_budget(provider)
+        )
+        if not ok:
+            breaker.release()
+        return ok, wait
+    
+    def reconcile_tokens(self, provider, reserved, actual):
+        """Acerta a reserva de tokens com o uso real, depois da resposta"""
+        self.state.adjust_tokens(provider, actual - reserved)
+    
+    def next_available_in(self, provider, tokens=0):
+        """Segundos até o provider ter um slot livre (0 = disponível)"""
+        wait, _cause = self._wait_time(provider, tokens)
+        return wait
+    
+    def acquire(self, provider, timeout=None, tokens=0):
+        """
+        Reserva um slot, bloqueando só até ao instante exato em que o próximo
+        slot (ou o blocked_until) expira. Retorna False se não der dentro do timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ok, wait = self.try_acquire(provider, tokens)
+            if ok:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+    
+    async def acquire_async(self, provider, timeout=None, tokens=0):
+        """Versão asyncio de acquire() - não bloqueia o event loop"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ok, wait = self.try_acquire(provider, tokens)
+            if ok:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
     
-    def mark_rate_limit(self, provider):
-        """Marca um provider como rate limited (429)"""
-        self.blocked[provider] = datetime.now() + timedelta(seconds=self.cooldown_on_429)
-        print(f"⚠️ {provider.upper()} rate limited! Bloqueado por {self.cooldown_on_429}s")
+    def record_response(self, provider, headers=None):
+        """Feedback de uma resposta OK: sobe o rate (se a janela está perto do limite) e respeita remaining=0"""
+        self.breaker(provider).record_success()
+        self._seed(provider)
+        cooldown = self.adaptive.on_success(provider, headers, used=self.state.count(provider))
+        if cooldown:
+            self.state.block(provider, cooldown)
+            print(f"⏳ {provider}: sem quota restante, pausa de {cooldown:.1f}s")
+    
+    def mark_rate_limit(self, provider, headers=None):
+        """
+        Marca um provider como rate limited (429): abre o circuito pelo cooldown
+        exato dos headers, ou exponencial (com jitter) se não houver nenhum.
+        """
+        self._seed(provider)
+        hint = self.adaptive.on_rate_limit(provider, headers)
+        cooldown = self.breaker(provider).trip(hint, base_cooldown=self.cooldown_on_429)
+        self.state.block(provider, cooldown)
+        self.registry.touch()
+        print(f"⚠️ {provider.upper()} rate limited! Bloqueado por {cooldown:.0f}s "
+              f"(rate agora {self.calls_limit(provider)}/min)")
+    
+    def mark_error(self, provider, error_msg=None):
+        """Erro genérico (não 429): conta para o circuit breaker"""
+        cooldown = self.breaker(provider).record_failure()
+        if cooldown:
+            self.state.block(provider, cooldown)
+            self.registry.touch()
+            print(f"🔌 {provider}: demasiados erros, circuito aberto por {cooldown:.0f}s")
     
     def get_cache(self, key):
         """Retorna valor em cache se válido"""
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if datetime.now() - timestamp < timedelta(seconds=self.cache_ttl):
-                return value
-            else:
-                del self.cache[key]
-        return None
+        return self.cache.get(key)
     
     def set_cache(self, key, value):
         """Guarda valor em cache"""
-        self.cache[key] = (value, datetime.now())
+        self.cache.set(key, value)
     
     def get_status(self):
         """Status de todos os providers"""
-        now = datetime.now()
         status = []
         
-        for provider in ["anthropic/claude-haiku-4-5", "openai/gpt-4o-mini", "openai/gpt-4"]:
-            if provider in self.blocked and now < self.blocked[provider]:
-                remaining = (self.blocked[provider] - now).total_seconds()
+        for provider in self.registry.ids():
+            remaining = self.state.blocked_for(provider)
+            if remaining > 0:
                 status.append(f"🔴 {provider}: Bloqueado ({int(remaining)}s)")
+            elif self.breaker(provider).state == HALF_OPEN:
+                status.append(f"🟡 {provider}: A testar recuperação (half-open)")
             else:
-                call_count = len([t for t in self.calls[provider] if t > now - timedelta(minutes=1)])
-                status.append(f"🟢 {provider}: {call_count}/{self.max_calls_per_minute} chamadas/min")
+                call_count = self.state.count(provider)
+                token_count = self.state.token_count(provider)
+                status.append(
+                    f"🟢 {provider}: {call_count}/{self.calls_limit(provider)} chamadas/min, "
+                    f"{token_count}/{self.token_budget(provider)} tokens/min"
+                )
+        
+        cache = self.cache.stats()
+        status.append(
+            f"💾 Cache: {cache['entries']} entradas ({cache['bytes'] // 1024} KB), "
+            f"{cache['hits']} hits / {cache['misses']} misses, "
+            f"{cache['evictions']} despejos, {cache['expirations']} expiradas"
+        )
         
         return "\n".join(status)
     
+    def close(self):
+        """Pára a thread de sweep da cache de respostas"""
+        self.cache.close()
+    
     def reset(self):
         """Reset manual de tudo"""
-        self.calls.clear()
-        self.blocked.clear()
+        self.state.reset()
+        self.adaptive.reset()
+        self.breakers.clear()
+        self.registry.reset()
         self.cache.clear()
         print("✅ Rate limiter resetado")
 
 
-# Instância global
-limiter = RateLimiter()
+# Instância global (estado partilhado entre processos se CHIMOCO_STATE_DB disponível)
+limiter = RateLimiter(state=open_shared_state())
 
 
 if __name__ == "__main__":
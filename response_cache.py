@@ -0,0 +1,154 @@
+"""
+RESPONSE CACHE
+Cache LRU + TTL com limite de entradas e de memória
+"""
+
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+def _sizeof(key, value):
+    """Tamanho aproximado (bytes) de uma entrada"""
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class ResponseCache:
+    """
+    Cache limitada por número de entradas e por bytes, com despejo LRU e
+    expiração por TTL. Um sweep em background remove as entradas expiradas
+    mesmo que nunca mais sejam lidas; a thread só arranca no primeiro set(),
+    acaba com close() e não impede que a cache seja libertada.
+    """
+
+    def __init__(self, max_entries=10_000, max_bytes=32 * 1024 * 1024, ttl=300, sweep_interval=30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # {key: (value, expires_at, size)}, ordem LRU
+        # Com TTL fixo, a ordem de inserção é a ordem de expiração: o sweep
+        # só olha para o início e pára na primeira entrada ainda válida
+        self._expiry = OrderedDict()  # {key: expires_at}
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.sweep_interval = sweep_interval
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def _remove(self, key):
+        """Remove uma entrada. Chamar com o lock."""
+        _value, _expires_at, size = self._entries.pop(key)
+        self._expiry.pop(key, None)
+        self.bytes -= size
+
+    def get(self, key):
+        """Retorna o valor em cache, ou None se não existir/expirou"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, _size = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Guarda um valor, despejando as entradas menos usadas se preciso"""
+        size = _sizeof(key, value)
+        if size > self.max_bytes:
+            return  # nunca caberia
+
+        with self._lock:
+            if self._sweeper is None and self.sweep_interval and not self._stop.is_set():
+                self._start_sweeper()
+            if key in self._entries:
+                self._remove(key)
+
+            expires_at = time.monotonic() + self.ttl
+            self._entries[key] = (value, expires_at, size)
+            self._expiry[key] = expires_at
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def sweep(self):
+        """Remove todas as entradas expiradas; retorna quantas saíram"""
+        removed = 0
+        now = time.monotonic()
+        with self._lock:
+            while self._expiry:
+                key, expires_at = next(iter(self._expiry.items()))
+                if expires_at > now:
+                    break
+                self._remove(key)
+                removed += 1
+            self.expirations += removed
+        return removed
+
+    def _start_sweeper(self):
+        """Chamar com o lock. A thread só guarda uma weakref para a cache."""
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, args=(weakref.ref(self), self.sweep_interval, self._stop),
+            name="cache-sweep", daemon=True
+        )
+        self._sweeper.start()
+
+    @staticmethod
+    def _sweep_loop(cache_ref, interval, stop):
+        while not stop.wait(interval):
+            cache = cache_ref()
+            if cache is None:
+                return  # cache libertada sem close()
+            cache.sweep()
+            del cache
+
+    def stats(self):
+        """Contadores e ocupação atual"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiry.clear()
+            self.bytes = 0
+
+    def close(self):
+        """Pára o sweep em background (a cache continua a funcionar, sem sweep)"""
+        self._stop.set()
+        sweeper = self._sweeper
+        if sweeper is not None and sweeper is not threading.current_thread():
+            sweeper.join()
+
+    def __len__(self):
+        return len(self._entries)
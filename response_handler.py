@@ -3,7 +3,8 @@ RESPONSE HANDLER - Evita respostas cortadas por rate limit
 Verifica ANTES de responder
 """
 
-from rate_limiter import limiter
+from rate_limiter import limiter, estimate_tokens
+from retry_scheduler import RetryScheduler
 import time
 
 class ResponseHandler:
@@ -11,44 +12,43 @@ class ResponseHandler:
         self.max_attempts = 3
     
     def can_respond(self, required_tokens=100):
-        """Verifica se pode responder com segurança"""
-        providers_ok = []
-        
-        for provider in ["anthropic/claude-haiku-4-5", "openai/gpt-4o-mini", "openai/gpt-4"]:
-            can_call, reason = limiter.check_rate_limit(provider)
+        """Verifica se pode responder com segurança (com orçamento para required_tokens)"""
+        # Pela ordem do registry (melhor primeiro): basta o primeiro que tenha slot
+        for provider in limiter.registry.ranked():
+            can_call, reason = limiter.check_rate_limit(provider.id, tokens=required_tokens)
             if can_call:
-                providers_ok.append(provider)
+                return True, f"✅ Posso responder com {provider.id}"
         
-        if providers_ok:
-            return True, f"✅ Posso responder com {providers_ok[0]}"
-        else:
-            return False, f"⏸️ Todos os modelos bloqueados. Tenta novamente em 30s"
+        wait = min(limiter.next_available_in(p, required_tokens) for p in limiter.registry.ids())
+        return False, f"⏸️ Todos os modelos bloqueados. Tenta novamente em {max(wait, 1):.0f}s"
     
-    def wait_until_ready(self, timeout=120):
-        """Espera até poder responder com segurança"""
-        start = time.time()
-        attempt = 0
+    def wait_until_ready(self, timeout=120, required_tokens=100):
+        """
+        Espera até poder responder com segurança: dorme exatamente até o
+        primeiro provider ficar livre, e desiste logo se isso passar do timeout
+        """
+        scheduler = RetryScheduler(limiter, limiter.registry.ids(), timeout)
         
-        while time.time() - start < timeout:
-            can_respond, reason = self.can_respond()
+        while True:
+            can_respond, reason = self.can_respond(required_tokens)
             
             if can_respond:
                 print(f"✅ Pronto! {reason}")
                 return True
             
-            attempt += 1
-            wait_time = min(10 * attempt, 60)  # Max 60s entre tentativas
-            print(f"⏳ Aguardando... {reason}. Tentativa em {wait_time}s")
+            wait_time = scheduler.delay(required_tokens)
+            if wait_time is None:
+                print(f"{reason}. Nenhum provider fica livre dentro de {timeout}s")
+                return False
+            print(f"⏳ Aguardando... {reason}. Tentativa em {wait_time:.1f}s")
             time.sleep(wait_time)
-        
-        return False
     
     def safe_respond(self, message):
         """Responde de forma segura (completa ou não responde)"""
-        can_respond, reason = self.can_respond()
+        can_respond, reason = self.can_respond(required_tokens=estimate_tokens(message))
         
         if not can_respond:
-            return f"⏸️ Não consigo responder neste momento:\n{reason}\n\nTenta novamente em 30 segundos."
+            return f"⏸️ Não consigo responder neste momento:\n{reason}"
         
         # Se pode responder, retorna a mensagem completa
         return message
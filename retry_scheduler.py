@@ -0,0 +1,73 @@
+"""
+RETRY SCHEDULER
+Quanto esperar antes de tentar outra vez, com um deadline do chamador
+
+Em vez de sleeps fixos (2s depois de um erro, degraus de 10s até 60s), pergunta
+ao rate limiter quando é que o primeiro provider volta a ter slot e dorme só
+isso. Se esse instante já não cabe no deadline, desiste logo em vez de dormir
+para nada.
+"""
+
+import asyncio
+import time
+
+
+class RetryScheduler:
+    """
+    Um por chamada: guarda o deadline e os erros seguidos.
+    Depois de um erro não há espera fixa - o próximo provider disponível é
+    tentado logo; só quando nenhum está disponível é que se espera, e só o
+    tempo necessário.
+    """
+
+    def __init__(self, limiter, providers, timeout=None, error_backoff=0.1, max_backoff=2.0, min_delay=0.01):
+        self.limiter = limiter
+        self.providers = list(providers)
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.error_backoff = error_backoff  # 1ª pausa depois de um erro sem bloqueio
+        self.max_backoff = max_backoff
+        self.min_delay = min_delay  # nunca 0: quem chama só espera quando nada estava livre
+        self.errors = 0  # erros nesta chamada
+
+    def remaining(self):
+        """Segundos até ao deadline (None = sem deadline)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def next_available_in(self, tokens=0):
+        """Segundos até algum provider ter slot para `tokens` (0 = já)"""
+        return min(self.limiter.next_available_in(p, tokens) for p in self.providers)
+
+    def delay(self, tokens=0, after_error=False):
+        """
+        Quanto dormir antes da próxima tentativa, ou None se o deadline não
+        chega. Quando já falharam tantas tentativas como há providers, uma
+        pausa curta exponencial evita repetir em ciclo apertado.
+        """
+        wait = max(self.next_available_in(tokens), self.min_delay)
+        if after_error:
+            self.errors += 1
+            if self.errors >= len(self.providers):
+                backoff = self.error_backoff * 2 ** (self.errors - len(self.providers))
+                wait = max(wait, min(backoff, self.max_backoff))
+        remaining = self.remaining()
+        if remaining is not None and wait >= remaining:
+            return None
+        return wait
+
+    def sleep(self, tokens=0, after_error=False):
+        """Dorme até à próxima tentativa. False = desistir (não cabe no deadline)."""
+        wait = self.delay(tokens, after_error)
+        if wait is None:
+            return False
+        time.sleep(wait)
+        return True
+
+    async def sleep_async(self, tokens=0, after_error=False):
+        """Versão asyncio de sleep(); o limiter (SQLite) é consultado fora do event loop"""
+        wait = await asyncio.to_thread(self.delay, tokens, after_error)
+        if wait is None:
+            return False
+        await asyncio.sleep(wait)
+        return True
@@ -3,6 +3,7 @@
 const express = require('express');
 const WebSocket = require('ws');
 const cors = require('cors');
+const crypto = require('crypto');
 const http = require('http');
 
 const app = express();
@@ -10,12 +11,20 @@ const server = http.createServer(app);
 const wss = new WebSocket.Server({ 
   server,
   perMessageDeflate: false,
-  clientTracking: true
+  clientTracking: true,
+  verifyClient: ({ req }, done) => {
+    if (!isReporter(req) || reporterAuthorized(req)) return done(true);
+    console.log('🚫 Reporter recusado: token inválido');
+    done(false, 401, 'Unauthorized');
+  }
 });
 const path = require('path');
 
 const PORT = process.env.PORT || 3000;
 
+// Token dos reporters Python (WebSocket em /reporter); vazio = sem autenticação
+const REPORTER_TOKEN = process.env.MISSION_TOKEN || '';
+
 // Middleware
 app.use(cors());
 app.use(express.json());
@@ -34,8 +43,25 @@ let currentTask = {
 
 let taskHistory = [];
 
+// Ligações em /reporter são reporters Python, não dashboards
+function isReporter(req) {
+  return req.url.startsWith('/reporter');
+}
+
+function reporterAuthorized(req) {
+  if (!REPORTER_TOKEN) return true;
+  const given = Buffer.from((req.headers['authorization'] || '').replace(/^Bearer /, ''));
+  const expected = Buffer.from(REPORTER_TOKEN);
+  return given.length === expected.length && crypto.timingSafeEqual(given, expected);
+}
+
 // WebSocket - Conexão de clientes
-wss.on('connection', (ws) => {
+wss.on('connection', (ws, req) => {
+  if (isReporter(req)) {
+    acceptReporter(ws, req);
+    return;
+  }
+  
   console.log('✅ Cliente conectado ao Mission Control');
   
   // Enviar estado atual
@@ -68,10 +94,8 @@ function broadcastToClients(data) {
   });
 }
 
-// API - Iniciar tarefa
-app.post('/api/task/start', (req, res) => {
-  const { taskName, model } = req.body;
-  
+// Eventos de tarefa (usados pelos endpoints individuais e pelo lote)
+function startTask({ taskName, model }) {
   currentTask = {
     taskName: taskName || 'Nova tarefa',
     status: 'RUNNING',
@@ -86,31 +110,24 @@ app.post('/api/task/start', (req, res) => {
     type: 'taskStart',
     task: currentTask
   });
-  
-  res.json({ success: true, task: currentTask });
-});
+}
 
-// API - Adicionar pensamento
-app.post('/api/task/thinking', (req, res) => {
-  const { text } = req.body;
+function addThinking(lines) {
+  lines = lines.filter(Boolean);
+  if (lines.length === 0) return;
   
-  if (text) {
-    currentTask.thinking.push(text);
-    
-    broadcastToClients({
-      type: 'thinking',
-      text: text,
-      thinkingHistory: currentTask.thinking
-    });
-  }
+  currentTask.thinking.push(...lines);
   
-  res.json({ success: true });
-});
+  // Só as linhas novas (os clientes já têm as anteriores); text = a última,
+  // para clientes que só conhecem uma linha por mensagem
+  broadcastToClients({
+    type: 'thinking',
+    text: lines[lines.length - 1],
+    lines: lines
+  });
+}
 
-// API - Completar tarefa
-app.post('/api/task/complete', (req, res) => {
-  const { success, action } = req.body;
-  
+function completeTask({ success, action }) {
   currentTask.status = 'COMPLETED';
   
   // Adicionar ao histórico
@@ -147,10 +164,109 @@ app.post('/api/task/complete', (req, res) => {
       task: currentTask
     });
   }, 1000);
+}
+
+// Aplica eventos { type: 'start' | 'thinking' | 'complete', ...campos do endpoint }
+// por ordem; linhas de thinking seguidas vão num só broadcast. Retorna os ignorados.
+function applyEvents(events) {
+  let thinking = [];
+  let skipped = 0;
+  
+  const flushThinking = () => {
+    addThinking(thinking);
+    thinking = [];
+  };
+  
+  for (const event of events) {
+    if (event.type === 'thinking') {
+      thinking.push(event.text);
+      continue;
+    }
+    flushThinking();
+    if (event.type === 'start') {
+      startTask(event);
+    } else if (event.type === 'complete') {
+      completeTask(event);
+    } else {
+      skipped++;
+    }
+  }
+  flushThinking();
+  return skipped;
+}
+
+// Reporters por WebSocket: cada frame { seq, events: [...] } recebe { type: 'ack', seq }.
+// O último seq aplicado fica por sessão, para a retoma depois de uma nova ligação
+// não aplicar duas vezes os frames reenviados.
+const reporterSessions = new Map();
+const MAX_REPORTER_SESSIONS = 100;
+
+function acceptReporter(ws, req) {
+  const session = new URL(req.url, 'http://localhost').searchParams.get('session') || 'default';
+  console.log(`🔌 Reporter ligado (${session})`);
+  
+  ws.send(JSON.stringify({
+    type: 'welcome',
+    lastSeq: reporterSessions.get(session) || 0
+  }));
+  
+  ws.on('message', (data) => {
+    let frame;
+    try {
+      frame = JSON.parse(data);
+    } catch (error) {
+      return;
+    }
+    if (typeof frame.seq !== 'number') return;
+    
+    if (frame.seq > (reporterSessions.get(session) || 0)) {
+      applyEvents(Array.isArray(frame.events) ? frame.events : []);
+      // Reinserir mantém o Map por ordem de uso: a mais antiga sai primeiro
+      reporterSessions.delete(session);
+      reporterSessions.set(session, frame.seq);
+      if (reporterSessions.size > MAX_REPORTER_SESSIONS) {
+        reporterSessions.delete(reporterSessions.keys().next().value);
+      }
+    }
+    ws.send(JSON.stringify({ type: 'ack', seq: frame.seq }));
+  });
   
+  ws.on('close', () => {
+    console.log(`🔌 Reporter desligado (${session})`);
+  });
+  
+  ws.on('error', (error) => {
+    console.error('Erro no reporter WebSocket:', error);
+  });
+}
+
+// API - Iniciar tarefa
+app.post('/api/task/start', (req, res) => {
+  startTask(req.body);
+  res.json({ success: true, task: currentTask });
+});
+
+// API - Adicionar pensamento
+app.post('/api/task/thinking', (req, res) => {
+  addThinking([req.body.text]);
   res.json({ success: true });
 });
 
+// API - Completar tarefa
+app.post('/api/task/complete', (req, res) => {
+  completeTask(req.body);
+  res.json({ success: true });
+});
+
+// API - Vários eventos num só pedido, aplicados por ordem:
+// { events: [{ type: 'start' | 'thinking' | 'complete', ...campos do endpoint }] }
+app.post('/api/events/batch', (req, res) => {
+  const events = Array.isArray(req.body.events) ? req.body.events : [];
+  const skipped = applyEvents(events);
+  
+  res.json({ success: true, applied: events.length - skipped, skipped });
+});
+
 // API - Status
 app.get('/api/status', (req, res) => {
   res.json({
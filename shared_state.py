@@ -0,0 +1,244 @@
+"""
+SHARED STATE
+Estado de rate limit e failover partilhado entre processos (SQLite em modo WAL)
+
+O bot, o dashboard_listener, o dashboard_relay e o auto-reporter correm em
+processos separados: com este backend todos veem as mesmas janelas de chamadas
+e os mesmos bloqueios (429), que também sobrevivem a um restart.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Caminho da base de dados partilhada ("" desativa e usa estado só em memória)
+STATE_DB = os.getenv("CHIMOCO_STATE_DB", "/tmp/chimoco_state.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    provider TEXT NOT NULL,
+    second INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (provider, second)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS providers (
+    provider TEXT PRIMARY KEY,
+    last_call REAL,
+    blocked_until REAL
+);
+"""
+
+
+class SharedState:
+    """
+    Janelas de chamadas (buckets de 1s) e blocked_until numa base SQLite.
+    Usa o relógio de parede (time.time) porque o estado é comparado entre
+    processos e tem de sobreviver a restarts. Mesma interface que
+    rate_limiter.LocalState.
+    """
+    WINDOW = 60
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._local = threading.local()  # uma ligação SQLite por thread
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Bases criadas antes do orçamento de tokens não têm a coluna
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(calls)")]
+        if "tokens" not in columns:
+            conn.execute("ALTER TABLE calls ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _wait(self, conn, provider, now, max_calls, min_interval, tokens=0, max_tokens=None):
+        """(espera_em_s, motivo) até haver slot livre. Chamar dentro da transação."""
+        row = conn.execute(
+            "SELECT last_call, blocked_until FROM providers WHERE provider = ?",
+            (provider,)
+        ).fetchone()
+        last_call, blocked_until = row if row else (None, None)
+
+        if blocked_until is not None and now < blocked_until:
+            return blocked_until - now, "blocked"
+
+        oldest = int(now) - self.WINDOW + 1
+        buckets = conn.execute(
+            "SELECT second, count, tokens FROM calls WHERE provider = ? AND second >= ? ORDER BY second",
+            (provider, oldest)
+        ).fetchall()
+        remaining = sum(count for _second, count, _tokens in buckets)
+        if remaining >= max_calls:
+            # Instante em que buckets antigos suficientes expiram
+            for second, count, _tokens in buckets:
+                remaining -= count
+                if remaining < max_calls:
+                    return second + self.WINDOW - now, "limit"
+
+        if tokens and max_tokens:
+            # Cabe se tokens_na_janela + tokens <= max_tokens
+            allowed = max_tokens - min(tokens, max_tokens)
+            remaining = sum(bucket_tokens for _second, _count, bucket_tokens in buckets)
+            if remaining > allowed:
+                for second, _count, bucket_tokens in buckets:
+                    remaining -= bucket_tokens
+                    if remaining <= allowed:
+                        return second + self.WINDOW - now, "tokens"
+
+        if last_call is not None:
+            wait = last_call + min_interval - now
+            if wait > 0:
+                return wait, "interval"
+        return 0.0, None
+
+    def _record(self, conn, provider, now, tokens=0):
+        second = int(now)
+        conn.execute(
+            "INSERT INTO calls (provider, second, count, tokens) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (provider, second) DO UPDATE SET count = count + 1, tokens = tokens + excluded.tokens",
+            (provider, second, tokens)
+        )
+        conn.execute(
+            "INSERT INTO providers (provider, last_call) VALUES (?, ?) "
+            "ON CONFLICT (provider) DO UPDATE SET last_call = excluded.last_call",
+            (provider, now)
+        )
+        # Descartar buckets fora da janela (barato: usa a chave primária)
+        conn.execute(
+            "DELETE FROM calls WHERE provider = ? AND second <= ?",
+            (provider, second - self.WINDOW)
+        )
+
+    def wait_time(self, provider, max_calls, min_interval, tokens=0, max_tokens=None):
+        return self._wait(self._conn(), provider, time.time(), max_calls, min_interval, tokens, max_tokens)
+
+    def try_acquire(self, provider, max_calls, min_interval, tokens=0, max_tokens=None):
+        conn = self._conn()
+        # BEGIN IMMEDIATE: lock de escrita já, para verificar e reservar de forma atómica
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            wait, _cause = self._wait(conn, provider, now, max_calls, min_interval, tokens, max_tokens)
+            if wait <= 0:
+                self._record(conn, provider, now, tokens)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if wait > 0:
+            return False, wait
+        return True, 0.0
+
+    def record(self, provider, tokens=0):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._record(conn, provider, time.time(), tokens)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def adjust_tokens(self, provider, delta):
+        """Corrige os tokens da janela (positivo = gastou mais do que o reservado)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            second = int(time.time())
+            if delta > 0:
+                conn.execute(
+                    "INSERT INTO calls (provider, second, count, tokens) VALUES (?, ?, 0, ?) "
+                    "ON CONFLICT (provider, second) DO UPDATE SET tokens = tokens + excluded.tokens",
+                    (provider, second, delta)
+                )
+            elif delta < 0:
+                # Devolver a partir dos buckets mais recentes, sem ficar negativo
+                n = -delta
+                rows = conn.execute(
+                    "SELECT second, tokens FROM calls WHERE provider = ? AND second > ? AND tokens > 0 "
+                    "ORDER BY second DESC",
+                    (provider, second - self.WINDOW)
+                ).fetchall()
+                for bucket_second, bucket_tokens in rows:
+                    if n <= 0:
+                        break
+                    taken = min(bucket_tokens, n)
+                    conn.execute(
+                        "UPDATE calls SET tokens = tokens - ? WHERE provider = ? AND second = ?",
+                        (taken, provider, bucket_second)
+                    )
+                    n -= taken
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, provider):
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(count), 0) FROM calls WHERE provider = ? AND second >= ?",
+            (provider, int(time.time()) - self.WINDOW + 1)
+        ).fetchone()
+        return row[0]
+
+    def token_count(self, provider):
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(tokens), 0) FROM calls WHERE provider = ? AND second >= ?",
+            (provider, int(time.time()) - self.WINDOW + 1)
+        ).fetchone()
+        return row[0]
+
+    def block(self, provider, seconds):
+        self._conn().execute(
+            "INSERT INTO providers (provider, blocked_until) VALUES (?, ?) "
+            "ON CONFLICT (provider) DO UPDATE SET blocked_until = excluded.blocked_until",
+            (provider, time.time() + seconds)
+        )
+
+    def blocked_for(self, provider):
+        """Segundos de bloqueio restantes (0 = livre)"""
+        row = self._conn().execute(
+            "SELECT blocked_until FROM providers WHERE provider = ?",
+            (provider,)
+        ).fetchone()
+        if not row or row[0] is None:
+            return 0.0
+        return max(row[0] - time.time(), 0.0)
+
+    def reset(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM calls")
+        conn.execute("DELETE FROM providers")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def open_shared_state(path=None):
+    """
+    Devolve o SharedState do processo (um só por caminho), ou None se estiver
+    desativado ou a base não abrir - aí quem chama usa estado em memória.
+    """
+    global _shared
+    path = STATE_DB if path is None else path
+    if not path:
+        return None
+
+    with _shared_lock:
+        if _shared is not None and _shared.path == path:
+            return _shared
+        try:
+            _shared = SharedState(path)
+        except sqlite3.Error as e:
+            print(f"⚠️ Estado partilhado indisponível ({path}): {e}")
+            return None
+        return _shared
@@ -0,0 +1,91 @@
+"""
+SINGLE-FLIGHT
+Pedidos iguais em simultâneo partilham uma só chamada ao provider
+
+A cache só é preenchida quando a primeira resposta chega; até lá, o mesmo
+prompt vindo do dashboard e do Telegram ao mesmo tempo pagaria duas vezes.
+Aqui o primeiro executa e os restantes esperam pelo resultado dele, cada
+um no máximo até ao seu próprio deadline (wait_timeout).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+class SingleFlight:
+    """Uma execução por chave em curso; quem chega entretanto recebe o mesmo resultado"""
+
+    def __init__(self):
+        self._calls = {}  # {chave: Future} das chamadas em curso (threads)
+        self._tasks = {}  # {chave: Task} das chamadas em curso (asyncio)
+        self._lock = threading.Lock()
+        self.executed = 0  # chamadas realmente feitas
+        self.coalesced = 0  # pedidos que aproveitaram uma chamada já em curso
+
+    def do(self, key, fn, *args, wait_timeout=None, **kwargs):
+        """
+        Executa fn(*args, **kwargs), ou espera pela execução em curso com a
+        mesma chave. Quem espera desiste com TimeoutError após wait_timeout
+        segundos; a execução do primeiro continua para os restantes.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            try:
+                return future.result(wait_timeout)
+            except FutureTimeout:
+                raise TimeoutError(f"pedido igual em curso sem resposta em {wait_timeout}s") from None
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key, fn, *args, wait_timeout=None, **kwargs):
+        """
+        Versão asyncio: fn é uma coroutine function. A chamada corre numa task
+        própria, por isso cancelar um dos pedidos (ou desistir por wait_timeout)
+        não cancela a dos outros. O primeiro não tem wait_timeout: fn trata do
+        seu próprio deadline.
+        """
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _task: self._tasks.pop(key, None))
+            with self._lock:
+                self.executed += 1
+        else:
+            with self._lock:
+                self.coalesced += 1
+        if leader or wait_timeout is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), wait_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"pedido igual em curso sem resposta em {wait_timeout}s") from None
+
+    def stats(self):
+        total = self.executed + self.coalesced
+        return {
+            "in_flight": len(self._calls) + len(self._tasks),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesce_rate": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,265 @@
+"""
+TELEMETRY
+Latência, tokens, custo, cache e repetições de cada chamada aos providers
+
+Histogramas ao estilo HDR: baldes log-lineares de tamanho fixo (~3% de erro
+relativo, de 1µs a 1h em ~460 contadores), por isso a memória não cresce com
+o número de chamadas e registar uma amostra é só um incremento numa lista.
+
+Uso:
+    from telemetry import telemetry
+    telemetry.snapshot()              # dict com tudo
+    telemetry.render_prometheus()     # formato de texto do Prometheus
+    telemetry.serve(port=9108)        # GET /metrics e /metrics.json numa thread
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from provider_registry import registry as default_registry
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    """Histograma log-linear de latências (em segundos, guardadas em µs)"""
+
+    def __init__(self, max_seconds=3600, sub_bucket_bits=5):
+        self._bits = sub_bucket_bits
+        self._sub_count = 1 << sub_bucket_bits  # valores abaixo disto ficam exatos
+        self._half = self._sub_count >> 1
+        self._max_value = int(max_seconds * 1_000_000)
+        self.counts = [0] * (self._index(self._max_value) + 1)
+        self.count = 0
+        self.total = 0.0  # soma em segundos
+        self.max = 0.0
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self._bits
+        return (shift << (self._bits - 1)) + (value >> shift)
+
+    def _value(self, index):
+        """Ponto médio do balde `index`, em µs"""
+        if index < self._sub_count:
+            return index
+        shift = index // self._half - 1
+        low = (index - shift * self._half) << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, seconds):
+        value = int(seconds * 1_000_000)
+        if value > self._max_value:
+            value = self._max_value
+        elif value < 0:
+            value = 0
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Latência (s) abaixo da qual fica a fração `q` das amostras (None sem amostras)"""
+        if not self.count:
+            return None
+        target = max(1, int(self.count * q + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self._value(index) / 1_000_000, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            **{f"p{q * 100:g}": self.percentile(q) for q in QUANTILES},
+        }
+
+
+class ProviderMetrics:
+    """Contadores de um provider"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()  # só pedidos com sucesso
+        self.errors = Counter()  # {"rate_limit" | "timeout" | "error": n}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0  # USD estimados a partir dos preços do registry
+
+
+class Telemetry:
+    """
+    Métricas de todas as chamadas, agregadas em memória. Os métodos record_*
+    estão no caminho de cada pedido: só fazem somas debaixo de um lock;
+    percentis e formatação ficam para snapshot()/render_prometheus().
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or default_registry
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.providers = {}  # {provider_id: ProviderMetrics}
+            self.calls = Counter()  # call_api por resultado: "ok" | "cache" | "failed"
+            self.cache_hits = Counter()  # "exact" | "similar"
+            self.retries = 0  # tentativas para além da primeira
+            self.call_latency = LatencyHistogram()  # call_api de ponta a ponta
+
+    def _provider(self, provider):
+        metrics = self.providers.get(provider)
+        if metrics is None:
+            metrics = self.providers[provider] = ProviderMetrics()
+        return metrics
+
+    def record_latency(self, provider, seconds):
+        """Pedido bem-sucedido a um provider"""
+        with self._lock:
+            self._provider(provider).latency.record(seconds)
+
+    def record_error(self, provider, kind):
+        with self._lock:
+            self._provider(provider).errors[kind] += 1
+
+    def record_usage(self, provider, input_tokens, output_tokens):
+        """Tokens gastos numa resposta; o custo usa os preços do registry (USD por 1M tokens)"""
+        spec = self.registry.get(provider)
+        cost = 0.0
+        if spec is not None:
+            output_price = spec.cost if spec.output_cost is None else spec.output_cost
+            cost = (input_tokens * spec.cost + output_tokens * output_price) / 1_000_000
+        with self._lock:
+            metrics = self._provider(provider)
+            metrics.input_tokens += input_tokens
+            metrics.output_tokens += output_tokens
+            metrics.cost += cost
+
+    def record_cache_hit(self, kind):
+        with self._lock:
+            self.cache_hits[kind] += 1
+
+    def record_call(self, outcome, seconds, retries=0):
+        """Fim de um call_api: "ok", "cache" ou "failed", com a duração total"""
+        with self._lock:
+            self.calls[outcome] += 1
+            self.retries += retries
+            self.call_latency.record(seconds)
+
+    def snapshot(self):
+        """Estado atual como dict (percentis em segundos)"""
+        with self._lock:
+            total_calls = sum(self.calls.values())
+            return {
+                "uptime": time.time() - self.started,
+                "calls": dict(self.calls),
+                "cache_hits": dict(self.cache_hits),
+                "cache_hit_rate": self.calls["cache"] / total_calls if total_calls else 0.0,
+                "retries": self.retries,
+                "call_latency": self.call_latency.snapshot(),
+                "providers": {
+                    provider: {
+                        "latency": metrics.latency.snapshot(),
+                        "errors": dict(metrics.errors),
+                        "input_tokens": metrics.input_tokens,
+                        "output_tokens": metrics.output_tokens,
+                        "cost": metrics.cost,
+                    }
+                    for provider, metrics in self.providers.items()
+                },
+            }
+
+    def render_prometheus(self):
+        """Snapshot no formato de texto do Prometheus (v0.0.4)"""
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP chimoco_{name} {help_text}")
+            lines.append(f"# TYPE chimoco_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"chimoco_{name}{{{label_text}}} {value:.10g}" if label_text
+                             else f"chimoco_{name} {value:.10g}")
+
+        def summary(name, help_text, histograms):
+            lines.append(f"# HELP chimoco_{name} {help_text}")
+            lines.append(f"# TYPE chimoco_{name} summary")
+            for labels, hist in histograms:
+                for q in QUANTILES:
+                    value = hist[f"p{q * 100:g}"]
+                    label_text = ",".join([*(f'{k}="{v}"' for k, v in labels.items()), f'quantile="{q:g}"'])
+                    lines.append(f"chimoco_{name}{{{label_text}}} {'NaN' if value is None else f'{value:.10g}'}")
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"chimoco_{name}_sum{suffix} {hist['sum']:.10g}")
+                lines.append(f"chimoco_{name}_count{suffix} {hist['count']}")
+
+        providers = snap["providers"]
+        metric("calls_total", "counter", "Chamadas a call_api por resultado",
+               [({"outcome": k}, v) for k, v in sorted(snap["calls"].items())])
+        metric("cache_hits_total", "counter", "Respostas servidas da cache",
+               [({"kind": k}, v) for k, v in sorted(snap["cache_hits"].items())])
+        metric("retries_total", "counter", "Tentativas para além da primeira", [({}, snap["retries"])])
+        summary("call_latency_seconds", "Duração de call_api, esperas e repetições incluídas",
+                [({}, snap["call_latency"])])
+        summary("provider_latency_seconds", "Latência dos pedidos bem-sucedidos por provider",
+                [({"provider": p}, m["latency"]) for p, m in sorted(providers.items())])
+        metric("provider_errors_total", "counter", "Erros por provider e tipo",
+               [({"provider": p, "kind": k}, v)
+                for p, m in sorted(providers.items()) for k, v in sorted(m["errors"].items())])
+        metric("provider_tokens_total", "counter", "Tokens por provider e direção",
+               [({"provider": p, "direction": d}, m[f"{d}_tokens"])
+                for p, m in sorted(providers.items()) for d in ("input", "output")])
+        metric("provider_cost_usd_total", "counter", "Custo estimado (USD) por provider",
+               [({"provider": p}, m["cost"]) for p, m in sorted(providers.items())])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9108):
+        """Expõe /metrics (Prometheus) e /metrics.json numa thread em background"""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = telemetry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(telemetry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # sem uma linha por scrape
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="telemetry").start()
+        print(f"📊 Telemetria em http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Instância global
+telemetry = Telemetry()
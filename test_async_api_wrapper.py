@@ -0,0 +1,143 @@
+"""
+Testes do AsyncAPIWrapper contra o mock provider local (sem rede nem quota)
+
+    python3 -m pytest -q test_async_api_wrapper.py
+"""
+
+import asyncio
+import time
+
+from async_api_wrapper import AsyncAPIWrapper
+from mock_provider import MockProvider
+from provider_registry import DEFAULT_PROVIDERS, ProviderRegistry
+from rate_limiter import LocalState, RateLimiter
+
+
+def run_with_mock(test, specs=None, wrapper_options=None, **mock):
+    """Corre `test(api, server)` com um wrapper isolado (estado local) apontado ao mock"""
+
+    async def main():
+        server = await MockProvider(**mock).start()
+        # Limites fora do caminho: os testes medem o wrapper, não o rate limiter
+        registry = ProviderRegistry([dict(spec, calls_per_minute=10**9, tokens_per_minute=10**12)
+                                     for spec in (specs or DEFAULT_PROVIDERS)])
+        limiter = RateLimiter(state=LocalState(), registry=registry)
+        limiter.min_interval = 0
+        api = AsyncAPIWrapper(limiter=limiter, endpoints={p: server.url for p in registry.ids()},
+                              **(wrapper_options or {}))
+        try:
+            return await test(api, server)
+        finally:
+            api.close()
+            await server.close()
+            limiter.close()
+
+    return asyncio.run(main())
+
+
+def test_call_api_returns_mock_response_and_caches_it():
+    async def test(api, server):
+        first = await api.call_api("olá mock")
+        second = await api.call_api("olá mock")
+        return first, second, sum(server.served.values())
+
+    first, second, served = run_with_mock(test, latency=0.01)
+    assert first.startswith("[Resposta mock de ") and "olá mock" in first
+    assert second == first
+    assert served == 1  # a segunda veio da cache
+
+
+def test_stream_yields_the_same_text_in_chunks():
+    async def test(api, _server):
+        return [chunk async for chunk in api.call_api_stream("pedido em streaming")]
+
+    chunks = run_with_mock(test, latency=0.01, chunk_delay=0)
+    assert len(chunks) > 1
+    assert "".join(chunks).startswith("[Resposta mock de ")
+
+
+def test_without_deadline():
+    """timeout=None no wrapper e na chamada: sem deadline, sem TypeError"""
+    async def test(api, _server):
+        response = await api.call_api("sem deadline")
+        chunks = [chunk async for chunk in api.call_api_stream("sem deadline em streaming")]
+        return response, "".join(chunks)
+
+    response, streamed = run_with_mock(test, wrapper_options={"timeout": None}, latency=0.01, chunk_delay=0)
+    assert response.startswith("[Resposta mock de ")
+    assert streamed.startswith("[Resposta mock de ")
+
+
+def test_deadline_covers_the_wait_for_a_slot():
+    """Com o único provider ocupado, a chamada desiste no seu deadline em vez de ficar na fila"""
+    async def test(api, _server):
+        slow = asyncio.ensure_future(api.call_api("pedido lento", timeout=5))
+        await asyncio.sleep(0.05)  # o lento fica com o único slot
+        start = time.monotonic()
+        response = await api.call_api("pedido com pressa", timeout=0.2)
+        elapsed = time.monotonic() - start
+        await slow
+        return response, elapsed, slow.result()
+
+    response, elapsed, slow = run_with_mock(test, specs=DEFAULT_PROVIDERS[:1],
+                                            wrapper_options={"max_in_flight": 1}, latency=1.0)
+    assert response.startswith("❌")
+    assert elapsed < 0.6
+    assert slow.startswith("[Resposta mock de ")
+
+
+def test_fails_over_once_the_failing_provider_is_open():
+    haiku = DEFAULT_PROVIDERS[0]["id"].split("/", 1)[-1]
+
+    async def test(api, server):
+        # 5 erros seguidos abrem o circuito; a tentativa seguinte vai para outro provider
+        response = await api.call_api("com failover", max_retries=6)
+        return response, server.stats()
+
+    response, _stats = run_with_mock(test, latency=0.01, models={haiku: {"error_rate": 1.0}})
+    assert response.startswith("[Resposta mock de ")
+    assert haiku not in response
+
+
+def test_coalesced_waiter_gives_up_at_its_own_deadline():
+    """Um pedido igual a um já em curso espera por ele só até ao próprio deadline"""
+    async def test(api, _server):
+        leader = asyncio.ensure_future(api.call_api("mesmo prompt", timeout=5))
+        await asyncio.sleep(0.05)
+        start = time.monotonic()
+        response = await api.call_api("mesmo prompt", timeout=0.2)
+        elapsed = time.monotonic() - start
+        return response, elapsed, await leader
+
+    response, elapsed, leader = run_with_mock(test, latency=1.0)
+    assert response.startswith("❌")
+    assert elapsed < 0.6
+    assert leader.startswith("[Resposta mock de ")
+
+
+def test_limiter_io_runs_off_the_event_loop():
+    """Um limiter lento (SQLite ocupado noutro processo) não pára o event loop"""
+    async def test(api, _server):
+        try_acquire = api.limiter.try_acquire
+
+        def slow_try_acquire(*args):
+            time.sleep(0.3)
+            return try_acquire(*args)
+
+        api.limiter.try_acquire = slow_try_acquire
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        response = await api.call_api("limiter lento")
+        task.cancel()
+        return response, ticks
+
+    response, ticks = run_with_mock(test, latency=0.01)
+    assert response.startswith("[Resposta mock de ")
+    assert ticks >= 10  # o loop continuou a correr durante os 0.3s do limiter